@@ -0,0 +1,113 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# Log configuration (override via environment)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 'text' or 'json'
+
+# Fraction of below-WARNING records kept per view function, e.g.
+# LOG_SAMPLE_RATES="get_ptt_messages=0.01,get_online_users=0.1"
+DEFAULT_SAMPLE_RATES = 'get_ptt_messages=0.01,wait_ptt_messages=0.1,get_online_users=0.1'
+
+def parse_sample_rates(raw):
+    rates = {}
+    for item in raw.split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', DEFAULT_SAMPLE_RATES))
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of debug/info records from high-frequency routes
+
+    Records are matched on the function that logged them, which for route
+    handlers is the Flask endpoint name. Warnings and errors always pass.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.funcName)
+        return rate is None or random.random() < rate
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line for the log shipper"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'func': record.funcName,
+            'msg': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler whose listener thread writes to stdout off the request path
+
+    The listener is (re)started lazily per process, so records are not lost
+    when gunicorn forks workers after import.
+    """
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.listener = None
+        self.pid = None
+
+    def ensure_listener(self):
+        if self.pid == os.getpid():
+            return
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def emit(self, record):
+        self.ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.pid = None
+
+def configure_logging():
+    """Attach the background handler to the 'shomrim' logger (idempotent)"""
+    root = logging.getLogger('shomrim')
+    if root.handlers:
+        return root
+
+    target = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        target.setFormatter(JSONFormatter())
+    else:
+        target.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s.%(funcName)s: %(message)s'))
+
+    handler = BackgroundQueueHandler(target)
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+    atexit.register(handler.stop)
+
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    return root
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f'shomrim.{name}')
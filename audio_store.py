@@ -0,0 +1,123 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Directory for PTT voice clips, stored by content hash
+AUDIO_DIR = os.environ.get('PTT_AUDIO_DIR', 'ptt_audio')
+
+# In-process cache of recently played clips, bounded in bytes
+AUDIO_CACHE_BYTES = int(os.environ.get('PTT_AUDIO_CACHE_BYTES', 32 * 1024 * 1024))
+
+def audio_path(audio_hash):
+    """Absolute path of a stored clip, fanned out by the first two hex digits"""
+    return os.path.join(os.path.abspath(AUDIO_DIR), audio_hash[:2], audio_hash)
+
+def store_audio(audio_data):
+    """Write a clip to the store and return its sha256 hash
+
+    Identical clips share one file. Writes go through a temp file and an
+    atomic rename so readers never see a partial clip. Call again after
+    committing the row that references the clip: retention may have removed
+    an identical file in between.
+    """
+    audio_hash = hashlib.sha256(audio_data).hexdigest()
+    path = audio_path(audio_hash)
+    if os.path.exists(path):
+        return audio_hash
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(audio_data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return audio_hash
+
+def read_audio(audio_hash):
+    """Read a stored clip into memory"""
+    with open(audio_path(audio_hash), 'rb') as f:
+        return f.read()
+
+def remove_unreferenced_audio(cursor, audio_hashes):
+    """Delete clip files no longer referenced by any ptt_messages row
+
+    Call inside the write transaction that deleted the rows, before commit.
+    """
+    removed = 0
+    for audio_hash in set(h for h in audio_hashes if h):
+        cursor.execute('SELECT 1 FROM ptt_messages WHERE audio_hash = ? LIMIT 1', (audio_hash,))
+        if cursor.fetchone():
+            continue
+        try:
+            os.remove(audio_path(audio_hash))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+class AudioCache:
+    """Thread-safe LRU of PTT clips keyed by message id, bounded by total bytes
+
+    Clips never change after insert, so entries only leave on eviction or
+    when retention deletes the message.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes // 8  # one long clip can't flush the cache
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, message_id):
+        """Return (audio_data, audio_hash, content_type) or None"""
+        with self.lock:
+            entry = self.entries.get(message_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(message_id)
+            self.hits += 1
+            return entry
+
+    def put(self, message_id, audio_data, audio_hash, content_type):
+        if len(audio_data) > self.max_item_bytes:
+            return
+        with self.lock:
+            if message_id in self.entries:
+                return
+            self.entries[message_id] = (audio_data, audio_hash, content_type)
+            self.size += len(audio_data)
+            while self.size > self.max_bytes:
+                _, (evicted, _, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def discard(self, message_id):
+        with self.lock:
+            entry = self.entries.pop(message_id, None)
+            if entry is not None:
+                self.size -= len(entry[0])
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes
+            }
+
+audio_cache = AudioCache(AUDIO_CACHE_BYTES)
@@ -0,0 +1,162 @@
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # fast enough per request
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/manifest+json',
+    'image/svg+xml',
+}
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def parse_accept_encoding(header):
+    """{'gzip': 1.0, 'br': 0.8, ...} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+def choose_encoding(header):
+    """Best encoding we support that the client accepts (brotli wins ties), or None"""
+    accepted = parse_accept_encoding(header)
+    best = None
+    best_quality = 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+def is_compressible(response):
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+def init_app(app):
+    """Compress eligible responses according to the client's Accept-Encoding"""
+
+    @app.after_request
+    def compress_response(response):
+        if not is_compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.content_length or 0) < COMPRESS_MIN_BYTES:
+            return response
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is a different representation of the same data
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+def realistic_payloads():
+    """Incident list and suspect list shaped like production responses"""
+    import base64
+    import json
+    import random
+
+    rng = random.Random(42)
+    words = ('suspect seen leaving premises heading north on foot wearing dark jacket '
+             'caller reports vehicle parked outside school gates engine running').split()
+    incidents = []
+    for i in range(300):
+        incident = {
+            'id': f'INC-{i:06d}', 'shcad': f'SH-CAD {i}', 'title': 'Suspicious Activity',
+            'type': rng.choice(['Burglary', 'Theft', 'Assault', 'Suspicious Activity']),
+            'description': ' '.join(rng.choice(words) for _ in range(40)),
+            'status': rng.choice(['pending', 'started', 'completed']),
+            'address': f'{rng.randint(1, 300)} High Street, Stamford Hill', 'postcode': 'N16 5AA',
+            'created_at': '2026-10-17 12:00:00', 'updated_at': '2026-10-17 12:30:00.000',
+            'notes': [{'id': n, 'note': ' '.join(rng.choice(words) for _ in range(15)), 'user_phone': '+447700900123'}
+                      for n in range(3)],
+            'victims': [{'name': 'David Cohen', 'phone': '+44 7911 111111'}],
+        }
+        incident['metadata'] = json.dumps(incident)
+        incidents.append(incident)
+
+    suspects = []
+    for i in range(40):
+        photo = base64.b64encode(bytes(rng.getrandbits(8) for _ in range(24 * 1024))).decode()
+        suspects.append({
+            'id': i, 'name': f'Suspect {i}', 'physical_description': ' '.join(rng.choice(words) for _ in range(30)),
+            'photo': f'data:image/jpeg;base64,{photo}', 'notes': ' '.join(rng.choice(words) for _ in range(20)),
+        })
+    return {'incidents': incidents, 'suspects': suspects}
+
+def benchmark(repeat=20):
+    """Time JSON encoding and compression of realistic payloads"""
+    import json
+    import time
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    def timed(fn):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return result, (time.perf_counter() - started) / repeat * 1000
+
+    for name, payload in realistic_payloads().items():
+        print(f'\n{name}')
+        body, ms = timed(lambda: json.dumps(payload, sort_keys=True).encode())
+        print(f'  json.dumps            {ms:8.2f} ms  {len(body):>10,} bytes')
+        if orjson is not None:
+            body, ms = timed(lambda: orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
+            print(f'  orjson.dumps          {ms:8.2f} ms  {len(body):>10,} bytes')
+        for level in (1, COMPRESS_GZIP_LEVEL, 9):
+            compressed, ms = timed(lambda: gzip.compress(body, compresslevel=level, mtime=0))
+            print(f'  gzip -{level}               {ms:8.2f} ms  {len(compressed):>10,} bytes '
+                  f'({len(compressed) / len(body):.0%})')
+        if brotli is not None:
+            for quality in (1, COMPRESS_BROTLI_QUALITY, 11):
+                compressed, ms = timed(lambda: brotli.compress(body, quality=quality))
+                print(f'  brotli -q{quality:<2}           {ms:8.2f} ms  {len(compressed):>10,} bytes '
+                      f'({len(compressed) / len(body):.0%})')
+        else:
+            print('  brotli                (not installed)')
+
+if __name__ == '__main__':
+    # python compression.py - encoder and compression timings on realistic payloads
+    benchmark()
@@ -2,20 +2,182 @@ import sqlite3
 import json
 from datetime import datetime
 import os
+import sys
+import threading
+import time
+import audio_store
 
-DB_PATH = 'shomrim.db'
+DB_PATH = os.environ.get('DB_PATH', 'shomrim.db')
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
+# Connection pool tuning (override via environment)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))  # idle connections kept per worker
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 128 * 1024 * 1024))
+DB_STATEMENT_CACHE = int(os.environ.get('DB_STATEMENT_CACHE', 256))
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}',
+    f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}',
+    f'PRAGMA mmap_size = {DB_MMAP_SIZE}',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Millisecond-resolution timestamp used for incident sync tokens
+SYNC_TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+def is_cooperative():
+    """True when running under gevent's monkey patching (gunicorn -k gevent)
+
+    Everything then shares one OS thread, so SQLite must never sleep in C
+    waiting for a lock: that would stall every connection the worker holds.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+class CooperativeCursor(sqlite3.Cursor):
+    """Cursor that waits for a busy database by yielding, not blocking
+
+    Used with busy_timeout = 0: a statement that cannot get its lock fails
+    immediately and is retried after a (monkey-patched, so cooperative)
+    time.sleep, up to DB_BUSY_TIMEOUT_MS. Retrying is safe because SQLite
+    reports SQLITE_BUSY before the statement has changed anything.
+    """
+    
+    def _retry(self, method, *args):
+        deadline = time.monotonic() + DB_BUSY_TIMEOUT_MS / 1000
+        delay = 0.001
+        while True:
+            try:
+                return method(self, *args)
+            except sqlite3.OperationalError as e:
+                if 'database is locked' not in str(e) or time.monotonic() >= deadline:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+    
+    def execute(self, *args):
+        return self._retry(sqlite3.Cursor.execute, *args)
+    
+    def executemany(self, *args):
+        return self._retry(sqlite3.Cursor.executemany, *args)
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that returns to the pool on close()
+    
+    Usable as before (conn = get_db(); ...; conn.close()) or as a context
+    manager, which commits on success, rolls back on error and releases.
+    """
+    
+    def close(self):
+        release_db(self)
+    
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_class)
+    
+    # The C shortcuts build a plain cursor; route them through cursor_class
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+    
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.close()
+
+# Idle connections for this worker process, most recently used last
+_pool = []
+_pool_lock = threading.Lock()
+_pool_pid = os.getpid()
+pool_stats = {'created': 0, 'reused': 0, 'discarded': 0}
+
+# Per-thread count of executed SQL statements, read by the metrics middleware
+_query_counter = threading.local()
+
+def _count_statement(statement):
+    _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+
+def reset_query_count():
+    _query_counter.count = 0
+
+def get_query_count():
+    return getattr(_query_counter, 'count', 0)
+
+def _connect():
+    """Open a new tuned connection"""
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        factory=PooledConnection,
+        cached_statements=DB_STATEMENT_CACHE,
+        check_same_thread=False,  # pooled connections move between threads, never shared
+    )
     conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    conn.cursor_class = sqlite3.Cursor
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if is_cooperative():
+        conn.execute('PRAGMA busy_timeout = 0')
+        conn.cursor_class = CooperativeCursor
+    conn.set_trace_callback(_count_statement)
+    conn.db_path = DB_PATH
+    pool_stats['created'] += 1
     return conn
 
-def init_db():
-    """Initialize database with tables"""
-    conn = get_db()
-    cursor = conn.cursor()
+def _reset_pool_after_fork():
+    """Drop connections inherited from a parent process (e.g. gunicorn --preload)"""
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        _pool = []
+        _pool_pid = os.getpid()
+
+def get_db():
+    """Get database connection from the worker's pool"""
+    with _pool_lock:
+        _reset_pool_after_fork()
+        while _pool:
+            conn = _pool.pop()
+            if conn.db_path == DB_PATH:
+                pool_stats['reused'] += 1
+                return conn
+            sqlite3.Connection.close(conn)
+    return _connect()
+
+def release_db(conn):
+    """Return a connection to the pool, discarding any uncommitted work"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        sqlite3.Connection.close(conn)
+        return
     
+    with _pool_lock:
+        _reset_pool_after_fork()
+        if conn in _pool:
+            return
+        if len(_pool) < DB_POOL_SIZE and conn.db_path == DB_PATH:
+            _pool.append(conn)
+            return
+        pool_stats['discarded'] += 1
+    sqlite3.Connection.close(conn)
+
+def close_pool():
+    """Close every idle pooled connection"""
+    with _pool_lock:
+        while _pool:
+            sqlite3.Connection.close(_pool.pop())
+
+def migration_1_initial_schema(cursor):
+    """Original tables"""
     # Users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -234,11 +396,475 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_ptt_created_at 
         ON ptt_messages(created_at DESC)
     ''')
+
+def migration_2_incident_sync(cursor):
+    """Keyset pagination and delta sync for incidents"""
+    # Deleted incidents, kept so delta clients can drop them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS incident_tombstones (
+            incident_id TEXT PRIMARY KEY,
+            deleted_by TEXT,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
     
-    conn.commit()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_incidents_created_at 
+        ON incidents(created_at DESC, id DESC)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_incidents_updated_at 
+        ON incidents(updated_at)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_incident_tombstones_deleted_at 
+        ON incident_tombstones(deleted_at)
+    ''')
+
+def migration_3_ptt_audio_store(cursor):
+    """PTT audio moved to the content-addressed file store"""
+    # Audio lives in the content-addressed file store; audio_data is kept
+    # only for rows written before the move
+    add_column_if_missing(cursor, 'ptt_messages', 'audio_hash', 'TEXT')
+    add_column_if_missing(cursor, 'ptt_messages', 'audio_size', 'INTEGER')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ptt_audio_hash 
+        ON ptt_messages(audio_hash)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ptt_channel_id 
+        ON ptt_messages(channel, id)
+    ''')
+
+# Indexes for the lookups server.py makes on every request
+HOT_PATH_INDEXES = (
+    ('idx_participants_incident', 'incident_participants(incident_id)'),
+    ('idx_assignments_incident', 'incident_assignments(incident_id)'),
+    ('idx_assignments_user', 'incident_assignments(user_phone, status)'),
+    ('idx_notes_incident', 'incident_notes(incident_id, created_at)'),
+    ('idx_history_incident', 'incident_history(incident_id, created_at)'),
+    ('idx_police_info_incident', 'incident_police_info(incident_id)'),
+    ('idx_arrests_incident', 'incident_arrests(incident_id)'),
+    ('idx_incidents_status', 'incidents(status, created_at DESC, id DESC)'),
+    ('idx_incidents_type', 'incidents(type, created_at DESC, id DESC)'),
+    ('idx_users_on_duty', 'users(on_duty, name)'),
+    ('idx_users_on_patrol', 'users(on_patrol, name)'),
+    ('idx_users_role', 'users(role, name)'),
+    ('idx_contacts_user', 'contacts(user_phone, name)'),
+    ('idx_notifications_user_read', 'notifications(user_phone, is_read)'),
+)
+
+def migration_4_hot_path_indexes(cursor):
+    """Index every foreign key and filter column used on hot paths"""
+    for name, target in HOT_PATH_INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+def migration_5_otp_store(cursor):
+    """Shared OTP codes and send throttle log"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS otp_codes (
+            phone TEXT PRIMARY KEY,
+            otp TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS otp_sends (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL,
+            sent_at REAL NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_otp_codes_expires_at 
+        ON otp_codes(expires_at)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_otp_sends_key 
+        ON otp_sends(key, sent_at)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_otp_sends_sent_at 
+        ON otp_sends(sent_at)
+    ''')
+
+# Columns folded into each incident_search row: participants and notes get
+# their own columns so a single MATCH covers the whole incident
+INCIDENT_SEARCH_COLUMNS = '''i.title, i.description, i.address, i.postcode,
+        (SELECT group_concat(p.name || ' ' || COALESCE(p.description, ''), ' ')
+         FROM incident_participants p WHERE p.incident_id = i.id),
+        (SELECT group_concat(n.note, ' ')
+         FROM incident_notes n WHERE n.incident_id = i.id)'''
+
+# One incident_search row per incident, its rowid the incident's key in
+# incident_keys. Keys are INTEGER PRIMARY KEY values, so VACUUM keeps them.
+INCIDENT_SEARCH_REFRESH = f'''
+    INSERT OR IGNORE INTO incident_keys (incident_id) SELECT id FROM incidents WHERE id = {{incident_id}};
+    DELETE FROM incident_search WHERE rowid = (SELECT id FROM incident_keys WHERE incident_id = {{incident_id}});
+    INSERT INTO incident_search (rowid, title, description, address, postcode, participants, notes)
+    SELECT k.id, {INCIDENT_SEARCH_COLUMNS}
+    FROM incidents i JOIN incident_keys k ON k.incident_id = i.id
+    WHERE i.id = {{incident_id}};
+'''
+
+INCIDENT_SEARCH_DELETE = '''
+    DELETE FROM incident_search WHERE rowid = (SELECT id FROM incident_keys WHERE incident_id = old.id);
+'''
+
+# As released in migration 6: keyed by incidents.rowid, which VACUUM may
+# renumber. Replaced by migration 11.
+INCIDENT_SEARCH_REFRESH_BY_ROWID = f'''
+    DELETE FROM incident_search WHERE rowid = (SELECT rowid FROM incidents WHERE id = {{incident_id}});
+    INSERT INTO incident_search (rowid, title, description, address, postcode, participants, notes)
+    SELECT i.rowid, {INCIDENT_SEARCH_COLUMNS}
+    FROM incidents i WHERE i.id = {{incident_id}};
+'''
+
+def incident_search_triggers(refresh, delete):
+    """(trigger name, event, statement body) keeping incident_search in sync"""
+    return (
+        ('incident_search_incident_insert', 'AFTER INSERT ON incidents',
+         refresh.format(incident_id='new.id')),
+        ('incident_search_incident_update', 'AFTER UPDATE OF title, description, address, postcode ON incidents',
+         refresh.format(incident_id='new.id')),
+        ('incident_search_incident_delete', 'AFTER DELETE ON incidents', delete),
+        ('incident_search_participant_insert', 'AFTER INSERT ON incident_participants',
+         refresh.format(incident_id='new.incident_id')),
+        ('incident_search_participant_update', 'AFTER UPDATE ON incident_participants',
+         refresh.format(incident_id='old.incident_id') + refresh.format(incident_id='new.incident_id')),
+        ('incident_search_participant_delete', 'AFTER DELETE ON incident_participants',
+         refresh.format(incident_id='old.incident_id')),
+        ('incident_search_note_insert', 'AFTER INSERT ON incident_notes',
+         refresh.format(incident_id='new.incident_id')),
+        ('incident_search_note_update', 'AFTER UPDATE ON incident_notes',
+         refresh.format(incident_id='old.incident_id') + refresh.format(incident_id='new.incident_id')),
+        ('incident_search_note_delete', 'AFTER DELETE ON incident_notes',
+         refresh.format(incident_id='old.incident_id')),
+    )
+
+INCIDENT_SEARCH_TRIGGERS = incident_search_triggers(INCIDENT_SEARCH_REFRESH, INCIDENT_SEARCH_DELETE)
+
+def migration_6_incident_search(cursor):
+    """Full-text search over incidents, participants and notes"""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS incident_search USING fts5(
+            title, description, address, postcode, participants, notes,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    
+    # bm25 column weights: a hit in the title counts most, notes least
+    cursor.execute('''
+        INSERT INTO incident_search (incident_search, rank)
+        VALUES ('rank', 'bm25(10.0, 4.0, 3.0, 3.0, 2.0, 1.0)')
+    ''')
+    
+    triggers = incident_search_triggers(INCIDENT_SEARCH_REFRESH_BY_ROWID,
+                                        'DELETE FROM incident_search WHERE rowid = old.rowid;')
+    for name, event, body in triggers:
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+    
+    cursor.execute(f'''
+        INSERT INTO incident_search (rowid, title, description, address, postcode, participants, notes)
+        SELECT i.rowid, {INCIDENT_SEARCH_COLUMNS}
+        FROM incidents i
+    ''')
+
+def rebuild_incident_search(cursor):
+    """Repopulate incident_search from scratch (python database.py --rebuild-indexes)"""
+    cursor.execute('INSERT OR IGNORE INTO incident_keys (incident_id) SELECT id FROM incidents ORDER BY created_at, id')
+    cursor.execute('DELETE FROM incident_search')
+    cursor.execute(f'''
+        INSERT INTO incident_search (rowid, title, description, address, postcode, participants, notes)
+        SELECT k.id, {INCIDENT_SEARCH_COLUMNS}
+        FROM incidents i JOIN incident_keys k ON k.incident_id = i.id
+    ''')
+
+# R*Tree rows mirror the typed coordinate columns. incident_locations is
+# keyed by the incident's key in incident_keys (stable across VACUUM),
+# patrol_positions by users.id and only holds users who are on patrol and
+# have reported a position.
+INCIDENT_LOCATION_TRIGGERS = (
+    ('incident_locations_insert', 'AFTER INSERT ON incidents WHEN new.latitude IS NOT NULL',
+     '''INSERT OR IGNORE INTO incident_keys (incident_id) VALUES (new.id);
+        INSERT OR REPLACE INTO incident_locations
+        SELECT k.id, new.latitude, new.latitude, new.longitude, new.longitude
+        FROM incident_keys k WHERE k.incident_id = new.id AND new.longitude IS NOT NULL;'''),
+    ('incident_locations_update', 'AFTER UPDATE OF latitude, longitude ON incidents',
+     '''DELETE FROM incident_locations WHERE id = (SELECT id FROM incident_keys WHERE incident_id = old.id);
+        INSERT OR IGNORE INTO incident_keys (incident_id) VALUES (new.id);
+        INSERT INTO incident_locations
+        SELECT k.id, new.latitude, new.latitude, new.longitude, new.longitude
+        FROM incident_keys k
+        WHERE k.incident_id = new.id AND new.latitude IS NOT NULL AND new.longitude IS NOT NULL;'''),
+    ('incident_locations_delete', 'AFTER DELETE ON incidents',
+     'DELETE FROM incident_locations WHERE id = (SELECT id FROM incident_keys WHERE incident_id = old.id);'),
+)
+
+# As released in migration 7: keyed by incidents.rowid, which VACUUM may
+# renumber. Replaced by migration 12.
+INCIDENT_LOCATION_TRIGGERS_BY_ROWID = (
+    ('incident_locations_insert', 'AFTER INSERT ON incidents WHEN new.latitude IS NOT NULL',
+     '''INSERT INTO incident_locations VALUES
+        (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);'''),
+    ('incident_locations_update', 'AFTER UPDATE OF latitude, longitude ON incidents',
+     '''DELETE FROM incident_locations WHERE id = old.rowid;
+        INSERT INTO incident_locations
+        SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;'''),
+    ('incident_locations_delete', 'AFTER DELETE ON incidents',
+     'DELETE FROM incident_locations WHERE id = old.rowid;'),
+)
+
+PATROL_POSITION_TRIGGERS = (
+    ('patrol_positions_update', 'AFTER UPDATE OF last_latitude, last_longitude, on_patrol ON users',
+     '''DELETE FROM patrol_positions WHERE id = old.id;
+        INSERT INTO patrol_positions
+        SELECT new.id, new.last_latitude, new.last_latitude, new.last_longitude, new.last_longitude
+        WHERE new.on_patrol AND new.last_latitude IS NOT NULL AND new.last_longitude IS NOT NULL;'''),
+    ('patrol_positions_delete', 'AFTER DELETE ON users',
+     'DELETE FROM patrol_positions WHERE id = old.id;'),
+)
+
+def migration_7_spatial_index(cursor):
+    """Typed coordinates and R*Tree indexes for incidents and patrols"""
+    add_column_if_missing(cursor, 'incidents', 'latitude', 'REAL')
+    add_column_if_missing(cursor, 'incidents', 'longitude', 'REAL')
+    add_column_if_missing(cursor, 'users', 'last_latitude', 'REAL')
+    add_column_if_missing(cursor, 'users', 'last_longitude', 'REAL')
+    add_column_if_missing(cursor, 'users', 'position_updated_at', 'TIMESTAMP')
+    
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS incident_locations
+        USING rtree(id, min_lat, max_lat, min_lng, max_lng)
+    ''')
+    
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS patrol_positions
+        USING rtree(id, min_lat, max_lat, min_lng, max_lng)
+    ''')
+    
+    # Incidents created by the app kept their {lat, lng} only in metadata
+    cursor.execute('''
+        UPDATE incidents
+        SET latitude = json_extract(metadata, '$.location.lat'),
+            longitude = json_extract(metadata, '$.location.lng')
+        WHERE latitude IS NULL AND json_valid(metadata)
+          AND typeof(json_extract(metadata, '$.location.lat')) IN ('real', 'integer')
+          AND typeof(json_extract(metadata, '$.location.lng')) IN ('real', 'integer')
+          AND json_extract(metadata, '$.location.lat') BETWEEN -90 AND 90
+          AND json_extract(metadata, '$.location.lng') BETWEEN -180 AND 180
+    ''')
+    
+    for name, event, body in INCIDENT_LOCATION_TRIGGERS_BY_ROWID + PATROL_POSITION_TRIGGERS:
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+    
+    cursor.execute('''
+        INSERT INTO incident_locations
+        SELECT rowid, latitude, latitude, longitude, longitude FROM incidents
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''')
+    rebuild_patrol_positions(cursor)
+
+def rebuild_spatial_index(cursor):
+    """Repopulate both R*Trees from the coordinate columns"""
+    cursor.execute('INSERT OR IGNORE INTO incident_keys (incident_id) SELECT id FROM incidents ORDER BY created_at, id')
+    cursor.execute('DELETE FROM incident_locations')
+    cursor.execute('''
+        INSERT INTO incident_locations
+        SELECT k.id, i.latitude, i.latitude, i.longitude, i.longitude
+        FROM incidents i JOIN incident_keys k ON k.incident_id = i.id
+        WHERE i.latitude IS NOT NULL AND i.longitude IS NOT NULL
+    ''')
+    rebuild_patrol_positions(cursor)
+
+def rebuild_patrol_positions(cursor):
+    cursor.execute('DELETE FROM patrol_positions')
+    cursor.execute('''
+        INSERT INTO patrol_positions
+        SELECT id, last_latitude, last_latitude, last_longitude, last_longitude FROM users
+        WHERE on_patrol AND last_latitude IS NOT NULL AND last_longitude IS NOT NULL
+    ''')
+
+def migration_8_incident_versions(cursor):
+    """Incident version numbers for optimistic concurrency"""
+    add_column_if_missing(cursor, 'incidents', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+# Every change to these columns makes the cached roster lists stale;
+# position-only updates (every 30 s per patrol) deliberately don't
+CACHED_USER_COLUMNS = 'phone, name, email, callsign, role, avatar, on_duty, on_patrol'
+
+CACHE_VERSION_TRIGGERS = (
+    ('cache_version_users_insert', 'AFTER INSERT ON users', 'users'),
+    ('cache_version_users_update', f'AFTER UPDATE OF {CACHED_USER_COLUMNS} ON users', 'users'),
+    ('cache_version_users_delete', 'AFTER DELETE ON users', 'users'),
+    ('cache_version_suspects_insert', 'AFTER INSERT ON suspects', 'suspects'),
+    ('cache_version_suspects_update', 'AFTER UPDATE ON suspects', 'suspects'),
+    ('cache_version_suspects_delete', 'AFTER DELETE ON suspects', 'suspects'),
+    ('cache_version_vehicles_insert', 'AFTER INSERT ON vehicles', 'vehicles'),
+    ('cache_version_vehicles_update', 'AFTER UPDATE ON vehicles', 'vehicles'),
+    ('cache_version_vehicles_delete', 'AFTER DELETE ON vehicles', 'vehicles'),
+)
+
+def migration_9_cache_versions(cursor):
+    """Version counters that invalidate the cached user, suspect and vehicle lists"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.executemany('INSERT OR IGNORE INTO cache_versions (name) VALUES (?)',
+                       [(name,) for name in sorted({table for _, _, table in CACHE_VERSION_TRIGGERS})])
+    
+    # Bumped inside the writing transaction, so every worker sees the new
+    # version exactly when it can see the new rows
+    for name, event, table in CACHE_VERSION_TRIGGERS:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN
+                UPDATE cache_versions SET version = version + 1 WHERE name = '{table}';
+            END
+        ''')
+
+def migration_10_notification_indexes(cursor):
+    """Per-user notification cursor and partial unread index"""
+    # Unread checks and counts touch only unread rows; the full per-user
+    # index serves history reads and replaces (user_phone, is_read)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_phone, id) WHERE is_read = 0')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_phone, id)')
+    cursor.execute('DROP INDEX IF EXISTS idx_notifications_user_read')
+    cursor.execute('UPDATE notifications SET is_read = 0 WHERE is_read IS NULL')
+
+def migration_11_stable_incident_keys(cursor):
+    """Key incident_search by stable integer incident keys instead of rowids"""
+    # Keys outlive their incident, so a re-created incident gets its old key
+    # back and a deleted one's key is never handed to another incident
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS incident_keys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            incident_id TEXT UNIQUE NOT NULL
+        )
+    ''')
+    
+    for name, event, body in INCIDENT_SEARCH_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {event} BEGIN {body} END')
+    
+    rebuild_incident_search(cursor)
+
+def migration_12_stable_incident_locations(cursor):
+    """Key incident_locations by stable integer incident keys instead of rowids"""
+    for name, event, body in INCIDENT_LOCATION_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {event} BEGIN {body} END')
+    
+    rebuild_spatial_index(cursor)
+
+# (version, migration) pairs, applied in order. Never edit a released
+# migration - append a new one. Each must be safe on a database that
+# predates user_version tracking, hence IF NOT EXISTS everywhere.
+MIGRATIONS = [
+    (1, migration_1_initial_schema),
+    (2, migration_2_incident_sync),
+    (3, migration_3_ptt_audio_store),
+    (4, migration_4_hot_path_indexes),
+    (5, migration_5_otp_store),
+    (6, migration_6_incident_search),
+    (7, migration_7_spatial_index),
+    (8, migration_8_incident_versions),
+    (9, migration_9_cache_versions),
+    (10, migration_10_notification_indexes),
+    (11, migration_11_stable_incident_keys),
+    (12, migration_12_stable_incident_locations),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations, each in its own transaction
+    
+    The version is re-read under BEGIN IMMEDIATE so concurrent workers
+    starting together apply each migration exactly once.
+    """
+    applied = []
+    for version, migration in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"✅ Applied migration {version}: {migration.__doc__}")
+    return applied
+
+def init_db():
+    """Initialize database: apply pending schema migrations and data moves"""
+    conn = get_db()
+    migrate(conn)
+    migrate_ptt_audio_to_files(conn)
     conn.close()
     print("✅ Database initialized successfully!")
 
+def add_column_if_missing(cursor, table, column, definition):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def migrate_ptt_audio_to_files(conn, batch_size=50):
+    """One-shot move of PTT audio BLOBs into the file store
+    
+    Safe to re-run: only rows without an audio_hash are touched, in batches
+    so the write lock is never held for long.
+    """
+    cursor = conn.cursor()
+    moved = 0
+    while True:
+        cursor.execute('''
+            SELECT id, audio_data FROM ptt_messages
+            WHERE audio_hash IS NULL
+            ORDER BY id
+            LIMIT ?
+        ''', (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        
+        for row in rows:
+            audio_data = row[1] or b''
+            audio_hash = audio_store.store_audio(audio_data)
+            cursor.execute('''
+                UPDATE ptt_messages
+                SET audio_hash = ?, audio_size = ?, audio_data = X''
+                WHERE id = ?
+            ''', (audio_hash, len(audio_data), row[0]))
+        conn.commit()
+        moved += len(rows)
+    
+    if moved:
+        print(f"✅ Moved {moved} PTT clips to the audio store")
+    return moved
+
 def row_to_dict(row):
     """Convert sqlite3.Row to dictionary"""
     if row is None:
@@ -252,3 +878,15 @@ def rows_to_list(rows):
 # Initialize database on import
 if not os.path.exists(DB_PATH):
     init_db()
+
+if __name__ == '__main__':
+    # Run at deploy time (Procfile release phase): python database.py
+    init_db()
+    conn = get_db()
+    if '--rebuild-indexes' in sys.argv:
+        rebuild_incident_search(conn.cursor())
+        rebuild_spatial_index(conn.cursor())
+        conn.commit()
+        print("✅ Rebuilt incident search and spatial indexes")
+    print(f"Schema version: {get_schema_version(conn)}")
+    conn.close()
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+
+import geo
+from database import SYNC_TIMESTAMP_SQL
+
+# The ranking score is a distance in meters: a responder's real distance
+# plus these penalties, so "one open job" reads as "a kilometre further away"
+DISPATCH_ASSIGNMENT_PENALTY_M = float(os.environ.get('DISPATCH_ASSIGNMENT_PENALTY_M', 1000))
+DISPATCH_OFF_PATROL_PENALTY_M = float(os.environ.get('DISPATCH_OFF_PATROL_PENALTY_M', 500))
+
+# Dispatchers and coordinators run the incident; send them only when nobody else is close
+ROLE_PENALTY_M = {
+    'Member': 0.0,
+    'Coordinator': 1500.0,
+    'Dispatcher': 5000.0,
+}
+DEFAULT_ROLE_PENALTY_M = 0.0
+
+DEFAULT_DISPATCH_LIMIT = 10
+MAX_DISPATCH_LIMIT = 100
+
+# Assignments that still tie a responder up
+OPEN_ASSIGNMENT_STATUSES = ('pending', 'accepted')
+CLOSED_INCIDENT_STATUSES = ('completed', 'cancelled')
+
+def load_candidates(cursor, incident_id):
+    """Every on-duty or on-patrol user with their open assignment count, one query"""
+    cursor.execute(f'''
+        SELECT u.phone, u.name, u.callsign, u.role, u.on_duty, u.on_patrol,
+            u.last_latitude AS latitude, u.last_longitude AS longitude, u.position_updated_at,
+            COALESCE(open.count, 0) AS open_assignments,
+            EXISTS (
+                SELECT 1 FROM incident_assignments mine
+                WHERE mine.incident_id = ? AND mine.user_phone = u.phone
+                  AND mine.status IN ({', '.join('?' for _ in OPEN_ASSIGNMENT_STATUSES)})
+            ) AS already_assigned
+        FROM users u
+        LEFT JOIN (
+            SELECT a.user_phone, COUNT(*) AS count
+            FROM incident_assignments a
+            JOIN incidents i ON i.id = a.incident_id
+            WHERE a.status IN ({', '.join('?' for _ in OPEN_ASSIGNMENT_STATUSES)})
+              AND i.status NOT IN ({', '.join('?' for _ in CLOSED_INCIDENT_STATUSES)})
+            GROUP BY a.user_phone
+        ) open ON open.user_phone = u.phone
+        WHERE u.on_duty = 1 OR u.on_patrol = 1
+    ''', (incident_id, *OPEN_ASSIGNMENT_STATUSES, *OPEN_ASSIGNMENT_STATUSES, *CLOSED_INCIDENT_STATUSES))
+    return [dict(row) for row in cursor.fetchall()]
+
+def rank_responders(point, candidates):
+    """Candidates sorted best first, each with distance_m and score_m added
+
+    Distances for all positioned candidates are computed in one batch.
+    Candidates without a known position go last, ordered by workload.
+    """
+    located = [c for c in candidates if c['latitude'] is not None and c['longitude'] is not None]
+    unlocated = [c for c in candidates if c['latitude'] is None or c['longitude'] is None]
+
+    distances = geo.haversine_many(point[0], point[1],
+                                   [c['latitude'] for c in located], [c['longitude'] for c in located])
+    for candidate, distance in zip(located, distances):
+        candidate['distance_m'] = round(distance, 1)
+        candidate['score_m'] = round(
+            distance
+            + candidate['open_assignments'] * DISPATCH_ASSIGNMENT_PENALTY_M
+            + ROLE_PENALTY_M.get(candidate['role'], DEFAULT_ROLE_PENALTY_M)
+            + (0.0 if candidate['on_patrol'] else DISPATCH_OFF_PATROL_PENALTY_M), 1)
+    for candidate in unlocated:
+        candidate['distance_m'] = None
+        candidate['score_m'] = None
+
+    located.sort(key=lambda c: c['score_m'])
+    unlocated.sort(key=lambda c: (c['open_assignments'], ROLE_PENALTY_M.get(c['role'], DEFAULT_ROLE_PENALTY_M),
+                                  (c['name'] or '').lower()))
+    return located + unlocated
+
+def assign_responders(cursor, incident_id, phones, assigned_by=None):
+    """Write pending assignments for phones in the caller's transaction; returns the new row ids"""
+    ids = []
+    for phone in phones:
+        cursor.execute('''
+            INSERT INTO incident_assignments (incident_id, user_phone, status)
+            VALUES (?, ?, 'pending')
+        ''', (incident_id, phone))
+        ids.append(cursor.lastrowid)
+
+    cursor.execute(f'''
+        UPDATE incidents SET version = version + 1, updated_at = {SYNC_TIMESTAMP_SQL}
+        WHERE id = ?
+    ''', (incident_id,))
+    cursor.execute('''
+        INSERT INTO incident_history (incident_id, user_phone, action, details)
+        VALUES (?, ?, 'dispatched', ?)
+    ''', (incident_id, assigned_by, json.dumps(phones)))
+    return ids
+
+def benchmark(units=(100, 500, 2000), repeat=50):
+    """Time rank_responders on synthetic responders around London"""
+    import random
+
+    rng = random.Random(7)
+    roles = list(ROLE_PENALTY_M)
+    print(f"distances via {'numpy' if geo.numpy is not None else 'pure Python'}")
+    for count in units:
+        template = [{
+            'phone': f'+4477009{i:05d}', 'name': f'Unit {i}', 'role': rng.choice(roles),
+            'on_patrol': rng.random() < 0.7, 'open_assignments': rng.randint(0, 3),
+            'latitude': 51.5 + rng.uniform(-0.2, 0.2) if rng.random() < 0.95 else None,
+            'longitude': -0.1 + rng.uniform(-0.3, 0.3),
+        } for i in range(count)]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rank_responders((51.55, -0.07), [dict(c) for c in template])
+        ms = (time.perf_counter() - started) / repeat * 1000
+        print(f'  {count:>5} responders  {ms:6.2f} ms per ranking')
+
+if __name__ == '__main__':
+    # python dispatch.py - ranking cost by number of active responders
+    benchmark()
@@ -0,0 +1,113 @@
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+# Largest radius accepted by the spatial endpoints; a bbox side may be at
+# most the diameter of that circle
+MAX_RADIUS_M = 50000
+
+def parse_point(value):
+    """(lat, lng) from {'lat': .., 'lng': ..} / [lat, lng], or None if absent or invalid"""
+    if isinstance(value, dict):
+        lat, lng = value.get('lat', value.get('latitude')), value.get('lng', value.get('longitude'))
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        lat, lng = value
+    else:
+        return None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def haversine_many(lat, lng, lats, lngs):
+    """Distances in meters from (lat, lng) to each (lats[i], lngs[i]), as a list
+
+    One vectorized pass with numpy when it is installed; otherwise a tight
+    loop that hoists everything depending only on the origin.
+    """
+    if numpy is not None:
+        phi = numpy.radians(numpy.asarray(lats, dtype=float))
+        dlambda = numpy.radians(numpy.asarray(lngs, dtype=float) - lng)
+        phi0 = math.radians(lat)
+        a = numpy.sin((phi - phi0) / 2) ** 2 + math.cos(phi0) * numpy.cos(phi) * numpy.sin(dlambda / 2) ** 2
+        return (2 * EARTH_RADIUS_M * numpy.arcsin(numpy.sqrt(a))).tolist()
+
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    phi0 = radians(lat)
+    cos_phi0 = cos(phi0)
+    diameter = 2 * EARTH_RADIUS_M
+    distances = []
+    for lat2, lng2 in zip(lats, lngs):
+        phi = radians(lat2)
+        a = sin((phi - phi0) / 2) ** 2 + cos_phi0 * cos(phi) * sin(radians(lng2 - lng) / 2) ** 2
+        distances.append(diameter * asin(sqrt(a)))
+    return distances
+
+def bbox_around(lat, lng, radius_m):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle; a superset, refine with haversine_m"""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return (max(lat - dlat, -90.0), min(lat + dlat, 90.0),
+            max(lng - dlng, -180.0), min(lng + dlng, 180.0))
+
+def parse_area(args):
+    """Search area from query args: bbox=minLng,minLat,maxLng,maxLat or lat, lng, radius (m)
+
+    Returns (bbox, center, radius_m); center and radius_m are None for a bbox.
+    Raises ValueError on missing or invalid input.
+    """
+    if args.get('bbox'):
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in args['bbox'].split(','))
+        except ValueError:
+            raise ValueError('bbox must be minLng,minLat,maxLng,maxLat')
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValueError('bbox minimums must not exceed maximums')
+        if not (-90 <= min_lat and max_lat <= 90 and -180 <= min_lng and max_lng <= 180):
+            raise ValueError('bbox must be within -180..180 longitude and -90..90 latitude')
+        # Widest at the latitude nearest the equator
+        equatorward_lat = 0.0 if min_lat <= 0 <= max_lat else min(abs(min_lat), abs(max_lat))
+        height_m = (max_lat - min_lat) * METERS_PER_DEGREE_LAT
+        width_m = (max_lng - min_lng) * METERS_PER_DEGREE_LAT * math.cos(math.radians(equatorward_lat))
+        if max(height_m, width_m) > 2 * MAX_RADIUS_M:
+            raise ValueError(f'bbox sides must be at most {2 * MAX_RADIUS_M} meters')
+        return (min_lat, max_lat, min_lng, max_lng), None, None
+
+    center = parse_point([args.get('lat'), args.get('lng')])
+    if center is None:
+        raise ValueError('lat and lng (or bbox) are required')
+    try:
+        radius_m = float(args.get('radius', 500))
+    except ValueError:
+        raise ValueError('radius must be a number of meters')
+    if not 0 < radius_m <= MAX_RADIUS_M:
+        raise ValueError(f'radius must be between 0 and {MAX_RADIUS_M} meters')
+    return bbox_around(center[0], center[1], radius_m), center, radius_m
+
+def filter_by_distance(rows, center, radius_m, lat_key='latitude', lng_key='longitude'):
+    """Keep rows within radius_m of center, nearest first, adding distance_m"""
+    kept = []
+    for row in rows:
+        distance = haversine_m(center[0], center[1], row[lat_key], row[lng_key])
+        if distance <= radius_m:
+            row['distance_m'] = round(distance, 1)
+            kept.append(row)
+    kept.sort(key=lambda row: row['distance_m'])
+    return kept
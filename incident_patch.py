@@ -0,0 +1,278 @@
+import geo
+
+class PatchError(ValueError):
+    """The patch is malformed or targets something that does not exist"""
+
+class PatchTestFailed(PatchError):
+    """A 'test' operation did not match the current value"""
+
+# JSON field -> incidents column
+INCIDENT_FIELDS = {
+    'status': 'status',
+    'title': 'title',
+    'type': 'type',
+    'description': 'description',
+    'address': 'address',
+    'postcode': 'postcode',
+}
+
+CALLER_FIELDS = {
+    'name': 'caller_name',
+    'phone': 'caller_phone',
+    'isVictim': 'caller_is_victim',
+    'isWitness': 'caller_is_witness',
+}
+
+# NOT NULL columns that cannot be removed
+REQUIRED_COLUMNS = {'title', 'type', 'description'}
+
+POLICE_FIELDS = {
+    'cadRef': 'cad_ref',
+    'crisRef': 'cris_ref',
+    'chsRef': 'chs_ref',
+    'officerName': 'officer_name',
+    'officerBadge': 'officer_badge',
+}
+
+PARTICIPANT_COLLECTIONS = {'victims': 'victim', 'witnesses': 'witness', 'suspects': 'suspect'}
+PARTICIPANT_FIELDS = ('name', 'phone', 'address', 'description')
+
+def parse_pointer(path):
+    """'/victims/7/name' -> ['victims', '7', 'name']"""
+    if not isinstance(path, str) or not path.startswith('/'):
+        raise PatchError(f'Invalid path: {path!r}')
+    return [part.replace('~1', '/').replace('~0', '~') for part in path[1:].split('/')]
+
+def parse_row_id(part, path):
+    try:
+        return int(part)
+    except ValueError:
+        raise PatchError(f'{path}: child rows are addressed by id')
+
+def require_value(operation):
+    if 'value' not in operation:
+        raise PatchError(f"{operation['path']}: '{operation['op']}' needs a value")
+    return operation['value']
+
+def is_scalar(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+def require_scalar(operation):
+    """The value of an operation that writes one column"""
+    value = require_value(operation)
+    if not is_scalar(value):
+        raise PatchError(f"{operation['path']} must be a string, number, boolean or null")
+    return value
+
+def require_scalar_fields(value, fields, path):
+    """The new child row's column values (an object of scalars)"""
+    for field in fields:
+        if not is_scalar(value.get(field)):
+            raise PatchError(f'{path}: {field} must be a string, number, boolean or null')
+
+def scalar_op(cursor, incident_id, operation, column):
+    """add / replace / remove / test on one incidents column"""
+    op = operation['op']
+    cursor.execute(f'SELECT {column} FROM incidents WHERE id = ?', (incident_id,))
+    old = cursor.fetchone()[0]
+
+    if op == 'test':
+        if old != require_value(operation):
+            raise PatchTestFailed(f"{operation['path']}: expected {operation['value']!r}, found {old!r}")
+        return None
+    if op == 'remove':
+        if column in REQUIRED_COLUMNS:
+            raise PatchError(f"{operation['path']} cannot be removed")
+        value = None
+    else:
+        value = require_scalar(operation)
+        if column in REQUIRED_COLUMNS and (not isinstance(value, str) or not value.strip()):
+            raise PatchError(f"{operation['path']} must be a non-empty string")
+
+    cursor.execute(f'UPDATE incidents SET {column} = ? WHERE id = ?', (value, incident_id))
+    return {'op': op, 'path': operation['path'], 'value': value, 'old': old}
+
+def location_op(cursor, incident_id, operation):
+    op = operation['op']
+    cursor.execute('SELECT latitude, longitude FROM incidents WHERE id = ?', (incident_id,))
+    row = cursor.fetchone()
+    old = {'lat': row[0], 'lng': row[1]} if row[0] is not None else None
+
+    if op == 'test':
+        if old != require_value(operation):
+            raise PatchTestFailed(f"/location: expected {operation['value']!r}, found {old!r}")
+        return None
+    if op == 'remove':
+        point = (None, None)
+    else:
+        point = geo.parse_point(require_value(operation))
+        if point is None:
+            raise PatchError('/location needs valid lat and lng')
+
+    cursor.execute('UPDATE incidents SET latitude = ?, longitude = ? WHERE id = ?',
+                   (point[0], point[1], incident_id))
+    value = {'lat': point[0], 'lng': point[1]} if point[0] is not None else None
+    return {'op': op, 'path': '/location', 'value': value, 'old': old}
+
+def police_info_op(cursor, incident_id, operation, column):
+    op = operation['op']
+    if op not in ('add', 'replace', 'remove'):
+        raise PatchError(f"{operation['path']}: '{op}' is not supported here")
+    value = None if op == 'remove' else require_scalar(operation)
+
+    cursor.execute(f'SELECT id, {column} FROM incident_police_info WHERE incident_id = ? ORDER BY id LIMIT 1',
+                   (incident_id,))
+    row = cursor.fetchone()
+    if row:
+        cursor.execute(f'UPDATE incident_police_info SET {column} = ? WHERE id = ?', (value, row[0]))
+        old = row[1]
+    else:
+        cursor.execute(f'INSERT INTO incident_police_info (incident_id, {column}) VALUES (?, ?)',
+                       (incident_id, value))
+        old = None
+    return {'op': op, 'path': operation['path'], 'value': value, 'old': old}
+
+def child_row(cursor, table, incident_id, row_id, path, extra_where='', extra_params=()):
+    cursor.execute(f'SELECT * FROM {table} WHERE id = ? AND incident_id = ?{extra_where}',
+                   (row_id, incident_id) + tuple(extra_params))
+    row = cursor.fetchone()
+    if row is None:
+        raise PatchError(f'{path}: no such row')
+    return dict(row)
+
+def participant_op(cursor, incident_id, operation, parts):
+    op = operation['op']
+    collection, participant_type = parts[0], PARTICIPANT_COLLECTIONS[parts[0]]
+    path = operation['path']
+
+    if op == 'add' and parts[1:] == ['-']:
+        value = require_value(operation)
+        if not isinstance(value, dict) or not value.get('name'):
+            raise PatchError(f'{path}: value needs a name')
+        require_scalar_fields(value, PARTICIPANT_FIELDS, path)
+        cursor.execute('''
+            INSERT INTO incident_participants (incident_id, type, name, phone, address, description)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (incident_id, participant_type, value['name'], value.get('phone'),
+              value.get('address'), value.get('description')))
+        return {'op': 'add', 'path': f'/{collection}/{cursor.lastrowid}', 'value': value}
+
+    row_id = parse_row_id(parts[1], path)
+    old = child_row(cursor, 'incident_participants', incident_id, row_id, path, ' AND type = ?', (participant_type,))
+
+    if op == 'remove' and len(parts) == 2:
+        cursor.execute('DELETE FROM incident_participants WHERE id = ?', (row_id,))
+        return {'op': 'remove', 'path': path, 'old': old}
+
+    if op in ('add', 'replace') and len(parts) == 3 and parts[2] in PARTICIPANT_FIELDS:
+        value = require_scalar(operation)
+        if parts[2] == 'name' and not value:
+            raise PatchError(f'{path} must not be empty')
+        cursor.execute(f'UPDATE incident_participants SET {parts[2]} = ? WHERE id = ?', (value, row_id))
+        return {'op': op, 'path': path, 'value': value, 'old': old[parts[2]]}
+
+    raise PatchError(f"{path}: '{op}' is not supported here")
+
+def note_op(cursor, incident_id, operation, parts, user_phone):
+    op = operation['op']
+    path = operation['path']
+
+    if op == 'add' and parts[1:] == ['-']:
+        value = require_value(operation)
+        if isinstance(value, str):
+            value = {'note': value}
+        if not isinstance(value, dict) or not value.get('note'):
+            raise PatchError(f'{path}: value needs note text')
+        require_scalar_fields(value, ('note', 'user_phone', 'isFollowUp'), path)
+        cursor.execute('''
+            INSERT INTO incident_notes (incident_id, user_phone, note, is_follow_up)
+            VALUES (?, ?, ?, ?)
+        ''', (incident_id, value.get('user_phone') or user_phone or '', value['note'],
+              value.get('isFollowUp', False)))
+        return {'op': 'add', 'path': f'/notes/{cursor.lastrowid}', 'value': value}
+
+    row_id = parse_row_id(parts[1], path)
+    old = child_row(cursor, 'incident_notes', incident_id, row_id, path)
+
+    if op == 'remove' and len(parts) == 2:
+        cursor.execute('DELETE FROM incident_notes WHERE id = ?', (row_id,))
+        return {'op': 'remove', 'path': path, 'old': old}
+
+    if op == 'replace' and parts[2:] in (['note'], ['isFollowUp']):
+        column = 'note' if parts[2] == 'note' else 'is_follow_up'
+        value = require_scalar(operation)
+        cursor.execute(f'UPDATE incident_notes SET {column} = ? WHERE id = ?', (value, row_id))
+        return {'op': op, 'path': path, 'value': value, 'old': old[column]}
+
+    raise PatchError(f"{path}: '{op}' is not supported here")
+
+def assignment_op(cursor, incident_id, operation, parts):
+    op = operation['op']
+    path = operation['path']
+
+    if op == 'add' and parts[1:] == ['-']:
+        value = require_value(operation)
+        if isinstance(value, str):
+            value = {'user_phone': value}
+        if not isinstance(value, dict) or not value.get('user_phone'):
+            raise PatchError(f'{path}: value needs a user_phone')
+        require_scalar_fields(value, ('user_phone', 'status'), path)
+        cursor.execute('''
+            INSERT INTO incident_assignments (incident_id, user_phone, status)
+            VALUES (?, ?, ?)
+        ''', (incident_id, value['user_phone'], value.get('status', 'pending')))
+        return {'op': 'add', 'path': f'/assignedUsers/{cursor.lastrowid}', 'value': value}
+
+    row_id = parse_row_id(parts[1], path)
+    old = child_row(cursor, 'incident_assignments', incident_id, row_id, path)
+
+    if op == 'remove' and len(parts) == 2:
+        cursor.execute('DELETE FROM incident_assignments WHERE id = ?', (row_id,))
+        return {'op': 'remove', 'path': path, 'old': old}
+
+    if op == 'replace' and parts[2:] == ['status']:
+        value = require_scalar(operation)
+        cursor.execute('UPDATE incident_assignments SET status = ? WHERE id = ?', (value, row_id))
+        return {'op': op, 'path': path, 'value': value, 'old': old['status']}
+
+    raise PatchError(f"{path}: '{op}' is not supported here")
+
+def apply_operation(cursor, incident_id, operation, user_phone):
+    if not isinstance(operation, dict) or operation.get('op') not in ('add', 'remove', 'replace', 'test'):
+        raise PatchError('Each operation needs an op of add, remove, replace or test')
+    parts = parse_pointer(operation.get('path'))
+    head = parts[0]
+
+    if len(parts) == 1 and head in INCIDENT_FIELDS:
+        return scalar_op(cursor, incident_id, operation, INCIDENT_FIELDS[head])
+    if len(parts) == 2 and head == 'caller' and parts[1] in CALLER_FIELDS:
+        return scalar_op(cursor, incident_id, operation, CALLER_FIELDS[parts[1]])
+    if parts == ['location']:
+        return location_op(cursor, incident_id, operation)
+    if len(parts) == 2 and head == 'policeInfo' and parts[1] in POLICE_FIELDS:
+        return police_info_op(cursor, incident_id, operation, POLICE_FIELDS[parts[1]])
+    if operation['op'] == 'test':
+        raise PatchError(f"{operation['path']}: 'test' is only supported on incident fields")
+    if len(parts) >= 2 and head in PARTICIPANT_COLLECTIONS:
+        return participant_op(cursor, incident_id, operation, parts)
+    if len(parts) >= 2 and head == 'notes':
+        return note_op(cursor, incident_id, operation, parts, user_phone)
+    if len(parts) >= 2 and head == 'assignedUsers':
+        return assignment_op(cursor, incident_id, operation, parts)
+
+    raise PatchError(f"Unsupported path: {operation['path']}")
+
+def apply_incident_patch(cursor, incident_id, operations, user_phone=None):
+    """Apply operations in order inside the caller's transaction; returns the diff
+
+    Raises PatchError (or PatchTestFailed) on the first bad operation - the
+    caller must roll back, since earlier operations have already run.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise PatchError('Patch must be a non-empty list of operations')
+    diff = []
+    for operation in operations:
+        change = apply_operation(cursor, incident_id, operation, user_phone)
+        if change is not None:
+            diff.append(change)
+    return diff
@@ -79,6 +79,8 @@ const state = {
     confirmPasscode: '',
     isConfirmingPasscode: false,
     incidents: [],
+    incidentsSyncToken: null,
+    incidentsEtag: null,
     contacts: [],
     users: [],
     suspects: [],
@@ -176,8 +178,9 @@ function initApp() {
                     updateAvatarDisplays(state.user.avatar);
                 }
                 
-                // Load user's incidents
-                loadIncidents();
+                // Load user's incidents and keep them in sync
+                startIncidentRefresh();
+                startPresenceHeartbeat();
                 
                 // Go directly to main screen
                 showScreen('main-screen');
@@ -200,22 +203,208 @@ function initApp() {
     }
 }
 
+// Presence: tell the server we're here so PTT rosters show who is really online
+const PRESENCE_HEARTBEAT_INTERVAL = 30000;
+let presenceTimer = null;
+
+function sendPresenceHeartbeat() {
+    if (!state.user || !state.user.phone) return;
+    fetch(`${API_BASE_URL}/api/presence/heartbeat`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ phone: state.user.phone })
+    }).catch(error => console.error('Presence heartbeat failed:', error));
+}
+
+// Server-side notifications, polled with a cursor alongside the heartbeat
+function fetchServerNotifications() {
+    if (!state.user || !state.user.phone) return;
+    const cursor = parseInt(localStorage.getItem('shomrim_notification_cursor') || '0', 10);
+    fetch(`${API_BASE_URL}/api/notifications?user_phone=${encodeURIComponent(state.user.phone)}&since=${cursor}`)
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data || data.notifications.length === 0) return;
+            data.notifications.forEach(item => {
+                state.notifications.unshift({
+                    id: item.id,
+                    serverId: item.id,
+                    type: item.type,
+                    title: item.title,
+                    message: item.message,
+                    incidentId: item.incident_id,
+                    read: false,
+                    createdAt: item.created_at
+                });
+            });
+            state.notificationCount += data.notifications.length;
+            localStorage.setItem('shomrim_notification_cursor', String(data.cursor));
+            updateNotificationBadge();
+            renderNotificationsList();
+            saveState();
+            if (data.has_more) fetchServerNotifications();
+        })
+        .catch(error => console.error('Notification check failed:', error));
+}
+
+function markServerNotificationsRead(body) {
+    if (!state.user || !state.user.phone) return;
+    fetch(`${API_BASE_URL}/api/notifications/read`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ user_phone: state.user.phone, ...body })
+    }).catch(error => console.error('Marking notifications read failed:', error));
+}
+
+function startPresenceHeartbeat() {
+    if (presenceTimer !== null) return;
+    sendPresenceHeartbeat();
+    fetchServerNotifications();
+    presenceTimer = setInterval(() => {
+        sendPresenceHeartbeat();
+        fetchServerNotifications();
+    }, PRESENCE_HEARTBEAT_INTERVAL);
+}
+
+function stopPresenceHeartbeat() {
+    if (presenceTimer !== null) {
+        clearInterval(presenceTimer);
+        presenceTimer = null;
+    }
+    if (state.user && state.user.phone && navigator.sendBeacon) {
+        navigator.sendBeacon(`${API_BASE_URL}/api/presence/offline`,
+            JSON.stringify({ phone: state.user.phone }));
+    }
+}
+
+window.addEventListener('pagehide', () => {
+    if (state.user && state.user.phone && navigator.sendBeacon) {
+        navigator.sendBeacon(`${API_BASE_URL}/api/presence/offline`,
+            JSON.stringify({ phone: state.user.phone }));
+    }
+});
+
+// Incident list refresh: a delta sync on a timer and whenever the app is shown again
+const INCIDENT_REFRESH_INTERVAL = 30000;
+let incidentRefreshTimer = null;
+
+async function refreshIncidents() {
+    if (!state.user) return;
+    const changed = await loadIncidents();
+    if (changed && state.currentScreen === 'main-screen') {
+        updateCounts();
+        renderIncidentsList(state.currentFilter);
+    }
+}
+
+function startIncidentRefresh() {
+    if (incidentRefreshTimer !== null) return;
+    refreshIncidents();
+    incidentRefreshTimer = setInterval(refreshIncidents, INCIDENT_REFRESH_INTERVAL);
+}
+
+function stopIncidentRefresh() {
+    if (incidentRefreshTimer !== null) {
+        clearInterval(incidentRefreshTimer);
+        incidentRefreshTimer = null;
+    }
+}
+
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible' && incidentRefreshTimer !== null) {
+        refreshIncidents();
+    }
+});
+
 // Load incidents from database
+// First call fetches the full list; later calls ask only for changes since the
+// last sync token and get a 304 when nothing changed. Resolves to true when
+// state.incidents changed.
 async function loadIncidents() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/incidents?user_phone=${encodeURIComponent(state.user.phone || state.user.email)}`);
+        const params = new URLSearchParams({ user_phone: state.user.phone || state.user.email });
+        const headers = {};
+        if (state.incidentsSyncToken !== null) {
+            params.set('since', state.incidentsSyncToken);
+        }
+        if (state.incidentsEtag) {
+            headers['If-None-Match'] = state.incidentsEtag;
+        }
+        
+        const response = await fetch(`${API_BASE_URL}/api/incidents?${params}`, { headers });
+        if (response.status === 304) {
+            return false;
+        }
+        
         const data = await response.json();
         
         if (Array.isArray(data)) {
-            state.incidents = data;
+            state.incidents = data.map(normalizeIncident);
+            state.incidentsSyncToken = response.headers.get('X-Sync-Token');
+            state.incidentsEtag = response.headers.get('ETag');
             updateCountsFromIncidents();
             console.log(`✅ Loaded ${data.length} incidents from database`);
+            return true;
+        } else if (data && Array.isArray(data.incidents)) {
+            applyIncidentChanges(data.incidents.map(normalizeIncident), data.deleted || []);
+            state.incidentsSyncToken = data.sync_token;
+            state.incidentsEtag = response.headers.get('ETag');
+            updateCountsFromIncidents();
+            console.log(`✅ Synced ${data.incidents.length} changed, ${(data.deleted || []).length} deleted incidents`);
+            return data.incidents.length > 0 || (data.deleted || []).length > 0;
         }
+        return false;
     } catch (error) {
         console.error('Error loading incidents:', error);
-        // Load from localStorage as fallback
-        loadState();
+        // Keep what we have; before the first sync fall back to the saved copy
+        if (state.incidentsSyncToken === null) {
+            state.incidents = JSON.parse(localStorage.getItem('shomrim_incidents') || '[]');
+            return true;
+        }
+        return false;
+    }
+}
+
+// Server incidents carry notes and assignments as table rows; the renderers
+// use {text, createdBy, createdAt} notes and assignee display names, with
+// assignedPhones kept alongside for matching the current user
+function normalizeIncident(incident) {
+    const assignments = (incident.assignedUsers || []).filter(a => a && typeof a === 'object');
+    const normalized = {
+        ...incident,
+        createdAt: incident.createdAt || incident.created_at,
+        updatedAt: incident.updatedAt || incident.updated_at,
+        notes: (incident.notes || []).map(note => note.text !== undefined ? note : {
+            id: note.id,
+            text: note.note,
+            createdBy: note.user_name || note.user_phone,
+            createdByPhone: note.user_phone,
+            createdAt: note.created_at,
+            isFollowUp: Boolean(note.is_follow_up)
+        })
+    };
+    if (assignments.length > 0 || incident.assignedPhones === undefined) {
+        normalized.assignedUsers = assignments.map(a => a.user_name || a.user_phone);
+        normalized.assignedPhones = assignments.map(a => a.user_phone);
     }
+    return normalized;
+}
+
+function isAssignedToMe(incident) {
+    return (incident.assignedPhones || []).includes(state.user.phone) ||
+        (incident.assignedUsers || []).includes(state.user.name);
+}
+
+// Merge a delta response into state.incidents. Deltas include rows stamped
+// at the previous token, so the same incident may arrive again; it replaces
+// the copy we hold by id.
+function applyIncidentChanges(changed, deleted) {
+    const deletedIds = new Set(deleted.map(d => d.incident_id));
+    const changedById = new Map(changed.map(incident => [incident.id, incident]));
+    
+    state.incidents = state.incidents
+        .filter(incident => !deletedIds.has(incident.id) && !changedById.has(incident.id))
+        .concat(changed);
+    state.incidents.sort((a, b) => (b.created_at || '').localeCompare(a.created_at || ''));
 }
 
 function showScreen(screenId) {
@@ -713,6 +902,8 @@ function handlePasscodeInput(num) {
                         if (state.user && state.user.avatar) {
                             // Returning user with face already uploaded - skip to main screen
                             state.isLoggedIn = true;
+                            startPresenceHeartbeat();
+                            startIncidentRefresh();
                             
                             // Update drawer with user info
                             const drawerName = document.querySelector('.drawer-user-name');
@@ -806,6 +997,8 @@ function handleFaceContinue() {
     // Save user and complete registration
     localStorage.setItem('shomrim_user', JSON.stringify(state.user));
     state.isLoggedIn = true;
+    startPresenceHeartbeat();
+    startIncidentRefresh();
     
     // Update drawer with user info
     const drawerName = document.querySelector('.drawer-user-name');
@@ -974,6 +1167,9 @@ function handleDrawerNavigation(page) {
 async function handleLogout() {
     const confirmed = await showShomrimConfirm('Are you sure you want to logout?');
     if (confirmed) {
+        stopPresenceHeartbeat();
+        stopIncidentRefresh();
+        
         // Clear all user data
         localStorage.clear();
         sessionStorage.clear();
@@ -985,6 +1181,8 @@ async function handleLogout() {
         state.confirmPasscode = '';
         state.isConfirmingPasscode = false;
         state.incidents = [];
+        state.incidentsSyncToken = null;
+        state.incidentsEtag = null;
         state.notifications = [];
         state.notificationCount = 0;
         
@@ -1004,6 +1202,11 @@ async function handleLogout() {
 async function clearNotifications() {
     if (!await showShomrimConfirm('Are you sure you want to clear all notifications?')) return;
     
+    const cursor = parseInt(localStorage.getItem('shomrim_notification_cursor') || '0', 10);
+    if (cursor > 0) {
+        markServerNotificationsRead({ up_to: cursor });
+    }
+    
     state.notifications = [];
     state.notificationCount = 0;
     updateNotificationBadge();
@@ -1198,6 +1401,7 @@ async function handleIncidentAction(action) {
     const oldStatus = incident.status;
     let confirmed = false;
     let newStatus = oldStatus;
+    const extraOps = [];
     
     switch (action) {
         case 'start':
@@ -1230,6 +1434,7 @@ async function handleIncidentAction(action) {
                     createdBy: state.user.name,
                     createdAt: new Date().toISOString()
                 });
+                extraOps.push({ op: 'add', path: '/notes/-', value: { note: `Cancellation Reason: ${reason}` } });
                 addIncidentHistory(incidentId, 'Cancelled');
                 addNotification('incident_cancelled', 'Incident Cancelled', `Incident ${incident.shcad} has been cancelled`, incidentId);
             } else if (reason) {
@@ -1255,8 +1460,10 @@ async function handleIncidentAction(action) {
             confirmed = await showShomrimConfirm('Do you want to accept this incident request?');
             if (confirmed) {
                 if (!incident.assignedUsers) incident.assignedUsers = [];
-                if (!incident.assignedUsers.includes(state.user.name)) {
+                if (!incident.assignedPhones) incident.assignedPhones = [];
+                if (!isAssignedToMe(incident)) {
                     incident.assignedUsers.push(state.user.name);
+                    incident.assignedPhones.push(state.user.phone);
                 }
                 if (incident.invitedUsers && incident.invitedUsers.includes(state.user.name)) {
                     incident.invitedUsers = incident.invitedUsers.filter(u => u !== state.user.name);
@@ -1287,7 +1494,10 @@ async function handleIncidentAction(action) {
         // Show loading and update in database
         showLoading('Updating Incident...');
         try {
-            await updateIncidentInDatabase(incident);
+            await patchIncidentInDatabase(incident, [
+                { op: 'replace', path: '/status', value: newStatus },
+                ...extraOps
+            ]);
             updateCountsFromIncidents();
             updateCounts();
             saveState();
@@ -1420,7 +1630,8 @@ function renderIncidentsList(filter = null) {
     if (state.currentTab === 'me') {
         incidents = incidents.filter(i => 
             i.createdBy === state.user.name ||
-            (i.assignedUsers && i.assignedUsers.includes(state.user.name)) ||
+            (state.user.phone && i.created_by === state.user.phone) ||
+            isAssignedToMe(i) ||
             (i.invitedUsers && i.invitedUsers.includes(state.user.name))
         );
     }
@@ -1846,7 +2057,9 @@ async function addNoteToIncident(incidentId) {
     // Update in database
     showLoading('Adding Note...');
     try {
-        await updateIncidentInDatabase(incident);
+        await patchIncidentInDatabase(incident, [
+            { op: 'add', path: '/notes/-', value: { note: note.text } }
+        ]);
         saveState();
         
         // Refresh the detail view
@@ -1892,14 +2105,21 @@ async function showAssignUsersDialog(incidentId) {
         return;
     }
     
+    if (!user.phone) {
+        alert(`${user.name} has no phone number on record and cannot be assigned`);
+        return;
+    }
+    
     if (!incident.assignedUsers) incident.assignedUsers = [];
+    if (!incident.assignedPhones) incident.assignedPhones = [];
     
-    if (incident.assignedUsers.includes(user.name)) {
+    if (incident.assignedPhones.includes(user.phone)) {
         alert('User is already assigned to this incident');
         return;
     }
     
     incident.assignedUsers.push(user.name);
+    incident.assignedPhones.push(user.phone);
     addIncidentHistory(incidentId, `Assigned to ${user.name}`);
     addNotification('user_assigned', 'User Assigned', `${user.name} has been assigned to incident ${incident.shcad}`, incidentId);
     incident.updatedAt = new Date().toISOString();
@@ -1907,7 +2127,9 @@ async function showAssignUsersDialog(incidentId) {
     // Update in database
     showLoading('Assigning User...');
     try {
-        await updateIncidentInDatabase(incident);
+        await patchIncidentInDatabase(incident, [
+            { op: 'add', path: '/assignedUsers/-', value: { user_phone: user.phone } }
+        ]);
         saveState();
         showIncidentDetail(incidentId);
         alert(`✅ ${user.name} has been assigned to this incident`);
@@ -1916,6 +2138,7 @@ async function showAssignUsersDialog(incidentId) {
         alert('❌ Failed to assign user. Please try again.');
         // Remove the user from local state if database save failed
         incident.assignedUsers.pop();
+        incident.assignedPhones.pop();
     } finally {
         hideLoading();
     }
@@ -2374,12 +2597,12 @@ function loadSampleData() {
     ];
     
     state.users = [
-        { id: 1, name: 'Yehuda Filip', callsign: 'S36', status: 'available', role: 'Dispatcher' },
-        { id: 2, name: 'David Cohen', callsign: 'S12', status: 'available', role: 'User' },
-        { id: 3, name: 'Sarah Levy', callsign: 'S24', status: 'busy', role: 'User' },
-        { id: 4, name: 'Michael Green', callsign: 'S18', status: 'available', role: 'Supervisor' },
-        { id: 5, name: 'Benjamin Wolf', callsign: 'S45', status: 'available', role: 'User' },
-        { id: 6, name: 'Rachel Katz', callsign: 'S33', status: 'off-duty', role: 'Supervisor' }
+        { id: 1, name: 'Yehuda Filip', callsign: 'S36', status: 'available', phone: '+447911000036', role: 'Dispatcher' },
+        { id: 2, name: 'David Cohen', callsign: 'S12', status: 'available', phone: '+447911000012', role: 'User' },
+        { id: 3, name: 'Sarah Levy', callsign: 'S24', status: 'busy', phone: '+447911000024', role: 'User' },
+        { id: 4, name: 'Michael Green', callsign: 'S18', status: 'available', phone: '+447911000018', role: 'Supervisor' },
+        { id: 5, name: 'Benjamin Wolf', callsign: 'S45', status: 'available', phone: '+447911000045', role: 'User' },
+        { id: 6, name: 'Rachel Katz', callsign: 'S33', status: 'off-duty', phone: '+447911000033', role: 'Supervisor' }
     ];
     
     state.notifications = [
@@ -2533,7 +2756,7 @@ function updateCountsFromIncidents() {
     // Count invitations (incidents where current user is invited but not assigned)
     state.incidents.forEach(incident => {
         if (incident.invitedUsers && incident.invitedUsers.includes(state.user.name)) {
-            if (!incident.assignedUsers || !incident.assignedUsers.includes(state.user.name)) {
+            if (!isAssignedToMe(incident)) {
                 state.counts.invitation++;
             }
         }
@@ -2618,6 +2841,9 @@ function renderNotificationsList() {
         item.addEventListener('click', () => {
             const notif = state.notifications.find(n => n.id === parseInt(item.dataset.id));
             if (notif) {
+                if (notif.serverId && !notif.read) {
+                    markServerNotificationsRead({ ids: [notif.serverId] });
+                }
                 notif.read = true;
                 if (!item.classList.contains('read')) {
                     state.notificationCount = Math.max(0, state.notificationCount - 1);
@@ -2861,6 +3087,11 @@ async function togglePatrolStatus() {
         if (response.ok) {
             statusText.textContent = toggle.checked ? 'Currently On Patrol' : 'Currently Not On Patrol';
             state.currentUser.on_patrol = toggle.checked;
+            if (toggle.checked) {
+                startPositionReporting();
+            } else {
+                stopPositionReporting();
+            }
             await refreshOnPatrol();
         }
     } catch (error) {
@@ -2870,6 +3101,37 @@ async function togglePatrolStatus() {
     }
 }
 
+// Last known position while on patrol, for /api/users/nearby and dispatch
+const POSITION_REPORT_INTERVAL = 30000;
+let positionWatchId = null;
+let lastPositionReport = 0;
+
+function startPositionReporting() {
+    if (!navigator.geolocation || positionWatchId !== null) return;
+    positionWatchId = navigator.geolocation.watchPosition(position => {
+        const now = Date.now();
+        if (now - lastPositionReport < POSITION_REPORT_INTERVAL) return;
+        lastPositionReport = now;
+        fetch(`${API_BASE_URL}/api/users/${state.currentUser.phone}/position`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                location: { lat: position.coords.latitude, lng: position.coords.longitude }
+            })
+        }).catch(error => console.error('Error reporting position:', error));
+    }, error => console.warn('Position unavailable:', error.message), {
+        enableHighAccuracy: true,
+        maximumAge: 15000
+    });
+}
+
+function stopPositionReporting() {
+    if (positionWatchId === null) return;
+    navigator.geolocation.clearWatch(positionWatchId);
+    positionWatchId = null;
+    lastPositionReport = 0;
+}
+
 async function refreshOnDuty() {
     try {
         const response = await fetch(`${API_BASE_URL}/api/users/on-duty`);
@@ -3351,23 +3613,29 @@ function removeAssignedUser(index) {
 
 // ===== DATABASE SYNC HELPERS =====
 
-async function updateIncidentInDatabase(incident) {
-    try {
-        const response = await fetch(`{API_BASE_URL}/api/incidents/{incident.id}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(incident)
-        });
-        
-        if (!response.ok) {
-            throw new Error('Failed to update incident in database');
-        }
-        
-        return await response.json();
-    } catch (error) {
-        console.error('Database update error:', error);
-        throw error;
+// Send only what changed; the version guards against overwriting another dispatcher's edit
+async function patchIncidentInDatabase(incident, operations) {
+    const headers = { 'Content-Type': 'application/json' };
+    if (incident.version) {
+        headers['If-Match'] = `"${incident.version}"`;
+    }
+    
+    const response = await fetch(`${API_BASE_URL}/api/incidents/${incident.id}`, {
+        method: 'PATCH',
+        headers,
+        body: JSON.stringify({ patch: operations, user_phone: state.user && state.user.phone })
+    });
+    const result = await response.json();
+    
+    if (response.status === 409) {
+        throw new Error('This incident was changed by someone else. Reload it and try again.');
     }
+    if (!response.ok) {
+        throw new Error(result.error || 'Failed to update incident in database');
+    }
+    
+    incident.version = result.version;
+    return result;
 }
 
 async function loadIncidentFromDatabase(incidentId) {
@@ -3527,8 +3795,10 @@ function showShomrimPrompt(message, defaultValue = '') {
 let pttMediaRecorder = null;
 let pttAudioChunks = [];
 let pttStream = null;
-let pttPollingInterval = null;
+let pttPollController = null; // Aborts the active long-poll loop
 let pttLastMessageId = 0;
+let pttShortPollUntil = 0; // Server turned the long-poll away; short-poll until then
+let pttShortPollInterval = 3000;
 let pttMuted = false; // Mute incoming messages
 let pttIsRecording = false; // Track if user is currently holding talk button
 let pttPlayedMessageIds = new Set(); // Prevent duplicate plays
@@ -3840,71 +4110,94 @@ function displayPTTUsers(users) {
     }).join('');
 }
 
-// PTT Polling for incoming messages
+// PTT long-poll for incoming messages
+// The server holds each request open until a clip arrives (or ~25s pass),
+// so delivery takes one round trip and an idle channel costs almost nothing.
 function startPTTPolling() {
     // Clear any existing polling
     stopPTTPolling();
     
-    // Start polling every 500ms for faster response (reduced from 1000ms)
-    pttPollingInterval = setInterval(checkForPTTMessages, 500);
-    
-    // Check immediately
-    checkForPTTMessages();
+    pttPollController = new AbortController();
+    pttPollLoop(pttPollController);
 }
 
 function stopPTTPolling() {
-    if (pttPollingInterval) {
-        clearInterval(pttPollingInterval);
-        pttPollingInterval = null;
+    if (pttPollController) {
+        pttPollController.abort();
+        pttPollController = null;
     }
 }
 
-async function checkForPTTMessages() {
+async function pttPollLoop(controller) {
+    while (!controller.signal.aborted) {
+        const received = await checkForPTTMessages(controller.signal);
+        if (!received) {
+            // Muted, busy playing or a network error - back off briefly before reconnecting
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        } else if (Date.now() < pttShortPollUntil) {
+            await new Promise(resolve => setTimeout(resolve, pttShortPollInterval));
+        }
+    }
+}
+
+async function checkForPTTMessages(signal) {
     // Skip if muted or already playing audio
-    if (pttMuted || pttIsPlayingAudio) return;
+    if (pttMuted || pttIsPlayingAudio) return false;
     
     try {
         const channel = document.getElementById('ptt-channel-select').value;
         const userPhone = state.user.phone || state.user.email || '';
         
-        const url = `${API_BASE_URL}/api/ptt/messages?user_phone=${encodeURIComponent(userPhone)}&channel=${channel}&since_id=${pttLastMessageId}`;
+        const query = `user_phone=${encodeURIComponent(userPhone)}&channel=${channel}&since_id=${pttLastMessageId}`;
+        // The server caps held long-polls per worker; when it turns us away, short-poll for a minute
+        const url = Date.now() < pttShortPollUntil
+            ? `${API_BASE_URL}/api/ptt/messages?${query}`
+            : `${API_BASE_URL}/api/ptt/wait?${query}&timeout=25`;
         
-        const response = await fetch(url);
+        const response = await fetch(url, { signal });
+        if (!response.ok) return false;
         
-        if (response.ok) {
-            const data = await response.json();
+        const data = await response.json();
+        
+        if (data.retry_after) {
+            pttShortPollInterval = data.retry_after * 1000;
+            pttShortPollUntil = Date.now() + 60000;
+        }
+        
+        if (data.messages && data.messages.length > 0) {
+            // Filter out already played messages
+            const newMessages = data.messages.filter(msg => !pttPlayedMessageIds.has(msg.id));
             
-            if (data.messages && data.messages.length > 0) {
-                // Filter out already played messages
-                const newMessages = data.messages.filter(msg => !pttPlayedMessageIds.has(msg.id));
+            if (newMessages.length > 0) {
+                console.log(`📻 Received ${newMessages.length} new PTT message(s)`);
                 
-                if (newMessages.length > 0) {
-                    console.log(`📻 Received ${newMessages.length} new PTT message(s)`);
-                    
-                    // Play each message sequentially (only once)
-                    for (const message of newMessages) {
-                        // Mark as played BEFORE playing to prevent duplicates
-                        pttPlayedMessageIds.add(message.id);
-                        pttLastMessageId = Math.max(pttLastMessageId, message.id);
-                        
-                        await playPTTMessage(message);
-                    }
+                // Play each message sequentially (only once)
+                for (const message of newMessages) {
+                    // Mark as played BEFORE playing to prevent duplicates
+                    pttPlayedMessageIds.add(message.id);
+                    pttLastMessageId = Math.max(pttLastMessageId, message.id);
                     
-                    // Limit the Set size to prevent memory issues
-                    if (pttPlayedMessageIds.size > 100) {
-                        const idsArray = Array.from(pttPlayedMessageIds);
-                        pttPlayedMessageIds = new Set(idsArray.slice(-50));
-                    }
-                } else {
-                    // Update lastMessageId even if all messages were already played
-                    for (const message of data.messages) {
-                        pttLastMessageId = Math.max(pttLastMessageId, message.id);
-                    }
+                    await playPTTMessage(message);
+                }
+                
+                // Limit the Set size to prevent memory issues
+                if (pttPlayedMessageIds.size > 100) {
+                    const idsArray = Array.from(pttPlayedMessageIds);
+                    pttPlayedMessageIds = new Set(idsArray.slice(-50));
+                }
+            } else {
+                // Update lastMessageId even if all messages were already played
+                for (const message of data.messages) {
+                    pttLastMessageId = Math.max(pttLastMessageId, message.id);
                 }
             }
         }
+        return true;
     } catch (error) {
-        console.error('Error checking for PTT messages:', error);
+        if (error.name !== 'AbortError') {
+            console.error('Error checking for PTT messages:', error);
+        }
+        return false;
     }
 }
 
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+
+from database import get_db
+
+# Distinct lists kept per worker (on-duty, on-patrol, one per role, suspects, vehicles...)
+LIST_CACHE_MAX_ENTRIES = int(os.environ.get('LIST_CACHE_MAX_ENTRIES', 64))
+
+class ListCache:
+    """Per-worker read-through cache of serialized list responses
+
+    Each entry remembers the cache_versions counter it was built at.
+    Triggers bump the counter in the same transaction as any write to the
+    underlying table, so one primary-key read per request tells every
+    worker whether its copy is still current - no cross-worker messages.
+    """
+
+    def __init__(self, max_entries=LIST_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (name, key) -> (version, etag, body)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def lookup(self, cache_key, version):
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry
+
+    def store(self, cache_key, entry):
+        with self.lock:
+            self.entries[cache_key] = entry
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def respond(self, name, key, load):
+        """JSON response for the list (name, key), built with load(cursor) on a miss
+
+        name is the cache_versions row the list depends on; key tells apart
+        lists of the same data (e.g. one per role). The ETag is a hash of the
+        body, so it stays valid across restarts and identical in every worker.
+        """
+        conn = get_db()
+        try:
+            cursor = conn.cursor()
+            # Read the version before the rows: a write landing in between
+            # only makes the entry look older than it is (one extra rebuild)
+            cursor.execute('SELECT version FROM cache_versions WHERE name = ?', (name,))
+            version = cursor.fetchone()[0]
+            entry = self.lookup((name, key), version)
+            if entry is None:
+                body = current_app.json.dumps(load(cursor)).encode('utf-8')
+                etag = f'"{name}-{hashlib.sha256(body).hexdigest()[:16]}"'
+                entry = (version, etag, body)
+                self.store((name, key), entry)
+        finally:
+            conn.close()
+
+        _, etag, body = entry
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in request.headers.get('If-None-Match', ''):
+            with self.lock:
+                self.not_modified += 1
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype='application/json', headers=headers)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries
+            }
+
+list_cache = ListCache()
@@ -0,0 +1,559 @@
+"""Load-test harness: simulate a shift of patrollers against a throwaway server
+
+Starts server:app (gunicorn or the werkzeug dev server) in a temporary
+directory, so it gets its own shomrim.db and audio store, then runs N
+simulated members that behave like js/app.js:
+
+  - listen for PTT clips (500 ms polling of /api/ptt/messages, or the
+    /api/ptt/wait long-poll with --ptt-mode wait) and fetch each new clip
+  - push clips to /api/ptt/broadcast
+  - toggle duty / patrol status and read the rosters
+  - create incidents, update them, add notes and reload the incident list
+
+and reports throughput, p50/p95/p99 latency and errors per route, counting
+'database is locked' failures separately.
+
+    python loadtest.py --members 200 --duration 120 --workers 4
+    python loadtest.py --members 50 --ptt-mode wait --json after.json
+
+With --hold N it instead measures connection capacity: N idle PTT
+long-polls are held open, then it checks whether other requests still get
+through and how many of the N hear a broadcast:
+
+    python loadtest.py --hold 2000 --workers 1 --worker-class gthread
+    python loadtest.py --hold 2000 --workers 1 --worker-class gevent
+
+With --pool-bench it measures database.get_db itself: the same hot reads
+run in-process through the Flask test client, once with the connection
+pool and once with it disabled (DB_POOL_SIZE=0, a new connection per
+request), and reports requests per second for each:
+
+    python loadtest.py --pool-bench --duration 10 --threads 8
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlencode
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-tick (500 ms) probabilities of each member action
+ACTION_RATES = {
+    'broadcast': 0.01,
+    'toggle_duty': 0.004,
+    'toggle_patrol': 0.004,
+    'rosters': 0.01,
+    'create_incident': 0.002,
+    'update_incident': 0.004,
+    'add_note': 0.004,
+    'load_incidents': 0.01,
+}
+
+class Recorder:
+    """Latency samples and error counts per route, shared by all members"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.lock_timeouts = {}
+
+    def record(self, route, seconds, status, body):
+        with self.lock:
+            self.samples.setdefault(route, []).append(seconds)
+            if status >= 400 or status == 0:
+                self.errors[route] = self.errors.get(route, 0) + 1
+                if b'database is locked' in body:
+                    self.lock_timeouts[route] = self.lock_timeouts.get(route, 0) + 1
+
+    def report(self, elapsed):
+        rows = []
+        for route in sorted(self.samples):
+            samples = sorted(self.samples[route])
+            rows.append({
+                'route': route,
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 99) * 1000, 2),
+                'errors': self.errors.get(route, 0),
+                'lock_timeouts': self.lock_timeouts.get(route, 0),
+            })
+        return rows
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, int(round(pct / 100 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[rank]
+
+class Member:
+    """One simulated patroller with its own keep-alive connections"""
+
+    def __init__(self, index, host, port, recorder, ptt_mode, shared, stop):
+        self.phone = f'+4477009{index:05d}'
+        self.name = f'Loadtest {index}'
+        self.channel = random.choice(['all', 'on-duty', 'on-patrol', 'dispatchers'])
+        self.host = host
+        self.port = port
+        self.recorder = recorder
+        self.ptt_mode = ptt_mode
+        self.shared = shared
+        self.stop = stop
+        self.on_duty = False
+        self.on_patrol = False
+        self.last_ptt_id = 0
+
+    def connect(self, timeout=60):
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def request(self, conn, method, path, route, body=None, headers=None):
+        started = time.perf_counter()
+        status = 0
+        data = b''
+        for _ in range(2):
+            reused = conn.sock is not None
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+                status = response.status
+                break
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if not reused:
+                    break
+                # The server dropped an idle keep-alive connection: reconnect once
+        self.recorder.record(route, time.perf_counter() - started, status, data)
+        if status and data and data[:1] in (b'{', b'['):
+            try:
+                return json.loads(data)
+            except ValueError:
+                return None
+        return None
+
+    def send_json(self, conn, method, path, route, payload):
+        return self.request(conn, method, path, route, json.dumps(payload).encode(),
+                            {'Content-Type': 'application/json'})
+
+    def register(self, conn):
+        self.send_json(conn, 'POST', '/api/users', 'POST /api/users', {
+            'phone': self.phone, 'name': self.name, 'callsign': self.phone[-4:], 'role': 'Member'
+        })
+
+    def listen(self):
+        """PTT receive loop: fetch every clip that arrives on our channel"""
+        conn = self.connect()
+        audio_conn = self.connect()
+        while not self.stop.is_set():
+            params = urlencode({'user_phone': self.phone, 'channel': self.channel, 'since_id': self.last_ptt_id})
+            if self.ptt_mode == 'wait':
+                data = self.request(conn, 'GET', f'/api/ptt/wait?{params}&timeout=5', 'GET /api/ptt/wait')
+            else:
+                data = self.request(conn, 'GET', f'/api/ptt/messages?{params}', 'GET /api/ptt/messages')
+            for message in (data or {}).get('messages', []):
+                self.last_ptt_id = max(self.last_ptt_id, message['id'])
+                self.request(audio_conn, 'GET', f"/api/ptt/audio/{message['id']}", 'GET /api/ptt/audio/:id')
+            if self.ptt_mode == 'poll' or data is None:
+                self.stop.wait(0.5)
+
+    def act(self):
+        """Everything else a member does, one roll of the dice per 500 ms tick"""
+        conn = self.connect()
+        while not self.stop.wait(0.5):
+            for action, rate in ACTION_RATES.items():
+                if random.random() < rate:
+                    getattr(self, action)(conn)
+
+    def broadcast(self, conn):
+        boundary = uuid.uuid4().hex
+        clip = os.urandom(random.randint(8, 24) * 1024)
+        parts = []
+        for field, value in (('channel', self.channel), ('user_phone', self.phone), ('user_name', self.name)):
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"\r\n\r\n{value}\r\n'.encode())
+        parts.append((f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="ptt.webm"\r\n'
+                      'Content-Type: audio/webm\r\n\r\n').encode() + clip + b'\r\n')
+        parts.append(f'--{boundary}--\r\n'.encode())
+        self.request(conn, 'POST', '/api/ptt/broadcast', 'POST /api/ptt/broadcast', b''.join(parts),
+                     {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+    def toggle_duty(self, conn):
+        self.on_duty = not self.on_duty
+        self.send_json(conn, 'PUT', f'/api/users/{quote(self.phone)}/duty-status',
+                       'PUT /api/users/:phone/duty-status', {'on_duty': self.on_duty})
+
+    def toggle_patrol(self, conn):
+        self.on_patrol = not self.on_patrol
+        self.send_json(conn, 'PUT', f'/api/users/{quote(self.phone)}/patrol-status',
+                       'PUT /api/users/:phone/patrol-status', {'on_patrol': self.on_patrol})
+
+    def rosters(self, conn):
+        self.request(conn, 'GET', '/api/users/on-duty', 'GET /api/users/on-duty')
+        self.request(conn, 'GET', '/api/users/on-patrol', 'GET /api/users/on-patrol')
+        self.request(conn, 'GET', f'/api/users/online?channel={self.channel}', 'GET /api/users/online')
+
+    def create_incident(self, conn):
+        incident_id = f'INC-{uuid.uuid4().hex[:12]}'
+        self.send_json(conn, 'POST', '/api/incidents', 'POST /api/incidents', {
+            'id': incident_id,
+            'shcad': f'SHCAD-{uuid.uuid4().hex[:10]}',
+            'title': 'Load test incident',
+            'type': random.choice(['Burglary', 'Theft', 'Assault', 'Suspicious Activity']),
+            'description': 'Suspect seen leaving the premises heading north on foot.',
+            'status': 'pending',
+            'address': f'{random.randint(1, 300)} High Street',
+            'postcode': 'N16 5TY',
+            'caller': {'name': 'Caller', 'phone': '+447700900123', 'isVictim': True, 'isWitness': False},
+            'victims': [{'name': 'Victim One', 'phone': '+447700900124'}],
+            'witnesses': [{'name': 'Witness One'}],
+            'suspects': [{'name': 'Unknown male', 'description': 'Dark jacket'}],
+            'policeInfo': {'cadRef': 'CAD123'},
+            'created_by': self.phone,
+        })
+        with self.shared['lock']:
+            self.shared['incidents'].append(incident_id)
+
+    def pick_incident(self):
+        with self.shared['lock']:
+            incidents = self.shared['incidents']
+            return random.choice(incidents) if incidents else None
+
+    def update_incident(self, conn):
+        incident_id = self.pick_incident()
+        if incident_id:
+            self.send_json(conn, 'PUT', f'/api/incidents/{incident_id}', 'PUT /api/incidents/:id',
+                           {'status': random.choice(['pending', 'started', 'completed'])})
+
+    def add_note(self, conn):
+        incident_id = self.pick_incident()
+        if incident_id:
+            self.send_json(conn, 'POST', f'/api/incidents/{incident_id}/notes', 'POST /api/incidents/:id/notes',
+                           {'user_phone': self.phone, 'note': 'Checked the area, nothing further.'})
+
+    def load_incidents(self, conn):
+        self.request(conn, 'GET', f'/api/incidents?user_phone={quote(self.phone)}', 'GET /api/incidents')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workdir, port, server, workers, threads, worker_class='gthread', worker_connections=1000):
+    """Launch server:app with its working directory (and so shomrim.db) in workdir"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'),
+               METRICS_DIR=os.path.join(workdir, 'metrics'), PRESENCE_DIR=os.path.join(workdir, 'presence'))
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'server:app', '--chdir', workdir,
+                   '--pythonpath', REPO_DIR, '--bind', f'127.0.0.1:{port}', '--backlog', '4096',
+                   '--workers', str(workers), '--worker-class', worker_class, '--threads', str(threads),
+                   '--worker-connections', str(worker_connections)]
+    else:
+        command = [sys.executable, '-c',
+                   f'import server; server.app.run(host="127.0.0.1", port={port}, threaded=True)']
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('server did not become healthy within 30s')
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='shomrim-loadtest-')
+    port = free_port()
+    process = start_server(workdir, port, args.server, args.workers, args.threads,
+                           args.worker_class, args.worker_connections)
+    recorder = Recorder()
+    stop = threading.Event()
+    shared = {'lock': threading.Lock(), 'incidents': []}
+
+    try:
+        members = [Member(i, '127.0.0.1', port, recorder, args.ptt_mode, shared, stop) for i in range(args.members)]
+        setup = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        for member in members:
+            member.register(setup)
+        recorder.samples.clear()
+        recorder.errors.clear()
+        recorder.lock_timeouts.clear()
+
+        threads = []
+        for member in members:
+            threads.append(threading.Thread(target=member.listen, daemon=True))
+            threads.append(threading.Thread(target=member.act, daemon=True))
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        elapsed = time.monotonic() - started
+        for thread in threads:
+            thread.join(timeout=10)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'config': vars(args),
+        'elapsed_seconds': round(elapsed, 2),
+        'routes': recorder.report(elapsed),
+    }
+
+async def http_request(host, port, method, path, body=b'', headers=None, timeout=30):
+    """One request on its own connection; returns (status, body), status 0 on failure or timeout"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+                 f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+        head, _, payload = raw.partition(b'\r\n\r\n')
+        return int(head.split(b' ', 2)[1]), payload
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        return 0, b''
+    finally:
+        if writer is not None:
+            writer.close()
+
+async def timed_request(*args, **kwargs):
+    """http_request plus the perf_counter time the response finished"""
+    status, body = await http_request(*args, **kwargs)
+    return status, body, time.perf_counter()
+
+def multipart_clip(channel, phone, name):
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"\r\n\r\n{value}\r\n'.encode()
+             for field, value in (('channel', channel), ('user_phone', phone), ('user_name', name))]
+    parts.append((f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="ptt.webm"\r\n'
+                  'Content-Type: audio/webm\r\n\r\n').encode() + os.urandom(8 * 1024) + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+async def hold_connections(port, count, probes=20, deliver_within=10.0):
+    """Hold count idle /api/ptt/wait long-polls, then probe and broadcast through them"""
+    host = '127.0.0.1'
+    waiters = []
+    for i in range(count):
+        params = urlencode({'user_phone': f'+4477010{i:05d}', 'channel': 'loadtest-hold',
+                            'since_id': 0, 'timeout': 25})
+        waiters.append(asyncio.create_task(timed_request(host, port, 'GET', f'/api/ptt/wait?{params}')))
+        if i % 100 == 99:
+            await asyncio.sleep(0.05)  # don't overflow the listen backlog
+    await asyncio.sleep(2)
+
+    # Can anyone else still get a response while count connections are held?
+    probe_latencies = []
+    for _ in range(probes):
+        started = time.perf_counter()
+        status, _ = await http_request(host, port, 'GET', '/api/ptt/latest-id', timeout=5)
+        probe_latencies.append(time.perf_counter() - started if status == 200 else None)
+
+    # Does a broadcast reach the held connections?
+    body, headers = multipart_clip('loadtest-hold', '+447701099999', 'Loadtest sender')
+    sent_at = time.perf_counter()
+    status, _ = await http_request(host, port, 'POST', '/api/ptt/broadcast', body, headers, timeout=deliver_within)
+    done, _ = await asyncio.wait(waiters, timeout=deliver_within)
+    delivered = []
+    for task in done:
+        task_status, payload, finished_at = task.result()
+        try:
+            heard = task_status == 200 and json.loads(payload)['count'] > 0
+        except (ValueError, KeyError):
+            heard = False
+        if heard:
+            delivered.append(finished_at - sent_at)
+    for task in waiters:
+        task.cancel()
+
+    ok_probes = sorted(latency for latency in probe_latencies if latency is not None)
+    delivered.sort()
+    return {
+        'held': count,
+        'probes_ok': len(ok_probes),
+        'probes': probes,
+        'probe_p50_ms': round(percentile(ok_probes, 50) * 1000, 1) if ok_probes else None,
+        'probe_p99_ms': round(percentile(ok_probes, 99) * 1000, 1) if ok_probes else None,
+        'broadcast_status': status,
+        'delivered': len(delivered),
+        'delivery_p50_ms': round(percentile(delivered, 50) * 1000, 1) if delivered else None,
+        'delivery_p99_ms': round(percentile(delivered, 99) * 1000, 1) if delivered else None,
+    }
+
+def run_hold(args):
+    workdir = tempfile.mkdtemp(prefix='shomrim-loadtest-')
+    port = free_port()
+    process = start_server(workdir, port, args.server, args.workers, args.threads,
+                           args.worker_class, max(args.worker_connections, args.hold + 100))
+    try:
+        result = asyncio.run(hold_connections(port, args.hold))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # A sync worker still busy with held requests
+            process.kill()
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'config': vars(args), 'hold': result}
+
+def print_hold_report(result):
+    config, hold = result['config'], result['hold']
+    workers = config['workers'] if config['server'] == 'gunicorn' else 1
+    print(f"\n{hold['held']} idle long-polls on {workers} worker(s), "
+          f"{config['worker_class'] if config['server'] == 'gunicorn' else 'werkzeug'}\n")
+    print(f"  other requests answered   {hold['probes_ok']}/{hold['probes']}"
+          f"  (p50 {hold['probe_p50_ms']} ms, p99 {hold['probe_p99_ms']} ms)")
+    print(f"  broadcast status          {hold['broadcast_status'] or 'timed out'}")
+    print(f"  broadcast delivered to    {hold['delivered']}/{hold['held']}"
+          f"  (p50 {hold['delivery_p50_ms']} ms, p99 {hold['delivery_p99_ms']} ms)")
+    print(f"  live connections/worker   {hold['delivered'] // workers}")
+
+# Reads issued by --pool-bench, cycled by every thread
+POOL_BENCH_PATHS = (
+    '/api/users/+447700900000',
+    '/api/incidents?limit=20&fields=summary',
+    '/api/users/on-duty',
+)
+
+def pool_bench_throughput(client_factory, threads, duration):
+    """Requests per second across `threads` threads hitting POOL_BENCH_PATHS"""
+    counts = [0] * threads
+    errors = [0] * threads
+    stop = threading.Event()
+
+    def worker(index):
+        client = client_factory()
+        while not stop.is_set():
+            for path in POOL_BENCH_PATHS:
+                if client.get(path).status_code != 200:
+                    errors[index] += 1
+                counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    started = time.monotonic()
+    for thread in workers:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in workers:
+        thread.join(timeout=10)
+    elapsed = time.monotonic() - started
+    return {'requests': sum(counts), 'errors': sum(errors), 'rps': round(sum(counts) / elapsed, 1)}
+
+def run_pool_bench(args):
+    workdir = tempfile.mkdtemp(prefix='shomrim-poolbench-')
+    os.environ.update(DB_PATH=os.path.join(workdir, 'shomrim.db'), PTT_AUDIO_DIR=os.path.join(workdir, 'ptt_audio'),
+                      METRICS_DIR=os.path.join(workdir, 'metrics'), PRESENCE_DIR=os.path.join(workdir, 'presence'),
+                      LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    sys.path.insert(0, REPO_DIR)
+    import database
+    import server
+
+    try:
+        conn = database.get_db()
+        conn.execute("INSERT INTO users (phone, name, on_duty) VALUES ('+447700900000', 'Bench', 1)")
+        server.write_incidents(conn.cursor(), [
+            {'id': f'BENCH-{i}', 'shcad': f'BENCH-{i}', 'title': f'Bench incident {i}',
+             'type': 'theft', 'description': 'Pool benchmark'}
+            for i in range(200)
+        ])
+        conn.commit()
+        conn.close()
+
+        results = {}
+        pool_size = database.DB_POOL_SIZE
+        for mode, size in (('unpooled', 0), ('pooled', pool_size)):
+            database.close_pool()
+            database.DB_POOL_SIZE = size
+            before = dict(database.pool_stats)
+            results[mode] = pool_bench_throughput(server.app.test_client, args.threads, args.duration)
+            results[mode]['connections_opened'] = database.pool_stats['created'] - before['created']
+        database.DB_POOL_SIZE = pool_size
+    finally:
+        database.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'config': vars(args), 'pool_bench': results}
+
+def print_pool_bench_report(result):
+    config, bench = result['config'], result['pool_bench']
+    print(f"\nget_db throughput, {config['threads']} threads, {config['duration']}s per mode\n")
+    for mode, row in bench.items():
+        print(f"  {mode:<10} {row['rps']:>10} req/s  {row['requests']:>8} requests  "
+              f"{row['errors']:>4} errors  {row['connections_opened']:>7} connections opened")
+    if bench['unpooled']['rps']:
+        print(f"\n  pooled / unpooled          {bench['pooled']['rps'] / bench['unpooled']['rps']:.2f}x")
+
+def print_report(result):
+    routes = result['routes']
+    total = sum(row['requests'] for row in routes)
+    print(f"\n{result['config']['members']} members, {result['elapsed_seconds']}s, "
+          f"{total} requests ({total / result['elapsed_seconds']:.1f} req/s)\n")
+    header = f"{'route':<40} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'locked':>7}"
+    print(header)
+    print('-' * len(header))
+    for row in routes:
+        print(f"{row['route']:<40} {row['requests']:>7} {row['rps']:>8} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>7} {row['lock_timeouts']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a shift of patrollers against server:app')
+    parser.add_argument('--members', type=int, default=50, help='simulated members on shift')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run after setup')
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=64, help='gunicorn threads per worker')
+    parser.add_argument('--worker-class', choices=['gthread', 'gevent'], default='gthread',
+                        help='gunicorn worker class (gevent needs the gevent package)')
+    parser.add_argument('--worker-connections', type=int, default=1000,
+                        help='connections per gevent worker')
+    parser.add_argument('--ptt-mode', choices=['poll', 'wait'], default='poll',
+                        help='poll = 500 ms /api/ptt/messages loop, wait = /api/ptt/wait long-poll')
+    parser.add_argument('--hold', type=int, default=0,
+                        help='instead of a shift, hold this many idle long-polls and measure capacity')
+    parser.add_argument('--pool-bench', action='store_true',
+                        help='instead of a shift, compare in-process throughput with and without the connection pool')
+    parser.add_argument('--json', help='also write the results to this file for comparing versions')
+    args = parser.parse_args()
+
+    if args.pool_bench:
+        result = run_pool_bench(args)
+        print_pool_bench_report(result)
+    elif args.hold:
+        result = run_hold(args)
+        print_hold_report(result)
+    else:
+        result = run(args)
+        print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
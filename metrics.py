@@ -0,0 +1,199 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, request
+
+import database
+
+# Where each worker publishes its snapshot; /metrics sums every file here.
+# All workers of one deployment must share this directory. The default is
+# scoped to the gunicorn master (the workers' parent), so a redeploy or
+# restart never reads snapshots left by a previous one.
+METRICS_DIR = os.environ.get('METRICS_DIR',
+                             os.path.join(tempfile.gettempdir(), f'shomrim-metrics-{os.getppid()}'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# Fixed bucket bounds (seconds) - identical in every worker, so per-worker
+# histograms merge by adding bucket counts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    'shomrim_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'shomrim_http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'shomrim_http_response_bytes_total': ('counter', 'Response payload bytes by endpoint'),
+    'shomrim_http_request_bytes_total': ('counter', 'Request payload bytes by endpoint'),
+    'shomrim_sql_queries_total': ('counter', 'SQL statements executed by endpoint'),
+}
+
+class Metrics:
+    """Per-worker request metrics, published as a JSON snapshot file"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.collectors = []
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            buckets = self.histograms.get(key)
+            if buckets is None:
+                buckets = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[len(LATENCY_BUCKETS)] += 1
+            buckets[-1] += value
+
+    def register_collector(self, collector):
+        """collector() -> iterable of (name, help, value); exported as counters"""
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        with self.lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, dict(labels), list(buckets)] for (name, labels), buckets in self.histograms.items()]
+        extra = {}
+        for collector in self.collectors:
+            for name, help_text, value in collector():
+                counters.append([name, {}, value])
+                extra[name] = help_text
+        return {'pid': os.getpid(), 'master': os.getppid(),
+                'counters': counters, 'histograms': histograms, 'help': extra}
+
+    def flush(self, force=False):
+        """Write this worker's snapshot (at most every METRICS_FLUSH_INTERVAL)"""
+        now = time.monotonic()
+        if not force and now - self.last_flush < METRICS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'worker-{os.getpid()}.json')
+        fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(self.snapshot(), tmp)
+        os.replace(tmp_path, path)
+
+metrics = Metrics()
+
+def is_live_snapshot(snapshot):
+    """Whether the snapshot's worker still runs under this worker's master"""
+    if snapshot.get('master') != os.getppid() or 'pid' not in snapshot:
+        return False
+    try:
+        os.kill(snapshot['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, owned by someone else
+    return True
+
+def merge_snapshots():
+    """Sum the snapshots of every live worker, pruning those of dead workers
+
+    Counters of a worker that exited leave the sum, which Prometheus reads as
+    a counter reset, the same as a restart.
+    """
+    metrics.flush(force=True)
+    counters = {}
+    histograms = {}
+    help_texts = {}
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.startswith('worker-'):
+            continue
+        path = os.path.join(METRICS_DIR, filename)
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not is_live_snapshot(snapshot):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        help_texts.update(snapshot.get('help', {}))
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets in snapshot['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            merged = histograms.setdefault(key, [0] * len(buckets))
+            for i, count in enumerate(buckets):
+                merged[i] += count
+    return counters, histograms, help_texts
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+def render_prometheus():
+    """Prometheus text exposition format (0.0.4) for all workers combined"""
+    counters, histograms, help_texts = merge_snapshots()
+    lines = []
+    described = set()
+
+    def describe(name, kind, help_text):
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        kind, help_text = METRIC_HELP.get(name, ('counter', help_texts.get(name, name)))
+        describe(name, kind, help_text)
+        lines.append(f'{name}{format_labels(labels)} {value}')
+
+    for (name, labels), buckets in sorted(histograms.items()):
+        kind, help_text = METRIC_HELP[name]
+        describe(name, kind, help_text)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+        cumulative += buckets[len(LATENCY_BUCKETS)]
+        lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {buckets[-1]}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
+
+def init_app(app):
+    """Install request-timing middleware on the Flask app"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        database.reset_query_count()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        elapsed = time.perf_counter() - started
+        metrics.inc('shomrim_http_requests_total',
+                    {'endpoint': endpoint, 'method': request.method, 'status': response.status_code})
+        metrics.observe('shomrim_http_request_duration_seconds', {'endpoint': endpoint}, elapsed)
+        metrics.inc('shomrim_http_response_bytes_total', {'endpoint': endpoint}, response.content_length or 0)
+        metrics.inc('shomrim_http_request_bytes_total', {'endpoint': endpoint}, request.content_length or 0)
+        metrics.inc('shomrim_sql_queries_total', {'endpoint': endpoint}, database.get_query_count())
+        metrics.flush()
+        return response
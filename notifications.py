@@ -0,0 +1,114 @@
+import json
+import os
+
+# Who hears about a new incident besides the people on duty
+NOTIFY_ROLES_ON_CREATE = tuple(
+    role.strip() for role in os.environ.get('NOTIFY_ROLES_ON_CREATE', 'Dispatcher,Coordinator').split(',')
+    if role.strip()
+)
+
+DEFAULT_NOTIFICATION_PAGE_SIZE = 50
+MAX_NOTIFICATION_PAGE_SIZE = 200
+
+# Every fan-out is a single INSERT ... SELECT inside the caller's
+# transaction: the recipients are resolved by SQLite, and the
+# notifications commit (or roll back) together with the incident write.
+NOTIFICATION_INSERT = '''
+    INSERT INTO notifications (user_phone, title, message, type, incident_id)
+    SELECT recipients.phone, ?, ?, ?, ?
+'''
+
+def incident_label(cursor, incident_id):
+    cursor.execute('SELECT shcad, title FROM incidents WHERE id = ?', (incident_id,))
+    row = cursor.fetchone()
+    return f'{row[0]}: {row[1]}' if row else incident_id
+
+def notify_incident_created(cursor, incident_id, actor=None):
+    """Tell on-duty members, dispatchers and coordinators about a new incident"""
+    roles = ', '.join('?' for _ in NOTIFY_ROLES_ON_CREATE) or 'NULL'
+    cursor.execute(NOTIFICATION_INSERT + f'''
+        FROM users AS recipients
+        WHERE (recipients.on_duty = 1 OR recipients.role IN ({roles}))
+          AND recipients.phone IS NOT ?
+    ''', ('New Incident', f'Incident {incident_label(cursor, incident_id)}', 'incident_created', incident_id,
+          *NOTIFY_ROLES_ON_CREATE, actor))
+    return cursor.rowcount
+
+def notify_incident_assigned(cursor, incident_id, phones, actor=None):
+    """Tell each newly assigned user (other than whoever assigned them)"""
+    phones = [phone for phone in dict.fromkeys(phones) if phone and phone != actor]
+    if not phones:
+        return 0
+    cursor.execute(NOTIFICATION_INSERT + '''
+        FROM (SELECT value AS phone FROM json_each(?)) AS recipients
+    ''', ('Incident Assigned', f'You have been assigned to incident {incident_label(cursor, incident_id)}',
+          'incident_assigned', incident_id, json.dumps(phones)))
+    return cursor.rowcount
+
+def notify_incident_updated(cursor, incident_id, actor=None, status=None, exclude=()):
+    """Tell the incident's creator and assigned users that it changed"""
+    label = incident_label(cursor, incident_id)
+    if status:
+        title, message = 'Incident Updated', f'Incident {label} is now {status}'
+    else:
+        title, message = 'Incident Updated', f'Incident {label} has been updated'
+    cursor.execute(NOTIFICATION_INSERT + '''
+        FROM (
+            SELECT user_phone AS phone FROM incident_assignments WHERE incident_id = ?
+            UNION
+            SELECT created_by FROM incidents WHERE id = ?
+        ) AS recipients
+        WHERE recipients.phone IS NOT NULL AND recipients.phone != ''
+          AND recipients.phone IS NOT ?
+          AND recipients.phone NOT IN (SELECT value FROM json_each(?))
+    ''', (title, message, 'incident_updated', incident_id,
+          incident_id, incident_id, actor, json.dumps(list(exclude))))
+    return cursor.rowcount
+
+def notify_incident_patch(cursor, incident_id, diff, actor=None):
+    """Fan out for an applied JSON Patch diff (see incident_patch)"""
+    assigned = [
+        change['value'].get('user_phone') for change in diff
+        if change['op'] == 'add' and change['path'].startswith('/assignedUsers/')
+    ]
+    others = [
+        change for change in diff
+        if not (change['op'] == 'add' and change['path'].startswith('/assignedUsers/'))
+    ]
+    count = notify_incident_assigned(cursor, incident_id, assigned, actor)
+    if others:
+        status = next((change['value'] for change in others if change['path'] == '/status'), None)
+        # Newly assigned users already got their own notification
+        count += notify_incident_updated(cursor, incident_id, actor, status, exclude=assigned)
+    return count
+
+def unread_count(cursor, user_phone):
+    """Counted from the partial unread index alone"""
+    cursor.execute('SELECT COUNT(*) FROM notifications WHERE user_phone = ? AND is_read = 0', (user_phone,))
+    return cursor.fetchone()[0]
+
+def fetch_notifications(cursor, user_phone, since_id=0, limit=DEFAULT_NOTIFICATION_PAGE_SIZE, unread_only=True):
+    """Notifications after since_id, oldest first, plus one extra row to detect more"""
+    cursor.execute(f'''
+        SELECT id, title, message, type, incident_id, is_read, created_at
+        FROM notifications
+        WHERE user_phone = ? AND id > ?{' AND is_read = 0' if unread_only else ''}
+        ORDER BY id
+        LIMIT ?
+    ''', (user_phone, since_id, limit + 1))
+    return cursor.fetchall()
+
+def mark_read(cursor, user_phone, ids=None, up_to=None):
+    """Mark the given ids, or everything up to and including up_to, as read"""
+    if ids is not None:
+        cursor.execute('''
+            UPDATE notifications SET is_read = 1
+            WHERE user_phone = ? AND is_read = 0
+              AND id IN (SELECT value FROM json_each(?))
+        ''', (user_phone, json.dumps(ids)))
+    else:
+        cursor.execute('''
+            UPDATE notifications SET is_read = 1
+            WHERE user_phone = ? AND is_read = 0 AND id <= ?
+        ''', (user_phone, up_to))
+    return cursor.rowcount
@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from database import get_db
+
+# Which backend holds OTPs: 'sqlite' (shared by all gunicorn workers) or 'memory'
+OTP_STORE_BACKEND = os.environ.get('OTP_STORE', 'sqlite')
+
+OTP_TTL_SECONDS = int(os.environ.get('OTP_TTL_SECONDS', 300))
+
+# Send throttles: at most N sends per window, per phone number and per client IP
+OTP_SENDS_PER_NUMBER = int(os.environ.get('OTP_SENDS_PER_NUMBER', 3))
+OTP_SENDS_PER_IP = int(os.environ.get('OTP_SENDS_PER_IP', 10))
+OTP_THROTTLE_WINDOW = int(os.environ.get('OTP_THROTTLE_WINDOW', 600))
+
+# Expired codes and old send records are swept at most this often
+OTP_SWEEP_INTERVAL = int(os.environ.get('OTP_SWEEP_INTERVAL', 60))
+
+class OTPStore(ABC):
+    """Interface for OTP storage with TTL expiry and send throttling
+
+    get() still returns expired codes until the next sweep, so callers can
+    tell "expired" apart from "never sent".
+    """
+
+    def __init__(self):
+        self.last_sweep = 0.0
+        self.sweep_lock = threading.Lock()
+
+    @abstractmethod
+    def save(self, phone, otp, ttl=OTP_TTL_SECONDS):
+        pass
+
+    @abstractmethod
+    def get(self, phone):
+        """Return {'otp', 'expires_at'} or None"""
+
+    @abstractmethod
+    def delete(self, phone):
+        pass
+
+    @abstractmethod
+    def record_sends_if_allowed(self, limits, now, since):
+        """Atomically check every (name, key, limit) and record a send for each key
+
+        Nothing is recorded unless all keys have fewer than limit sends after
+        since. Returns None when recorded, otherwise the first exceeded name.
+        """
+
+    @abstractmethod
+    def sweep(self, now):
+        """Drop expired codes and send records older than the throttle window"""
+
+    def maybe_sweep(self):
+        now = time.time()
+        with self.sweep_lock:
+            if now - self.last_sweep < OTP_SWEEP_INTERVAL:
+                return
+            self.last_sweep = now
+        self.sweep(now)
+
+    def allow_send(self, phone, ip):
+        """Record a send attempt if both throttles allow it
+
+        Returns None when allowed, otherwise the name of the exceeded limit.
+        """
+        self.maybe_sweep()
+        now = time.time()
+        limits = [('phone', f'phone:{phone}', OTP_SENDS_PER_NUMBER)]
+        if ip:
+            limits.append(('ip', f'ip:{ip}', OTP_SENDS_PER_IP))
+        return self.record_sends_if_allowed(limits, now, now - OTP_THROTTLE_WINDOW)
+
+class MemoryOTPStore(OTPStore):
+    """Per-process store; only correct with a single worker"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.codes = {}
+        self.sends = {}
+
+    def save(self, phone, otp, ttl=OTP_TTL_SECONDS):
+        self.maybe_sweep()
+        with self.lock:
+            self.codes[phone] = {'otp': otp, 'expires_at': time.time() + ttl}
+
+    def get(self, phone):
+        with self.lock:
+            record = self.codes.get(phone)
+            return dict(record) if record else None
+
+    def delete(self, phone):
+        with self.lock:
+            self.codes.pop(phone, None)
+
+    def record_sends_if_allowed(self, limits, now, since):
+        with self.lock:
+            for name, key, limit in limits:
+                if sum(1 for sent_at in self.sends.get(key, ()) if sent_at > since) >= limit:
+                    return name
+            for _, key, _ in limits:
+                self.sends.setdefault(key, []).append(now)
+        return None
+
+    def sweep(self, now):
+        cutoff = now - OTP_THROTTLE_WINDOW
+        with self.lock:
+            for phone in [p for p, r in self.codes.items() if r['expires_at'] < now]:
+                del self.codes[phone]
+            for key in list(self.sends):
+                recent = [sent_at for sent_at in self.sends[key] if sent_at > cutoff]
+                if recent:
+                    self.sends[key] = recent
+                else:
+                    del self.sends[key]
+
+class SQLiteOTPStore(OTPStore):
+    """Store shared by every worker through the otp_codes / otp_sends tables"""
+
+    def save(self, phone, otp, ttl=OTP_TTL_SECONDS):
+        self.maybe_sweep()
+        conn = get_db()
+        conn.execute('''
+            INSERT OR REPLACE INTO otp_codes (phone, otp, expires_at)
+            VALUES (?, ?, ?)
+        ''', (phone, otp, time.time() + ttl))
+        conn.commit()
+        conn.close()
+
+    def get(self, phone):
+        conn = get_db()
+        row = conn.execute('SELECT otp, expires_at FROM otp_codes WHERE phone = ?', (phone,)).fetchone()
+        conn.close()
+        return {'otp': row[0], 'expires_at': row[1]} if row else None
+
+    def delete(self, phone):
+        conn = get_db()
+        conn.execute('DELETE FROM otp_codes WHERE phone = ?', (phone,))
+        conn.commit()
+        conn.close()
+
+    def record_sends_if_allowed(self, limits, now, since):
+        # BEGIN IMMEDIATE takes the write lock before counting, so concurrent
+        # sends from other workers cannot all pass the same check
+        conn = get_db()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for name, key, limit in limits:
+                row = conn.execute('SELECT COUNT(*) FROM otp_sends WHERE key = ? AND sent_at > ?',
+                                   (key, since)).fetchone()
+                if row[0] >= limit:
+                    return name
+            conn.executemany('INSERT INTO otp_sends (key, sent_at) VALUES (?, ?)',
+                             [(key, now) for _, key, _ in limits])
+            conn.commit()
+            return None
+        finally:
+            conn.close()
+
+    def sweep(self, now):
+        conn = get_db()
+        conn.execute('DELETE FROM otp_codes WHERE expires_at < ?', (now,))
+        conn.execute('DELETE FROM otp_sends WHERE sent_at < ?', (now - OTP_THROTTLE_WINDOW,))
+        conn.commit()
+        conn.close()
+
+def create_otp_store(backend=OTP_STORE_BACKEND):
+    if backend == 'memory':
+        return MemoryOTPStore()
+    if backend == 'sqlite':
+        return SQLiteOTPStore()
+    raise ValueError(f'Unknown OTP store backend: {backend}')
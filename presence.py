@@ -0,0 +1,287 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from applog import get_logger
+from database import get_db
+
+log = get_logger('presence')
+
+# A user is online until PRESENCE_TTL_SECONDS after their last heartbeat
+PRESENCE_TTL_SECONDS = float(os.environ.get('PRESENCE_TTL_SECONDS', 90))
+
+# 'shared' publishes each worker's table to PRESENCE_DIR so every worker sees
+# every heartbeat; 'memory' keeps presence per process (single worker / dev)
+PRESENCE_STORE = os.environ.get('PRESENCE_STORE', 'shared')
+PRESENCE_DIR = os.environ.get('PRESENCE_DIR', os.path.join(tempfile.gettempdir(), 'shomrim-presence'))
+PRESENCE_PUBLISH_INTERVAL = float(os.environ.get('PRESENCE_PUBLISH_INTERVAL', 1.0))
+PRESENCE_READ_INTERVAL = float(os.environ.get('PRESENCE_READ_INTERVAL', 1.0))
+
+# PTT channel -> who belongs to it, from the user's profile
+CHANNEL_RULES = {
+    'dispatchers': lambda profile: profile['role'] == 'Dispatcher',
+    'coordinators': lambda profile: profile['role'] == 'Coordinator',
+    'on-duty': lambda profile: bool(profile['on_duty']),
+    'on-patrol': lambda profile: bool(profile['on_patrol']),
+}
+
+def load_profile(phone):
+    """Roster fields for one user (one indexed lookup), or None if unknown"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT name, phone, callsign, role, on_duty, on_patrol
+            FROM users WHERE phone = ?
+        ''', (phone,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def is_online(entry, cutoff):
+    return entry['last_seen'] >= cutoff and entry['last_seen'] > entry['offline_at']
+
+def channels_for(profile):
+    return ['all'] + [channel for channel, rule in CHANNEL_RULES.items() if rule(profile)]
+
+def build_channel_index(entries):
+    channels = {}
+    for phone, entry in entries.items():
+        for channel in channels_for(entry['profile']):
+            channels.setdefault(channel, set()).add(phone)
+    return channels
+
+class PresenceTracker:
+    """Who is connected right now, kept in memory
+
+    entries: phone -> {'profile', 'profile_at', 'last_seen', 'offline_at'}
+    channels: channel -> set of phones, maintained alongside entries
+    Profiles come from SQLite once per user (and again when duty / patrol
+    status changes); heartbeats and roster reads never touch the database.
+    """
+
+    def __init__(self, ttl=PRESENCE_TTL_SECONDS):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.channels = {}
+
+    def index(self, phone, profile):
+        for members in self.channels.values():
+            members.discard(phone)
+        if profile is not None:
+            for channel in channels_for(profile):
+                self.channels.setdefault(channel, set()).add(phone)
+
+    def heartbeat(self, phone, now=None):
+        """Mark phone as online; returns its expiry time, or None if the user does not exist"""
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.get(phone)
+            if entry is not None:
+                entry['last_seen'] = now
+                self.changed(membership=False)
+                return now + self.ttl
+        profile = load_profile(phone)
+        if profile is None:
+            return None
+        with self.lock:
+            self.entries[phone] = {'profile': profile, 'profile_at': now, 'last_seen': now, 'offline_at': 0.0}
+            self.index(phone, profile)
+            self.changed()
+        return now + self.ttl
+
+    def refresh_profile(self, phone):
+        """Re-read a user's profile after a duty / patrol / role change
+
+        The change may arrive at a worker that has never seen the user's
+        heartbeat, so without a local entry a profile-only one is kept
+        (last_seen 0, never online by itself) for the newer profile_at to
+        reach the worker that does hold it.
+        """
+        profile = load_profile(phone)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(phone)
+            if profile is None:
+                if entry is None:
+                    return
+                del self.entries[phone]
+            elif entry is None:
+                self.entries[phone] = {'profile': profile, 'profile_at': now, 'last_seen': 0.0, 'offline_at': 0.0}
+            else:
+                entry.update(profile=profile, profile_at=now)
+            self.index(phone, profile)
+            self.changed()
+
+    def offline(self, phone):
+        """Explicit logout; the entry stays (offline) so other workers see it"""
+        with self.lock:
+            entry = self.entries.get(phone)
+            if entry is not None:
+                entry['offline_at'] = time.time()
+                self.changed()
+
+    def changed(self, membership=True):
+        """Hook for subclasses; called with the lock held after every write
+        
+        membership is False when only a last_seen moved forward.
+        """
+
+    def view(self):
+        """(entries, channel index) to answer roster queries from; read them with the lock held"""
+        return self.entries, self.channels
+
+    def online(self, channel='all', now=None):
+        """Online users in a channel, sorted by name"""
+        cutoff = (now or time.time()) - self.ttl
+        entries, channels = self.view()
+        with self.lock:
+            users = [
+                dict(entries[phone]['profile'], last_seen=entries[phone]['last_seen'])
+                for phone in channels.get(channel, ())
+                if is_online(entries[phone], cutoff)
+            ]
+        users.sort(key=lambda user: (user['name'] or '').lower())
+        return users
+
+    def sweep(self, now=None):
+        """Drop entries that expired (and whose profile was loaded) long ago"""
+        cutoff = (now or time.time()) - self.ttl * 10
+        with self.lock:
+            expired = [phone for phone, entry in self.entries.items()
+                       if max(entry['last_seen'], entry['profile_at']) < cutoff]
+            for phone in expired:
+                del self.entries[phone]
+                self.index(phone, None)
+
+    def stats(self):
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            local = sum(1 for entry in self.entries.values() if is_online(entry, cutoff))
+        return {'store': 'memory', 'local_online': local, 'online': len(self.online())}
+
+class SharedPresenceTracker(PresenceTracker):
+    """PresenceTracker whose table is shared by all workers through small files
+
+    Each worker publishes its own entries to PRESENCE_DIR/worker-<pid>.json
+    (at most every PRESENCE_PUBLISH_INTERVAL, off the request path) and
+    merges everyone else's on read, cached for PRESENCE_READ_INTERVAL.
+    Per phone the latest heartbeat and logout win, and the profile comes
+    from whichever worker loaded it most recently.
+    """
+
+    def __init__(self, ttl=PRESENCE_TTL_SECONDS, directory=PRESENCE_DIR):
+        super().__init__(ttl)
+        self.directory = directory
+        self.dirty = threading.Event()
+        self.merged = ({}, {})
+        self.merged_at = None
+        self.publisher = None
+        self.pid = None
+
+    def changed(self, membership=True):
+        self.dirty.set()
+        if membership:
+            # Someone joined, left or changed channels: don't wait for the merge cache
+            self.merged_at = None
+        self.ensure_started()
+
+    def ensure_started(self):
+        """Start the publisher thread once per worker process"""
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.publisher = threading.Thread(target=self._publish_loop, name='presence-publisher', daemon=True)
+        self.publisher.start()
+
+    def _publish_loop(self):
+        while True:
+            self.dirty.wait()
+            self.dirty.clear()
+            try:
+                self.sweep()
+                self.publish()
+            except Exception:
+                log.exception('presence publish failed')
+            time.sleep(PRESENCE_PUBLISH_INTERVAL)
+
+    def publish(self):
+        with self.lock:
+            snapshot = {'pid': os.getpid(), 'written_at': time.time(),
+                        'entries': {phone: dict(entry) for phone, entry in self.entries.items()}}
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'worker-{os.getpid()}.json')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(snapshot, tmp)
+        os.replace(tmp_path, path)
+
+    def read_others(self):
+        """Entry tables published by the other live workers"""
+        tables = []
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            return tables
+        stale = time.time() - self.ttl * 10
+        own = f'worker-{os.getpid()}.json'
+        for filename in filenames:
+            if not filename.startswith('worker-') or filename == own:
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot['written_at'] < stale:
+                # Left behind by a worker that exited
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            tables.append(snapshot['entries'])
+        return tables
+
+    def view(self):
+        # Other workers' files are read without the lock, so heartbeats never wait on disk
+        now = time.monotonic()
+        merged_at = self.merged_at
+        if merged_at is not None and now - merged_at < PRESENCE_READ_INTERVAL:
+            return self.merged
+        others = self.read_others()
+        with self.lock:
+            merged = {phone: dict(entry) for phone, entry in self.entries.items()}
+            for entries in others:
+                for phone, entry in entries.items():
+                    mine = merged.setdefault(phone, dict(entry))
+                    mine['last_seen'] = max(mine['last_seen'], entry['last_seen'])
+                    mine['offline_at'] = max(mine['offline_at'], entry['offline_at'])
+                    if entry['profile_at'] > mine['profile_at']:
+                        mine['profile'], mine['profile_at'] = entry['profile'], entry['profile_at']
+                    local = self.entries.get(phone)
+                    if local is not None and entry['profile_at'] > local['profile_at']:
+                        # Adopt a profile refreshed elsewhere, so we publish it from now on
+                        local.update(profile=entry['profile'], profile_at=entry['profile_at'])
+                        self.index(phone, entry['profile'])
+                        self.dirty.set()
+            self.merged = (merged, build_channel_index(merged))
+            self.merged_at = now
+            return self.merged
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(store='shared', directory=self.directory)
+        return stats
+
+def create_presence_tracker():
+    if PRESENCE_STORE == 'memory':
+        return PresenceTracker()
+    if PRESENCE_STORE == 'shared':
+        return SharedPresenceTracker()
+    raise ValueError(f'Unknown presence store: {PRESENCE_STORE}')
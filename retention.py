@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+
+import audio_store
+from applog import get_logger
+from database import get_db
+
+log = get_logger('retention')
+
+# How often the background sweeper runs, in seconds
+RETENTION_INTERVAL = float(os.environ.get('PTT_RETENTION_INTERVAL', 60))
+
+# Rows deleted per transaction, so the write lock is only held briefly
+RETENTION_BATCH_SIZE = int(os.environ.get('PTT_RETENTION_BATCH_SIZE', 200))
+
+# Per-channel policies; 'default' applies to channels without their own entry.
+# Any limit may be None to disable it.
+DEFAULT_POLICIES = {
+    'default': {
+        'max_count': 50,
+        'max_age_seconds': None,
+        'max_bytes': 64 * 1024 * 1024
+    }
+}
+
+def load_policies():
+    """Policies from PTT_RETENTION_POLICIES (JSON), merged over the defaults"""
+    policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+    raw = os.environ.get('PTT_RETENTION_POLICIES')
+    if raw:
+        for channel, policy in json.loads(raw).items():
+            policies.setdefault(channel, dict(policies['default'])).update(policy)
+    return policies
+
+policies = load_policies()
+
+stats = {
+    'runs': 0,
+    'deleted_messages': 0,
+    'deleted_bytes': 0,
+    'removed_files': 0,
+    'last_run_seconds': 0.0,
+    'total_run_seconds': 0.0,
+    'last_error': None
+}
+
+def policy_for(channel):
+    return policies.get(channel, policies['default'])
+
+def cutoff_id(cursor, channel, policy):
+    """Highest message id in the channel that falls outside the policy, or 0"""
+    cutoffs = [0]
+
+    if policy.get('max_count') is not None:
+        cursor.execute('''
+            SELECT id FROM ptt_messages
+            WHERE channel = ?
+            ORDER BY id DESC
+            LIMIT 1 OFFSET ?
+        ''', (channel, policy['max_count']))
+        row = cursor.fetchone()
+        if row:
+            cutoffs.append(row[0])
+
+    if policy.get('max_age_seconds') is not None:
+        cursor.execute('''
+            SELECT MAX(id) FROM ptt_messages
+            WHERE channel = ? AND created_at < datetime('now', ?)
+        ''', (channel, f"-{int(policy['max_age_seconds'])} seconds"))
+        row = cursor.fetchone()
+        if row and row[0]:
+            cutoffs.append(row[0])
+
+    if policy.get('max_bytes') is not None:
+        cursor.execute('''
+            SELECT MAX(id) FROM (
+                SELECT id, SUM(COALESCE(audio_size, 0)) OVER (ORDER BY id DESC) AS running_bytes
+                FROM ptt_messages
+                WHERE channel = ?
+            )
+            WHERE running_bytes > ?
+        ''', (channel, policy['max_bytes']))
+        row = cursor.fetchone()
+        if row and row[0]:
+            cutoffs.append(row[0])
+
+    return max(cutoffs)
+
+def purge_channel(conn, channel, up_to_id):
+    """Delete a channel's messages with id <= up_to_id in primary-key batches"""
+    cursor = conn.cursor()
+    deleted = 0
+    while True:
+        cursor.execute('''
+            SELECT id, audio_hash, COALESCE(audio_size, 0) FROM ptt_messages
+            WHERE channel = ? AND id <= ?
+            ORDER BY id
+            LIMIT ?
+        ''', (channel, up_to_id, RETENTION_BATCH_SIZE))
+        batch = cursor.fetchall()
+        if not batch:
+            break
+
+        cursor.execute('''
+            DELETE FROM ptt_messages
+            WHERE channel = ? AND id BETWEEN ? AND ?
+        ''', (channel, batch[0][0], batch[-1][0]))
+        # Check and unlink while the delete still holds the write lock, so no
+        # broadcast of an identical clip can insert a reference in between
+        stats['removed_files'] += audio_store.remove_unreferenced_audio(cursor, [row[1] for row in batch])
+        conn.commit()
+
+        for row in batch:
+            audio_store.audio_cache.discard(row[0])
+        stats['deleted_bytes'] += sum(row[2] for row in batch)
+        deleted += len(batch)
+
+        if len(batch) < RETENTION_BATCH_SIZE:
+            break
+    return deleted
+
+def run_once():
+    """Apply every channel's policy once; returns the number of deleted messages"""
+    started = time.monotonic()
+    deleted = 0
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT DISTINCT channel FROM ptt_messages')
+        channels = [row[0] for row in cursor.fetchall()]
+
+        for channel in channels:
+            up_to_id = cutoff_id(cursor, channel, policy_for(channel))
+            if up_to_id:
+                deleted += purge_channel(conn, channel, up_to_id)
+        stats['last_error'] = None
+    except Exception as e:
+        stats['last_error'] = str(e)
+        raise
+    finally:
+        conn.close()
+        elapsed = time.monotonic() - started
+        stats['runs'] += 1
+        stats['deleted_messages'] += deleted
+        stats['last_run_seconds'] = round(elapsed, 4)
+        stats['total_run_seconds'] = round(stats['total_run_seconds'] + elapsed, 4)
+    return deleted
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+def _loop():
+    while True:
+        time.sleep(RETENTION_INTERVAL)
+        try:
+            run_once()
+        except Exception:
+            log.exception('ptt retention run failed')
+
+def ensure_started():
+    """Start the sweeper thread once per worker process (safe to call per request)"""
+    global _worker, _worker_pid
+    if _worker_pid == os.getpid() or RETENTION_INTERVAL <= 0:
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker = threading.Thread(target=_loop, name='ptt-retention', daemon=True)
+        _worker.start()
+        _worker_pid = os.getpid()
+
+if __name__ == '__main__':
+    # One-off run, e.g. from cron: python retention.py
+    print(f"Deleted {run_once()} PTT messages")
+    print(json.dumps(stats, indent=2))
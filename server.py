@@ -1,44 +1,106 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, request, jsonify, send_from_directory, send_file, make_response, Response
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import random
 import string
-from twilio.rest import Client
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
-from database import get_db, row_to_dict, rows_to_list, init_db
+import re
+import sqlite3
+import base64
+import threading
+import time
+import audio_store
+import retention
+import otp_store
+import sms_queue
+import metrics
+import fastjson
+import compression
+import static_assets
+import presence
+import geo
+import incident_patch
+import dispatch
+import notifications
+from list_cache import list_cache
+from applog import get_logger
+from database import get_db, row_to_dict, rows_to_list, init_db, SYNC_TIMESTAMP_SQL, CACHED_USER_COLUMNS, pool_stats, is_cooperative
 
-app = Flask(__name__, static_folder='.', static_url_path='')
+# Reverse proxies in front of the app (Railway / Render add one). Only the
+# X-Forwarded-For hops they append are trusted; 0 ignores the header.
+PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 1))
+
+# Frontend files are served by serve_index / serve_static below
+app = Flask(__name__, static_folder=None)
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+log = get_logger('server')
 CORS(app, resources={r"/api/*": {"origins": "*"}})  # Enable CORS for all API endpoints
+metrics.init_app(app)  # Per-endpoint latency, status, SQL and payload metrics
+fastjson.init_app(app)  # orjson encoder when installed
+compression.init_app(app)  # gzip / brotli for large API responses
 
 # Initialize database on startup
 try:
     init_db()
-    print("✅ Database initialized successfully")
+    log.info('database initialized')
 except Exception as e:
-    print(f"⚠️ Database init error: {e}")
+    log.error('database init error: %s', e)
 
 # Twilio configuration - Get these from https://www.twilio.com/console
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', 'YOUR_ACCOUNT_SID_HERE')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', 'YOUR_AUTH_TOKEN_HERE')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER', 'YOUR_TWILIO_PHONE_HERE')  # e.g., +1234567890
 
-# In-memory OTP storage (in production, use Redis or database)
-otp_storage = {}
+# Outbound SMS (OTPs, incident alerts) - queued and sent by background workers
+sms_outbox = sms_queue.SMSQueue(
+    sms_queue.create_transport(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER)
+)
+
+# OTP storage - shared through SQLite by default so any worker can verify
+otp_storage = otp_store.create_otp_store()
+
+# Who is actually connected, from client heartbeats (shared across workers)
+presence_tracker = presence.create_presence_tracker()
+
+# Fingerprint and precompress the app shell (brotli q11) while the worker
+# boots, so the first page load doesn't wait for it
+static_assets.bundle.ensure_built()
 
 # PTT now uses database instead of memory
 
+@app.before_request
+def start_background_workers():
+    """Start per-worker background threads (PTT retention) on first use"""
+    retention.ensure_started()
+
 # Serve frontend files
 @app.route('/')
 def serve_index():
     """Serve the main app page"""
+    asset, cache_control = static_assets.bundle.get('index.html')
+    if asset is not None:
+        return asset.response(request, cache_control)
     return send_file('index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """Serve static files"""
+    """Serve static files (the app shell precompressed and fingerprinted)"""
+    asset, cache_control = static_assets.bundle.get(path)
+    if asset is not None:
+        return asset.response(request, cache_control)
     return send_from_directory('.', path)
 
+def get_client_ip():
+    """Client IP as seen by the trusted proxy
+    
+    ProxyFix takes it from the X-Forwarded-For hop appended by our own
+    proxy (PROXY_COUNT from the right), never from client-supplied hops.
+    """
+    return request.remote_addr
+
 def generate_otp():
     """Generate a 6-digit OTP"""
     # Fixed OTP for testing
@@ -58,41 +120,33 @@ def send_otp():
         # Format phone number
         full_phone = f"{country_code}{phone_number}"
         
+        # Throttle per number and per client IP
+        exceeded = otp_storage.allow_send(full_phone, get_client_ip())
+        if exceeded:
+            return jsonify({'error': f'Too many OTP requests for this {exceeded}, please try again later'}), 429
+        
         # Generate OTP
         otp = generate_otp()
         
         # Store OTP with expiry (5 minutes)
-        otp_storage[full_phone] = {
-            'otp': otp,
-            'expiry': datetime.now() + timedelta(minutes=5)
-        }
+        otp_storage.save(full_phone, otp)
         
-        # Send OTP via Twilio
-        try:
-            client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-            message = client.messages.create(
-                body=f"Your Shomrim verification code is: {otp}\n\nThis code will expire in 5 minutes.",
-                from_=TWILIO_PHONE_NUMBER,
-                to=full_phone
-            )
-            
-            return jsonify({
-                'success': True,
-                'message': 'OTP sent successfully',
-                'message_sid': message.sid
-            })
-        except Exception as twilio_error:
-            # For development/testing - log the OTP
-            print(f"\n{'='*50}")
-            print(f"DEVELOPMENT MODE - OTP for {full_phone}: {otp}")
-            print(f"{'='*50}\n")
-            
-            # Return success anyway for testing
-            return jsonify({
-                'success': True,
-                'message': 'OTP sent (dev mode)',
-                'dev_otp': otp  # Only in development!
-            })
+        # Queue the SMS - delivery (and retries) happen off the request thread
+        sms_outbox.enqueue(
+            full_phone,
+            f"Your Shomrim verification code is: {otp}\n\nThis code will expire in 5 minutes.",
+            kind='otp'
+        )
+        
+        response = {
+            'success': True,
+            'message': 'OTP queued for delivery'
+        }
+        if sms_outbox.transport.name == 'console':
+            # For development/testing - OTP is logged by the console transport
+            response['message'] = 'OTP sent (dev mode)'
+            response['dev_otp'] = otp  # Only in development!
+        return jsonify(response)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -113,28 +167,23 @@ def verify_otp():
         full_phone = f"{country_code}{phone_number}"
         
         # Check if OTP exists
-        if full_phone not in otp_storage:
+        stored_data = otp_storage.get(full_phone)
+        if not stored_data:
             return jsonify({'error': 'No OTP found for this number'}), 404
         
-        stored_data = otp_storage[full_phone]
-        
         # Debug logging
-        print(f"\n{'='*50}")
-        print(f"VERIFY OTP - Phone: {full_phone}")
-        print(f"VERIFY OTP - Entered: '{entered_otp}' (type: {type(entered_otp)})")
-        print(f"VERIFY OTP - Stored: '{stored_data['otp']}' (type: {type(stored_data['otp'])})")
-        print(f"VERIFY OTP - Match: {str(stored_data['otp']).strip() == str(entered_otp).strip()}")
-        print(f"{'='*50}\n")
+        log.debug('verify otp phone=%s match=%s', full_phone,
+                  str(stored_data['otp']).strip() == str(entered_otp).strip())
         
         # Check if OTP expired
-        if datetime.now() > stored_data['expiry']:
-            del otp_storage[full_phone]
+        if time.time() > stored_data['expires_at']:
+            otp_storage.delete(full_phone)
             return jsonify({'error': 'OTP has expired'}), 400
         
         # Verify OTP - convert both to strings and strip whitespace
         if str(stored_data['otp']).strip() == str(entered_otp).strip():
             # OTP verified - remove from storage
-            del otp_storage[full_phone]
+            otp_storage.delete(full_phone)
             
             # Check if user already exists in database
             conn = get_db()
@@ -184,6 +233,8 @@ def create_user():
         conn.commit()
         conn.close()
         
+        presence_tracker.refresh_profile(data['phone'])
+        
         return jsonify({'success': True, 'message': 'User saved'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -207,123 +258,840 @@ def get_user(phone):
 
 # ========== INCIDENT ENDPOINTS ==========
 
-@app.route('/api/incidents', methods=['POST'])
-def create_incident():
-    """Create new incident"""
-    try:
-        import json
-        data = request.json
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Insert incident with full metadata
-        cursor.execute('''
-            INSERT INTO incidents (
-                id, shcad, title, type, description, status, address, postcode,
-                caller_name, caller_phone, caller_is_victim, caller_is_witness, metadata, created_by
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+PARTICIPANT_TYPES = (('victims', 'victim'), ('witnesses', 'witness'), ('suspects', 'suspect'))
+
+def write_incidents(cursor, incidents, imported=False):
+    """Insert incidents with their participants, police info and history,
+    one executemany per table
+    
+    Imported records may also carry their original created_at and their own
+    notes / history lists; live creates always start fresh.
+    """
+    incident_rows = []
+    participant_rows = []
+    police_rows = []
+    history_rows = []
+    note_rows = []
+    
+    for data in incidents:
+        caller = data.get('caller') or {}
+        point = geo.parse_point(data.get('location')) or (None, None)
+        incident_rows.append((
             data['id'], data['shcad'], data['title'], data['type'], data['description'],
             data.get('status', 'pending'), data.get('address'), data.get('postcode'),
-            data['caller'].get('name'), data['caller'].get('phone'),
-            data['caller'].get('isVictim', False), data['caller'].get('isWitness', False),
-            json.dumps(data),  # Store full incident data as JSON
-            data.get('created_by')
+            caller.get('name'), caller.get('phone'),
+            caller.get('isVictim', False), caller.get('isWitness', False),
+            json.dumps(data),  # The submitted JSON, kept as-is; reads use the columns
+            data.get('created_by'), point[0], point[1],
+            data.get('created_at') if imported else None
         ))
         
-        # Add victims
-        for victim in data.get('victims', []):
-            cursor.execute('''
-                INSERT INTO incident_participants (incident_id, type, name, phone, address, description)
-                VALUES (?, 'victim', ?, ?, ?, ?)
-            ''', (data['id'], victim['name'], victim.get('phone'), victim.get('address'), victim.get('description')))
+        for key, participant_type in PARTICIPANT_TYPES:
+            for person in data.get(key) or []:
+                participant_rows.append((data['id'], participant_type, person['name'], person.get('phone'),
+                                         person.get('address'), person.get('description')))
         
-        # Add witnesses
-        for witness in data.get('witnesses', []):
-            cursor.execute('''
-                INSERT INTO incident_participants (incident_id, type, name, phone, address, description)
-                VALUES (?, 'witness', ?, ?, ?, ?)
-            ''', (data['id'], witness['name'], witness.get('phone'), witness.get('address'), witness.get('description')))
-        
-        # Add suspects
-        for suspect in data.get('suspects', []):
-            cursor.execute('''
-                INSERT INTO incident_participants (incident_id, type, name, phone, address, description)
-                VALUES (?, 'suspect', ?, ?, ?, ?)
-            ''', (data['id'], suspect['name'], suspect.get('phone'), suspect.get('address'), suspect.get('description')))
-        
-        # Add police info if provided
         if data.get('policeInfo'):
             pi = data['policeInfo']
-            cursor.execute('''
-                INSERT INTO incident_police_info (incident_id, cad_ref, cris_ref, chs_ref, officer_name, officer_badge)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (data['id'], pi.get('cadRef'), pi.get('crisRef'), pi.get('chsRef'), 
-                  pi.get('officerName'), pi.get('officerBadge')))
+            police_rows.append((data['id'], pi.get('cadRef'), pi.get('crisRef'), pi.get('chsRef'),
+                                pi.get('officerName'), pi.get('officerBadge')))
+        
+        action = 'imported' if imported else 'created'
+        history_rows.append((data['id'], data.get('created_by'), action,
+                             f"Incident {action}: {data['title']}", None))
+        
+        if imported:
+            for entry in data.get('history') or []:
+                history_rows.append((data['id'], entry.get('user_phone'), entry['action'],
+                                     entry.get('details'), entry.get('created_at')))
+            for note in data.get('notes') or []:
+                note_rows.append((data['id'], note.get('user_phone') or data.get('created_by') or '',
+                                  note['note'], note.get('isFollowUp', False), note.get('created_at')))
+    
+    cursor.executemany(f'''
+        INSERT INTO incidents (
+            id, shcad, title, type, description, status, address, postcode,
+            caller_name, caller_phone, caller_is_victim, caller_is_witness, metadata, created_by,
+            latitude, longitude, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), {SYNC_TIMESTAMP_SQL})
+    ''', incident_rows)
+    
+    cursor.executemany('''
+        INSERT INTO incident_participants (incident_id, type, name, phone, address, description)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', participant_rows)
+    
+    cursor.executemany('''
+        INSERT INTO incident_police_info (incident_id, cad_ref, cris_ref, chs_ref, officer_name, officer_badge)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', police_rows)
+    
+    cursor.executemany('''
+        INSERT INTO incident_history (incident_id, user_phone, action, details, created_at)
+        VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    ''', history_rows)
+    
+    cursor.executemany('''
+        INSERT INTO incident_notes (incident_id, user_phone, note, is_follow_up, created_at)
+        VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    ''', note_rows)
+    
+    # A re-created incident must not stay deleted for delta clients
+    cursor.executemany('DELETE FROM incident_tombstones WHERE incident_id = ?',
+                       [(data['id'],) for data in incidents])
+
+@app.route('/api/incidents', methods=['POST'])
+def create_incident():
+    """Create new incident"""
+    try:
+        data = request.json
+        conn = get_db()
+        cursor = conn.cursor()
         
-        # Add history entry
-        cursor.execute('''
-            INSERT INTO incident_history (incident_id, user_phone, action, details)
-            VALUES (?, ?, 'created', ?)
-        ''', (data['id'], data.get('created_by'), f"Incident created: {data['title']}"))
+        write_incidents(cursor, [data])
+        notifications.notify_incident_created(cursor, data['id'], data.get('created_by'))
         
         conn.commit()
         conn.close()
         
         return jsonify({'success': True, 'id': data['id'], 'message': 'Incident created successfully'})
     except Exception as e:
-        print(f"Error creating incident: {e}")
+        log.exception('error creating incident')
         return jsonify({'error': str(e)}), 500
 
+# Incidents written per transaction by the bulk import
+BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', 500))
+
+INCIDENT_REQUIRED_FIELDS = ('id', 'shcad', 'title', 'type', 'description')
+
+def normalize_timestamp(value):
+    """ISO-8601 date/time -> SQLite's 'YYYY-MM-DD HH:MM:SS' (so ordering matches CURRENT_TIMESTAMP)"""
+    if value in (None, ''):
+        return None
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def validate_import_record(data):
+    """Check and normalize one bulk-import record in place; returns an error or None"""
+    if not isinstance(data, dict):
+        return 'record must be a JSON object'
+    for field in INCIDENT_REQUIRED_FIELDS:
+        if not isinstance(data.get(field), str) or not data[field].strip():
+            return f'{field} is required'
+    if data.get('caller') is not None and not isinstance(data['caller'], dict):
+        return 'caller must be an object'
+    if data.get('policeInfo') is not None and not isinstance(data['policeInfo'], dict):
+        return 'policeInfo must be an object'
+    for key in ('victims', 'witnesses', 'suspects', 'history', 'notes'):
+        items = data.get(key) or []
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return f'{key} must be a list of objects'
+    for key, _ in PARTICIPANT_TYPES:
+        if any(not person.get('name') for person in data.get(key) or []):
+            return f'every entry in {key} needs a name'
+    if any(not entry.get('action') for entry in data.get('history') or []):
+        return 'every history entry needs an action'
+    if any(not note.get('note') for note in data.get('notes') or []):
+        return 'every note needs text'
+    try:
+        data['created_at'] = normalize_timestamp(data.get('created_at'))
+        for entry in (data.get('history') or []) + (data.get('notes') or []):
+            entry['created_at'] = normalize_timestamp(entry.get('created_at'))
+    except ValueError:
+        return 'created_at must be an ISO-8601 date/time'
+    return None
+
+def import_incident_chunk(conn, records):
+    """Write one chunk of (line, record) pairs in a single transaction
+    
+    Records clashing with existing incidents (or each other) are rejected up
+    front; if the batch still fails, it is retried record by record under
+    savepoints so one bad row cannot sink its neighbours.
+    Returns (imported count, errors).
+    """
+    cursor = conn.cursor()
+    errors = []
+    
+    placeholders = ', '.join('?' * len(records))
+    ids = [data['id'] for _, data in records]
+    shcads = [data['shcad'] for _, data in records]
+    cursor.execute(f'''
+        SELECT id, shcad FROM incidents
+        WHERE id IN ({placeholders}) OR shcad IN ({placeholders})
+    ''', ids + shcads)
+    taken_ids = set()
+    taken_shcads = set()
+    for row in cursor.fetchall():
+        taken_ids.add(row['id'])
+        taken_shcads.add(row['shcad'])
+    
+    accepted = []
+    for line, data in records:
+        if data['id'] in taken_ids:
+            errors.append({'line': line, 'id': data['id'], 'error': 'incident id already exists'})
+        elif data['shcad'] in taken_shcads:
+            errors.append({'line': line, 'id': data['id'], 'error': 'shcad already exists'})
+        else:
+            accepted.append((line, data))
+            taken_ids.add(data['id'])
+            taken_shcads.add(data['shcad'])
+    
+    if not accepted:
+        return 0, errors
+    
+    try:
+        write_incidents(cursor, [data for _, data in accepted], imported=True)
+        conn.commit()
+        return len(accepted), errors
+    except sqlite3.Error:
+        conn.rollback()
+    
+    imported = 0
+    for line, data in accepted:
+        cursor.execute('SAVEPOINT import_record')
+        try:
+            write_incidents(cursor, [data], imported=True)
+            imported += 1
+        except sqlite3.Error as e:
+            cursor.execute('ROLLBACK TO import_record')
+            errors.append({'line': line, 'id': data['id'], 'error': str(e)})
+        cursor.execute('RELEASE import_record')
+    conn.commit()
+    return imported, errors
+
+@app.route('/api/incidents/bulk', methods=['POST'])
+def bulk_import_incidents():
+    """Import incidents from an NDJSON body, one incident object per line
+    
+    The body is read as a stream and written in transactions of
+    BULK_IMPORT_CHUNK_SIZE records. Invalid or conflicting records are
+    reported by line number and skipped; the rest of the import continues.
+    Records use the create_incident shape, plus optional created_at and
+    history / notes lists carried over from the old logs.
+    """
+    try:
+        conn = get_db()
+        imported = 0
+        errors = []
+        chunk = []
+        line_count = 0
+        
+        for line_count, raw in enumerate(request.stream, start=1):
+            if not raw.strip():
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError as e:
+                errors.append({'line': line_count, 'error': f'invalid JSON: {e}'})
+                continue
+            error = validate_import_record(data)
+            if error:
+                errors.append({'line': line_count, 'id': data.get('id') if isinstance(data, dict) else None,
+                               'error': error})
+                continue
+            chunk.append((line_count, data))
+            if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+                written, chunk_errors = import_incident_chunk(conn, chunk)
+                imported += written
+                errors.extend(chunk_errors)
+                chunk = []
+        
+        if chunk:
+            written, chunk_errors = import_incident_chunk(conn, chunk)
+            imported += written
+            errors.extend(chunk_errors)
+        conn.close()
+        
+        errors.sort(key=lambda error: error['line'])
+        log.info('bulk import: %s imported, %s failed', imported, len(errors))
+        return jsonify({
+            'success': not errors,
+            'lines': line_count,
+            'imported': imported,
+            'failed': len(errors),
+            'errors': errors
+        })
+    except Exception as e:
+        log.exception('error importing incidents')
+        return jsonify({'error': str(e)}), 500
+
+# Child tables loaded alongside each incident, with their sort order
+INCIDENT_CHILD_QUERIES = {
+    'participants': 'SELECT * FROM incident_participants WHERE incident_id IN ({}) ORDER BY id',
+    'assignedUsers': '''
+        SELECT a.*, u.name AS user_name FROM incident_assignments a
+        LEFT JOIN users u ON u.phone = a.user_phone
+        WHERE a.incident_id IN ({}) ORDER BY a.id
+    ''',
+    'notes': '''
+        SELECT n.*, u.name AS user_name FROM incident_notes n
+        LEFT JOIN users u ON u.phone = n.user_phone
+        WHERE n.incident_id IN ({}) ORDER BY n.created_at, n.id
+    ''',
+    'history': 'SELECT * FROM incident_history WHERE incident_id IN ({}) ORDER BY created_at, id',
+    'policeInfo': 'SELECT * FROM incident_police_info WHERE incident_id IN ({}) ORDER BY id',
+    'arrests': 'SELECT * FROM incident_arrests WHERE incident_id IN ({}) ORDER BY id',
+}
+
+# Stay well under SQLite's bound-parameter limit
+INCIDENT_ID_CHUNK_SIZE = 500
+
+def load_incident_children(cursor, incidents):
+    """Attach participants, assignments, notes, history, police info and arrests
+    to each incident using one query per child table (per chunk of ids)"""
+    if not incidents:
+        return incidents
+    
+    ids = [incident['id'] for incident in incidents]
+    grouped = {key: {} for key in INCIDENT_CHILD_QUERIES}
+    
+    for start in range(0, len(ids), INCIDENT_ID_CHUNK_SIZE):
+        chunk = ids[start:start + INCIDENT_ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        for key, query in INCIDENT_CHILD_QUERIES.items():
+            cursor.execute(query.format(placeholders), chunk)
+            for row in cursor.fetchall():
+                grouped[key].setdefault(row['incident_id'], []).append(dict(row))
+    
+    for incident in incidents:
+        # PATCH edits the columns; metadata is the creation-time JSON and goes
+        # stale after the first edit, so fields are only served from columns
+        incident.pop('metadata', None)
+        incident['caller'] = {
+            'name': incident['caller_name'],
+            'phone': incident['caller_phone'],
+            'isVictim': bool(incident['caller_is_victim']),
+            'isWitness': bool(incident['caller_is_witness'])
+        }
+        participants = grouped['participants'].get(incident['id'], [])
+        incident['victims'] = [p for p in participants if p['type'] == 'victim']
+        incident['witnesses'] = [p for p in participants if p['type'] == 'witness']
+        incident['suspects'] = [p for p in participants if p['type'] == 'suspect']
+        incident['assignedUsers'] = grouped['assignedUsers'].get(incident['id'], [])
+        incident['notes'] = grouped['notes'].get(incident['id'], [])
+        incident['history'] = grouped['history'].get(incident['id'], [])
+        police_info = grouped['policeInfo'].get(incident['id'])
+        incident['policeInfo'] = police_info[0] if police_info else {}
+        incident['arrests'] = grouped['arrests'].get(incident['id'], [])
+    
+    return incidents
+
+# Incident columns returned by the fields=summary projection (no metadata blob)
+INCIDENT_SUMMARY_COLUMNS = (
+    'id, shcad, title, type, description, status, address, postcode, location, '
+    'caller_name, caller_phone, caller_is_victim, caller_is_witness, '
+    'latitude, longitude, version, created_by, created_at, updated_at'
+)
+
+DEFAULT_INCIDENT_PAGE_SIZE = 50
+MAX_INCIDENT_PAGE_SIZE = 500
+
+def encode_incident_cursor(incident):
+    """Build an opaque keyset cursor from an incident's (created_at, id)"""
+    raw = json.dumps([incident['created_at'], incident['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_incident_cursor(cursor_token):
+    """Decode a keyset cursor back into (created_at, id)"""
+    try:
+        created_at, incident_id = json.loads(base64.urlsafe_b64decode(cursor_token.encode()))
+        return created_at, incident_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def touch_incident(cursor, incident_id):
+    """Bump an incident's updated_at after a write to one of its child tables"""
+    cursor.execute(f'UPDATE incidents SET updated_at = {SYNC_TIMESTAMP_SQL} WHERE id = ?', (incident_id,))
+
+def get_incident_sync_token(cursor):
+    """Latest change across incidents and tombstones, answered from indexes"""
+    cursor.execute('''
+        SELECT MAX(
+            COALESCE((SELECT MAX(updated_at) FROM incidents), ''),
+            COALESCE((SELECT MAX(deleted_at) FROM incident_tombstones), '')
+        )
+    ''')
+    return cursor.fetchone()[0]
+
+def incident_etag(sync_token):
+    """ETag for any incident list view; unchanged token means unchanged data"""
+    return f'"incidents-{sync_token}"'
+
+def get_incident_changes(cursor, since, summary):
+    """Incidents changed and deleted at or after the since token
+    
+    Tokens have millisecond resolution, so a write stamped in the token's
+    millisecond may commit after the token was read. Rows at the token are
+    therefore sent again; clients merge changes by id, so repeats are harmless.
+    """
+    cursor.execute(
+        f"SELECT {INCIDENT_SUMMARY_COLUMNS if summary else '*'} FROM incidents "
+        'WHERE updated_at >= ? ORDER BY updated_at, id',
+        (since,)
+    )
+    changed = rows_to_list(cursor.fetchall())
+    if not summary:
+        load_incident_children(cursor, changed)
+    
+    cursor.execute('''
+        SELECT incident_id, deleted_at FROM incident_tombstones
+        WHERE deleted_at >= ?
+        ORDER BY deleted_at
+    ''', (since,))
+    deleted = rows_to_list(cursor.fetchall())
+    
+    return changed, deleted
+
 @app.route('/api/incidents', methods=['GET'])
 def get_incidents():
-    """Get all incidents"""
+    """Get incidents, optionally filtered, paginated and projected
+    
+    Query params:
+      status, type  - filter on incident status / type
+      limit, cursor - keyset pagination on (created_at, id), newest first
+      fields        - 'summary' skips metadata and child collections
+      since         - delta mode: only incidents changed at or after this sync token,
+                      plus tombstones for deleted ones
+    
+    Without limit/cursor the full list is returned as a bare array (legacy shape).
+    Unpaginated responses carry an ETag and X-Sync-Token; a matching
+    If-None-Match gets a 304 without reading any incident rows.
+    """
     try:
         user_phone = request.args.get('user_phone')
+        status = request.args.get('status')
+        incident_type = request.args.get('type')
+        cursor_token = request.args.get('cursor')
+        summary = request.args.get('fields') == 'summary'
+        since = request.args.get('since')
+        paginated = 'limit' in request.args or cursor_token is not None
+        
+        try:
+            limit = int(request.args.get('limit', DEFAULT_INCIDENT_PAGE_SIZE))
+            after = decode_incident_cursor(cursor_token) if cursor_token else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limit = max(1, min(limit, MAX_INCIDENT_PAGE_SIZE))
+        
+        where = []
+        params = []
+        if status:
+            where.append('status = ?')
+            params.append(status)
+        if incident_type:
+            where.append('type = ?')
+            params.append(incident_type)
+        if after:
+            where.append('(created_at, id) < (?, ?)')
+            params.extend(after)
+        
+        query = f"SELECT {INCIDENT_SUMMARY_COLUMNS if summary else '*'} FROM incidents"
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY created_at DESC, id DESC'
+        if paginated:
+            # Fetch one extra row to know whether there is a next page
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        if not paginated:
+            sync_token = get_incident_sync_token(cursor)
+            etag = incident_etag(sync_token)
+            if etag in request.headers.get('If-None-Match', ''):
+                conn.close()
+                response = make_response('', 304)
+                response.headers['ETag'] = etag
+                return response
+        
+        if since is not None and not paginated:
+            changed, deleted = get_incident_changes(cursor, since, summary)
+            conn.close()
+            response = jsonify({
+                'incidents': changed,
+                'deleted': deleted,
+                'sync_token': sync_token
+            })
+            response.headers['ETag'] = etag
+            return response
+        
+        cursor.execute(query, params)
+        incidents = rows_to_list(cursor.fetchall())
+        
+        has_more = paginated and len(incidents) > limit
+        if has_more:
+            incidents = incidents[:limit]
+        
+        # Get related data for all incidents in one query per child table
+        if not summary:
+            load_incident_children(cursor, incidents)
+        
+        conn.close()
+        
+        if not paginated:
+            response = jsonify(incidents)
+            response.headers['ETag'] = etag
+            response.headers['X-Sync-Token'] = sync_token
+            return response
+        
+        return jsonify({
+            'incidents': incidents,
+            'count': len(incidents),
+            'next_cursor': encode_incident_cursor(incidents[-1]) if has_more else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, as a prefix
+    
+    Quoting each term keeps FTS5 operators and punctuation in user input
+    from being parsed as query syntax.
+    """
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+@app.route('/api/incidents/search', methods=['GET'])
+def search_incidents():
+    """Ranked full-text search over incidents, participants and notes
+    
+    Query params:
+      q             - words to find (prefix match, all must appear)
+      status, type  - optional filters
+      limit, cursor - pagination in rank order
+    
+    Returns incident summaries with a highlighted snippet, best match first.
+    """
+    try:
+        match = build_match_query(request.args.get('q', ''))
+        if not match:
+            return jsonify({'error': 'q is required'}), 400
+        
+        try:
+            limit = int(request.args.get('limit', DEFAULT_SEARCH_PAGE_SIZE))
+            offset = int(base64.urlsafe_b64decode(request.args['cursor'].encode())) if 'cursor' in request.args else 0
+        except ValueError:
+            return jsonify({'error': 'Invalid limit or cursor'}), 400
+        limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+        offset = max(0, offset)
+        
+        where = ['incident_search MATCH ?']
+        params = [match]
+        for column in ('status', 'type'):
+            if request.args.get(column):
+                where.append(f'i.{column} = ?')
+                params.append(request.args[column])
+        params.extend([limit + 1, offset])
+        
+        columns = ', '.join(f'i.{column.strip()}' for column in INCIDENT_SUMMARY_COLUMNS.split(','))
         conn = get_db()
         cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {columns},
+                snippet(incident_search, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+                incident_search.rank AS rank
+            FROM incident_search
+            JOIN incident_keys k ON k.id = incident_search.rowid
+            JOIN incidents i ON i.id = k.incident_id
+            WHERE {' AND '.join(where)}
+            ORDER BY incident_search.rank
+            LIMIT ? OFFSET ?
+        ''', params)
+        incidents = rows_to_list(cursor.fetchall())
+        conn.close()
+        
+        has_more = len(incidents) > limit
+        if has_more:
+            incidents = incidents[:limit]
+        next_offset = str(offset + limit).encode()
         
-        cursor.execute('SELECT * FROM incidents ORDER BY created_at DESC')
+        return jsonify({
+            'incidents': incidents,
+            'count': len(incidents),
+            'next_cursor': base64.urlsafe_b64encode(next_offset).decode() if has_more else None
+        })
+    except Exception as e:
+        log.exception('error searching incidents')
+        return jsonify({'error': str(e)}), 500
+
+MAX_NEARBY_INCIDENTS = 500
+
+@app.route('/api/incidents/nearby', methods=['GET'])
+def get_nearby_incidents():
+    """Incidents inside a bbox or within radius meters of lat/lng
+    
+    Query params:
+      bbox=minLng,minLat,maxLng,maxLat  or  lat, lng, radius (meters, default 500)
+      status, type - optional filters
+      limit        - max results (radius queries return the nearest)
+    
+    Candidates come from the incident_locations R*Tree, so cost depends on
+    the size of the area, not on how much history there is.
+    """
+    try:
+        try:
+            bbox, center, radius_m = geo.parse_area(request.args)
+            limit = max(1, min(int(request.args.get('limit', MAX_NEARBY_INCIDENTS)), MAX_NEARBY_INCIDENTS))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        where = ['l.max_lat >= ?', 'l.min_lat <= ?', 'l.max_lng >= ?', 'l.min_lng <= ?']
+        params = list(bbox)
+        for column in ('status', 'type'):
+            if request.args.get(column):
+                where.append(f'i.{column} = ?')
+                params.append(request.args[column])
+        
+        columns = ', '.join(f'i.{column.strip()}' for column in INCIDENT_SUMMARY_COLUMNS.split(','))
+        query = f'''
+            SELECT {columns}
+            FROM incident_locations l
+            JOIN incident_keys k ON k.id = l.id
+            JOIN incidents i ON i.id = k.incident_id
+            WHERE {' AND '.join(where)}
+        '''
+        if not center:
+            query += ' ORDER BY i.created_at DESC, i.id DESC LIMIT ?'
+            params.append(limit)
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
         incidents = rows_to_list(cursor.fetchall())
+        conn.close()
         
-        # Get related data for each incident
-        for incident in incidents:
-            # Get participants
-            cursor.execute('SELECT * FROM incident_participants WHERE incident_id = ?', (incident['id'],))
-            participants = rows_to_list(cursor.fetchall())
-            incident['victims'] = [p for p in participants if p['type'] == 'victim']
-            incident['witnesses'] = [p for p in participants if p['type'] == 'witness']
-            incident['suspects'] = [p for p in participants if p['type'] == 'suspect']
+        if center:
+            incidents = geo.filter_by_distance(incidents, center, radius_m)[:limit]
+        
+        return jsonify({'incidents': incidents, 'count': len(incidents)})
+    except Exception as e:
+        log.exception('error finding nearby incidents')
+        return jsonify({'error': str(e)}), 500
+
+def dispatch_origin(cursor, incident_id, args):
+    """(lat, lng) to rank from: lat/lng args, else the incident's location
+
+    Returns (point, error response); point is None when there is an error.
+    """
+    cursor.execute('SELECT latitude, longitude FROM incidents WHERE id = ?', (incident_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None, (jsonify({'error': 'Incident not found'}), 404)
+    point = geo.parse_point([args.get('lat'), args.get('lng')]) if args.get('lat') is not None else None
+    point = point or geo.parse_point([row[0], row[1]])
+    if point is None:
+        return None, (jsonify({'error': 'Incident has no location; pass lat and lng'}), 422)
+    return point, None
+
+@app.route('/api/incidents/<incident_id>/dispatch', methods=['GET'])
+def rank_dispatch(incident_id):
+    """On-duty / on-patrol responders ranked for an incident, best first
+    
+    score_m is the distance from the responder's last reported position
+    plus penalties for open assignments, role and not being on patrol
+    (see dispatch.py). Responders without a position are listed last.
+    """
+    try:
+        try:
+            limit = max(1, min(int(request.args.get('limit', dispatch.DEFAULT_DISPATCH_LIMIT)),
+                               dispatch.MAX_DISPATCH_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        point, error = dispatch_origin(cursor, incident_id, request.args)
+        if error:
+            conn.close()
+            return error
+        candidates = dispatch.load_candidates(cursor, incident_id)
+        conn.close()
+        
+        ranked = [c for c in dispatch.rank_responders(point, candidates) if not c['already_assigned']]
+        return jsonify({
+            'incident_id': incident_id,
+            'origin': {'lat': point[0], 'lng': point[1]},
+            'responders': ranked[:limit],
+            'count': min(len(ranked), limit),
+            'available': len(ranked)
+        })
+    except Exception as e:
+        log.exception('error ranking responders for %s', incident_id)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/incidents/<incident_id>/dispatch', methods=['POST'])
+def dispatch_responders(incident_id):
+    """Rank and assign in one transaction
+    
+    Body: {"count": n} takes the n best ranked responders, or
+    {"user_phones": [...]} picks specific ones (they must be on duty or
+    on patrol); "assigned_by" is recorded in the history. Writes pending
+    incident_assignments rows and notifies the assignees. The ranking is
+    read under the write lock, so two dispatchers cannot assign the same
+    free responder twice.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        phones = data.get('user_phones')
+        count = data.get('count', 1)
+        assigned_by = data.get('assigned_by')
+        if phones is not None and (not isinstance(phones, list) or not all(isinstance(p, str) for p in phones)):
+            return jsonify({'error': 'user_phones must be a list of phone numbers'}), 400
+        if phones is None and (not isinstance(count, int) or not 1 <= count <= dispatch.MAX_DISPATCH_LIMIT):
+            return jsonify({'error': f'count must be between 1 and {dispatch.MAX_DISPATCH_LIMIT}'}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        conn.execute('BEGIN IMMEDIATE')
+        
+        point, error = dispatch_origin(cursor, incident_id, data)
+        if error:
+            conn.rollback()
+            conn.close()
+            return error
+        ranked = [c for c in dispatch.rank_responders(point, dispatch.load_candidates(cursor, incident_id))
+                  if not c['already_assigned']]
+        
+        if phones is None:
+            chosen = ranked[:count]
+        else:
+            by_phone = {c['phone']: c for c in ranked}
+            missing = [phone for phone in phones if phone not in by_phone]
+            if missing:
+                conn.rollback()
+                conn.close()
+                return jsonify({'error': 'Not available for dispatch', 'user_phones': missing}), 409
+            chosen = [by_phone[phone] for phone in dict.fromkeys(phones)]
+        
+        if not chosen:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': 'No responders available'}), 409
+        
+        chosen_phones = [c['phone'] for c in chosen]
+        assignment_ids = dispatch.assign_responders(cursor, incident_id, chosen_phones, assigned_by)
+        notifications.notify_incident_assigned(cursor, incident_id, chosen_phones, assigned_by)
+        cursor.execute('SELECT version FROM incidents WHERE id = ?', (incident_id,))
+        version = cursor.fetchone()[0]
+        conn.commit()
+        conn.close()
+        
+        for responder, assignment_id in zip(chosen, assignment_ids):
+            responder['assignment_id'] = assignment_id
+        return jsonify({'success': True, 'version': version, 'assigned': chosen})
+    except Exception as e:
+        log.exception('error dispatching responders for %s', incident_id)
+        return jsonify({'error': str(e)}), 500
+
+def parse_if_match_version():
+    """Expected incident version from an If-Match: "<version>" header, or None"""
+    if_match = request.headers.get('If-Match', '').strip()
+    if not if_match or if_match == '*':
+        return None
+    try:
+        return int(if_match.removeprefix('W/').strip('"'))
+    except ValueError:
+        return None
+
+def incident_version_conflict(cursor, incident_id):
+    """404 if the incident is gone, otherwise 409 with its current version"""
+    cursor.execute('SELECT version FROM incidents WHERE id = ?', (incident_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return jsonify({'error': 'Incident not found'}), 404
+    response = jsonify({'error': 'Incident was changed by someone else', 'version': row[0]})
+    response.headers['ETag'] = f'"{row[0]}"'
+    return response, 409
+
+@app.route('/api/incidents/<incident_id>', methods=['PATCH'])
+def patch_incident(incident_id):
+    """Partial update: apply JSON Patch operations to the rows they touch
+    
+    Body: a list of operations, or {"patch": [...], "version": n, "user_phone": ...}.
+    Send the version being edited as If-Match: "<n>" (or "version") to get a
+    409 instead of silently overwriting someone else's change. Child rows
+    are addressed by row id, e.g.
+    
+        {"op": "replace", "path": "/status", "value": "started"}
+        {"op": "add", "path": "/notes/-", "value": {"note": "Area checked"}}
+        {"op": "remove", "path": "/assignedUsers/12"}
+        {"op": "replace", "path": "/victims/7/phone", "value": "+447700900123"}
+        {"op": "test", "path": "/status", "value": "pending"}
+    
+    The applied diff (with previous values) is recorded in incident_history.
+    """
+    try:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            operations = body.get('patch')
+            expected_version = body.get('version')
+            user_phone = body.get('user_phone')
+        else:
+            operations = body
+            expected_version = None
+            user_phone = None
+        user_phone = user_phone or request.args.get('user_phone')
+        if_match_version = parse_if_match_version()
+        if if_match_version is not None:
+            expected_version = if_match_version
+        
+        # The block rolls back and releases the connection on every error path
+        with get_db() as conn:
+            cursor = conn.cursor()
             
-            # Get assignments
-            cursor.execute('SELECT * FROM incident_assignments WHERE incident_id = ?', (incident['id'],))
-            incident['assignedUsers'] = rows_to_list(cursor.fetchall())
+            # Claim the version first: this takes the write lock and detects conflicts
+            where = 'id = ?'
+            params = [incident_id]
+            if expected_version is not None:
+                where += ' AND version = ?'
+                params.append(expected_version)
+            cursor.execute(f'''
+                UPDATE incidents
+                SET version = version + 1, updated_at = {SYNC_TIMESTAMP_SQL}
+                WHERE {where}
+            ''', params)
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return incident_version_conflict(cursor, incident_id)
             
-            # Get notes
-            cursor.execute('SELECT * FROM incident_notes WHERE incident_id = ? ORDER BY created_at', (incident['id'],))
-            incident['notes'] = rows_to_list(cursor.fetchall())
+            try:
+                diff = incident_patch.apply_incident_patch(cursor, incident_id, operations, user_phone)
+            except incident_patch.PatchError as e:
+                conn.rollback()
+                status = 409 if isinstance(e, incident_patch.PatchTestFailed) else 422
+                return jsonify({'error': str(e)}), status
             
-            # Get history
-            cursor.execute('SELECT * FROM incident_history WHERE incident_id = ? ORDER BY created_at', (incident['id'],))
-            incident['history'] = rows_to_list(cursor.fetchall())
+            cursor.execute('''
+                INSERT INTO incident_history (incident_id, user_phone, action, details)
+                VALUES (?, ?, 'updated', ?)
+            ''', (incident_id, user_phone, json.dumps(diff)))
             
-            # Get police info
-            cursor.execute('SELECT * FROM incident_police_info WHERE incident_id = ?', (incident['id'],))
-            police_info = row_to_dict(cursor.fetchone())
-            incident['policeInfo'] = police_info if police_info else {}
+            notifications.notify_incident_patch(cursor, incident_id, diff, user_phone)
             
-            # Get arrests
-            cursor.execute('SELECT * FROM incident_arrests WHERE incident_id = ?', (incident['id'],))
-            incident['arrests'] = rows_to_list(cursor.fetchall())
+            cursor.execute('SELECT version FROM incidents WHERE id = ?', (incident_id,))
+            version = cursor.fetchone()[0]
         
-        conn.close()
-        return jsonify(incidents)
+        response = jsonify({'success': True, 'version': version, 'diff': diff})
+        response.headers['ETag'] = f'"{version}"'
+        return response
     except Exception as e:
+        log.exception('error patching incident %s', incident_id)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/incidents/<incident_id>', methods=['PUT'])
 def update_incident(incident_id):
-    """Update incident with full data"""
+    """Update incident fields from a full incident document
+    
+    Only the incident's own columns are written. Notes, assignments and
+    participants live in their own tables; change them with PATCH.
+    """
     try:
         data = request.json
         conn = get_db()
@@ -353,34 +1121,46 @@ def update_incident(incident_id):
             update_fields.append('postcode = ?')
             params.append(data['postcode'])
         
-        # Always update timestamp
-        update_fields.append('updated_at = CURRENT_TIMESTAMP')
+        if 'location' in data:
+            point = geo.parse_point(data['location']) or (None, None)
+            update_fields.append('latitude = ?')
+            update_fields.append('longitude = ?')
+            params.extend(point)
+        
+        # Always update timestamp and version
+        update_fields.append(f'updated_at = {SYNC_TIMESTAMP_SQL}')
+        update_fields.append('version = version + 1')
+        
+        where = 'id = ?'
+        params.append(incident_id)
+        expected_version = parse_if_match_version()
+        if expected_version is not None:
+            where += ' AND version = ?'
+            params.append(expected_version)
+        
+        cursor.execute(f'''
+            UPDATE incidents 
+            SET {', '.join(update_fields)}
+            WHERE {where}
+        ''', params)
+        if cursor.rowcount == 0:
+            conn.rollback()
+            response = incident_version_conflict(cursor, incident_id)
+            conn.close()
+            return response
         
-        if update_fields:
-            params.append(incident_id)
-            cursor.execute(f'''
-                UPDATE incidents 
-                SET {', '.join(update_fields)}
-                WHERE id = ?
-            ''', params)
+        notifications.notify_incident_updated(cursor, incident_id, data.get('user_phone') or request.args.get('user_phone'),
+                                              data.get('status'))
         
-        # Store full incident data as JSON (for notes, assignments, etc.)
-        import json
-        if 'notes' in data or 'assignedUsers' in data or 'victims' in data or 'witnesses' in data or 'suspects' in data:
-            # For now, we'll store the full incident JSON in a metadata field
-            # You could create separate tables for notes, assignments, etc.
-            cursor.execute('''
-                UPDATE incidents 
-                SET metadata = ?
-                WHERE id = ?
-            ''', (json.dumps(data), incident_id))
+        cursor.execute('SELECT version FROM incidents WHERE id = ?', (incident_id,))
+        version = cursor.fetchone()[0]
         
         conn.commit()
         conn.close()
         
-        return jsonify({'success': True, 'message': 'Incident updated successfully'})
+        return jsonify({'success': True, 'version': version, 'message': 'Incident updated successfully'})
     except Exception as e:
-        print(f"Error updating incident: {e}")
+        log.exception('error updating incident %s', incident_id)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/incidents/<incident_id>/notes', methods=['POST'])
@@ -396,6 +1176,38 @@ def add_note(incident_id):
             VALUES (?, ?, ?, ?)
         ''', (incident_id, data['user_phone'], data['note'], data.get('isFollowUp', False)))
         
+        touch_incident(cursor, incident_id)
+        
+        conn.commit()
+        conn.close()
+        
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/incidents/<incident_id>', methods=['DELETE'])
+def delete_incident(incident_id):
+    """Delete incident and its child rows, leaving a tombstone for delta sync"""
+    try:
+        user_phone = request.args.get('user_phone')
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        for table in ('incident_participants', 'incident_assignments', 'incident_notes',
+                      'incident_history', 'incident_police_info', 'incident_arrests'):
+            cursor.execute(f'DELETE FROM {table} WHERE incident_id = ?', (incident_id,))
+        cursor.execute('DELETE FROM incidents WHERE id = ?', (incident_id,))
+        
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': 'Incident not found'}), 404
+        
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO incident_tombstones (incident_id, deleted_by, deleted_at)
+            VALUES (?, ?, {SYNC_TIMESTAMP_SQL})
+        ''', (incident_id, user_phone))
+        
         conn.commit()
         conn.close()
         
@@ -403,6 +1215,78 @@ def add_note(incident_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ========== NOTIFICATION ENDPOINTS ==========
+
+@app.route('/api/notifications', methods=['GET'])
+def get_notifications():
+    """A user's notifications after a cursor, oldest first
+    
+    Query params:
+      user_phone   - required
+      since        - cursor: only notifications with a higher id (default 0)
+      limit        - page size
+      include_read - also return notifications already marked read
+    
+    Poll with since=<cursor from the last response>: the page and the
+    unread count are index range scans over new / unread rows only.
+    """
+    try:
+        user_phone = request.args.get('user_phone')
+        if not user_phone:
+            return jsonify({'error': 'user_phone is required'}), 400
+        try:
+            since_id = int(request.args.get('since', 0))
+            limit = int(request.args.get('limit', notifications.DEFAULT_NOTIFICATION_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'since and limit must be integers'}), 400
+        limit = max(1, min(limit, notifications.MAX_NOTIFICATION_PAGE_SIZE))
+        unread_only = request.args.get('include_read', '').lower() not in ('1', 'true')
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        items = rows_to_list(notifications.fetch_notifications(cursor, user_phone, since_id, limit, unread_only))
+        has_more = len(items) > limit
+        if has_more:
+            items = items[:limit]
+        unread = notifications.unread_count(cursor, user_phone)
+        conn.close()
+        
+        return jsonify({
+            'notifications': items,
+            'count': len(items),
+            'unread_count': unread,
+            'cursor': items[-1]['id'] if items else since_id,
+            'has_more': has_more
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/notifications/read', methods=['POST'])
+def mark_notifications_read():
+    """Mark notifications read in bulk: {"user_phone", "ids": [...]} or {"user_phone", "up_to": id}"""
+    try:
+        data = request.json or {}
+        user_phone = data.get('user_phone')
+        ids = data.get('ids')
+        up_to = data.get('up_to')
+        if not user_phone:
+            return jsonify({'success': False, 'error': 'user_phone is required'}), 400
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return jsonify({'success': False, 'error': 'ids must be a list of integers'}), 400
+        if ids is None and not isinstance(up_to, int):
+            return jsonify({'success': False, 'error': 'ids or up_to is required'}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        updated = notifications.mark_read(cursor, user_phone, ids=ids, up_to=up_to)
+        unread = notifications.unread_count(cursor, user_phone)
+        conn.commit()
+        conn.close()
+        
+        return jsonify({'success': True, 'updated': updated, 'unread_count': unread})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ========== CONTACT ENDPOINTS ==========
 
 @app.route('/api/contacts', methods=['POST'])
@@ -477,7 +1361,13 @@ def health_check():
             'deployed': '2024-12-19',
             'database': 'connected',
             'users': user_count,
-            'ptt_messages': ptt_count
+            'ptt_messages': ptt_count,
+            'db_pool': pool_stats,
+            'ptt_audio_cache': audio_store.audio_cache.stats(),
+            'ptt_retention': retention.stats,
+            'sms_queue': dict(sms_outbox.stats, transport=sms_outbox.transport.name),
+            'presence': presence_tracker.stats(),
+            'list_cache': list_cache.stats()
         })
     except Exception as e:
         return jsonify({
@@ -485,6 +1375,34 @@ def health_check():
             'error': str(e)
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics summed across all gunicorn workers"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def subsystem_metrics():
+    """Counters from background subsystems, exported alongside request metrics"""
+    cache = audio_store.audio_cache.stats()
+    lists = list_cache.stats()
+    return [
+        ('shomrim_ptt_audio_cache_hits_total', 'PTT audio LRU hits', cache['hits']),
+        ('shomrim_ptt_audio_cache_misses_total', 'PTT audio LRU misses', cache['misses']),
+        ('shomrim_ptt_audio_cache_evictions_total', 'PTT audio LRU evictions', cache['evictions']),
+        ('shomrim_ptt_retention_runs_total', 'PTT retention sweeps', retention.stats['runs']),
+        ('shomrim_ptt_retention_deleted_messages_total', 'PTT clips deleted by retention', retention.stats['deleted_messages']),
+        ('shomrim_ptt_retention_deleted_bytes_total', 'PTT audio bytes deleted by retention', retention.stats['deleted_bytes']),
+        ('shomrim_ptt_retention_seconds_total', 'Time spent in PTT retention sweeps', retention.stats['total_run_seconds']),
+        ('shomrim_ptt_wait_refused_total', 'PTT long-polls turned away at the waiter cap', ptt_notifier.refused),
+        ('shomrim_sms_sent_total', 'SMS messages delivered', sms_outbox.stats['sent']),
+        ('shomrim_sms_retried_total', 'SMS delivery retries', sms_outbox.stats['retried']),
+        ('shomrim_sms_failed_total', 'SMS messages given up on', sms_outbox.stats['failed']),
+        ('shomrim_list_cache_hits_total', 'Roster / reference list cache hits', lists['hits']),
+        ('shomrim_list_cache_misses_total', 'Roster / reference list cache rebuilds', lists['misses']),
+        ('shomrim_list_cache_not_modified_total', 'Roster / reference list 304 responses', lists['not_modified']),
+    ]
+
+metrics.metrics.register_collector(subsystem_metrics)
+
 # Duty/Patrol Status Endpoints
 @app.route('/api/users/<phone>/duty-status', methods=['PUT'])
 def update_duty_status(phone):
@@ -505,6 +1423,8 @@ def update_duty_status(phone):
         conn.commit()
         conn.close()
         
+        presence_tracker.refresh_profile(phone)
+        
         return jsonify({'success': True, 'on_duty': on_duty})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -515,6 +1435,7 @@ def update_patrol_status(phone):
     try:
         data = request.json
         on_patrol = data.get('on_patrol', False)
+        point = geo.parse_point(data.get('location'))
         
         conn = get_db()
         cursor = conn.cursor()
@@ -525,50 +1446,117 @@ def update_patrol_status(phone):
             WHERE phone = ?
         ''', (on_patrol, phone))
         
+        # Going on patrol may report where from
+        if point:
+            cursor.execute(f'''
+                UPDATE users
+                SET last_latitude = ?, last_longitude = ?, position_updated_at = {SYNC_TIMESTAMP_SQL}
+                WHERE phone = ?
+            ''', (point[0], point[1], phone))
+        
         conn.commit()
         conn.close()
         
+        presence_tracker.refresh_profile(phone)
+        
         return jsonify({'success': True, 'on_patrol': on_patrol})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/users/on-duty', methods=['GET'])
-def get_on_duty_users():
-    """Get all users currently on duty"""
+@app.route('/api/users/<phone>/position', methods=['PUT'])
+def update_position(phone):
+    """Record a user's last known position ({"location": {"lat", "lng"}})"""
     try:
+        data = request.json
+        point = geo.parse_point(data.get('location', data))
+        if point is None:
+            return jsonify({'success': False, 'error': 'Valid lat and lng are required'}), 400
+        
         conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM users 
-            WHERE on_duty = 1
-            ORDER BY name
-        ''')
+        cursor.execute(f'''
+            UPDATE users
+            SET last_latitude = ?, last_longitude = ?, position_updated_at = {SYNC_TIMESTAMP_SQL}
+            WHERE phone = ?
+        ''', (point[0], point[1], phone))
+        found = cursor.rowcount > 0
         
-        users = rows_to_list(cursor.fetchall())
+        conn.commit()
         conn.close()
         
-        return jsonify(users)
+        if not found:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+        return jsonify({'success': True, 'lat': point[0], 'lng': point[1]})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/users/on-patrol', methods=['GET'])
-def get_on_patrol_users():
-    """Get all users currently on patrol"""
+@app.route('/api/users/nearby', methods=['GET'])
+def get_nearby_patrols():
+    """On-patrol users inside a bbox or within radius meters of lat/lng
+    
+    Answered from the patrol_positions R*Tree; radius results are exact
+    (haversine) and nearest first.
+    """
     try:
+        try:
+            bbox, center, radius_m = geo.parse_area(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         conn = get_db()
         cursor = conn.cursor()
-        
         cursor.execute('''
-            SELECT * FROM users 
-            WHERE on_patrol = 1
-            ORDER BY name
-        ''')
-        
+            SELECT u.phone, u.name, u.callsign, u.role, u.on_duty, u.on_patrol,
+                u.last_latitude AS latitude, u.last_longitude AS longitude, u.position_updated_at
+            FROM patrol_positions p
+            JOIN users u ON u.id = p.id
+            WHERE p.max_lat >= ? AND p.min_lat <= ? AND p.max_lng >= ? AND p.min_lng <= ?
+              AND u.on_patrol = 1
+        ''', bbox)
         users = rows_to_list(cursor.fetchall())
         conn.close()
         
-        return jsonify(users)
+        if center:
+            users = geo.filter_by_distance(users, center, radius_m)
+        
+        return jsonify({'users': users, 'count': len(users)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Roster lists leave out the position columns: they change every few
+# seconds on patrol and would defeat the cache (see /api/users/nearby)
+USER_LIST_COLUMNS = f'id, {CACHED_USER_COLUMNS}, created_at'
+
+@app.route('/api/users/on-duty', methods=['GET'])
+def get_on_duty_users():
+    """Get all users currently on duty"""
+    try:
+        def load(cursor):
+            cursor.execute(f'''
+                SELECT {USER_LIST_COLUMNS} FROM users 
+                WHERE on_duty = 1
+                ORDER BY name
+            ''')
+            return rows_to_list(cursor.fetchall())
+        
+        return list_cache.respond('users', 'on-duty', load)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/on-patrol', methods=['GET'])
+def get_on_patrol_users():
+    """Get all users currently on patrol"""
+    try:
+        def load(cursor):
+            cursor.execute(f'''
+                SELECT {USER_LIST_COLUMNS} FROM users 
+                WHERE on_patrol = 1
+                ORDER BY name
+            ''')
+            return rows_to_list(cursor.fetchall())
+        
+        return list_cache.respond('users', 'on-patrol', load)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -576,19 +1564,15 @@ def get_on_patrol_users():
 def get_users_by_role(role):
     """Get all users with a specific role"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM users 
-            WHERE role = ?
-            ORDER BY name
-        ''', (role,))
-        
-        users = rows_to_list(cursor.fetchall())
-        conn.close()
+        def load(cursor):
+            cursor.execute(f'''
+                SELECT {USER_LIST_COLUMNS} FROM users 
+                WHERE role = ?
+                ORDER BY name
+            ''', (role,))
+            return rows_to_list(cursor.fetchall())
         
-        return jsonify(users)
+        return list_cache.respond('users', f'role:{role}', load)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -597,14 +1581,11 @@ def get_users_by_role(role):
 def get_suspects():
     """Get all suspects"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
+        def load(cursor):
+            cursor.execute('SELECT * FROM suspects ORDER BY created_at DESC')
+            return rows_to_list(cursor.fetchall())
         
-        cursor.execute('SELECT * FROM suspects ORDER BY created_at DESC')
-        suspects = rows_to_list(cursor.fetchall())
-        conn.close()
-        
-        return jsonify(suspects)
+        return list_cache.respond('suspects', 'all', load)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -706,14 +1687,11 @@ def delete_suspect(suspect_id):
 def get_vehicles():
     """Get all vehicles"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
+        def load(cursor):
+            cursor.execute('SELECT * FROM vehicles ORDER BY created_at DESC')
+            return rows_to_list(cursor.fetchall())
         
-        cursor.execute('SELECT * FROM vehicles ORDER BY created_at DESC')
-        vehicles = rows_to_list(cursor.fetchall())
-        conn.close()
-        
-        return jsonify(vehicles)
+        return list_cache.respond('vehicles', 'all', load)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -823,46 +1801,42 @@ def ptt_broadcast():
         user_phone = request.form.get('user_phone')
         user_name = request.form.get('user_name')
         
-        print(f"\n{'='*50}")
-        print(f"PTT BROADCAST RECEIVED")
-        print(f"  User: {user_name} ({user_phone})")
-        print(f"  Channel: {channel}")
+        log.debug('ptt broadcast received user=%s (%s) channel=%s', user_name, user_phone, channel)
         
         if not audio_file:
-            print("  ERROR: No audio file!")
+            log.warning('ptt broadcast without audio file user=%s', user_phone)
             return jsonify({'error': 'No audio file provided'}), 400
         
         # Read audio data
         audio_data = audio_file.read()
         content_type = audio_file.content_type or 'audio/webm'
-        print(f"  Audio size: {len(audio_data)} bytes")
         
-        # Store in database
+        # Store audio on disk by content hash, metadata in database
+        audio_hash = audio_store.store_audio(audio_data)
+        
         conn = get_db()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO ptt_messages (user_phone, user_name, channel, audio_data, content_type)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_phone, user_name, channel, audio_data, content_type))
+            INSERT INTO ptt_messages (user_phone, user_name, channel, audio_data, audio_hash, audio_size, content_type)
+            VALUES (?, ?, ?, X'', ?, ?, ?)
+        ''', (user_phone, user_name, channel, audio_hash, len(audio_data), content_type))
         
         message_id = cursor.lastrowid
-        print(f"  Saved with ID: {message_id}")
-        
-        # Clean up old messages (keep last 50)
-        cursor.execute('''
-            DELETE FROM ptt_messages 
-            WHERE id NOT IN (
-                SELECT id FROM ptt_messages 
-                ORDER BY created_at DESC 
-                LIMIT 50
-            )
-        ''')
         
+        # Old clips are trimmed by the background retention sweeper (retention.py)
         conn.commit()
         conn.close()
         
-        print(f"  SUCCESS!")
-        print(f"{'='*50}\n")
+        # Retention may have unlinked an identical clip before our row existed
+        audio_store.store_audio(audio_data)
+        
+        # Warm the cache: every listener on the channel fetches this clip next
+        audio_store.audio_cache.put(message_id, audio_data, audio_hash, content_type)
+        
+        # Wake long-poll listeners in this worker
+        ptt_notifier.publish(channel, message_id)
+        
+        log.debug('ptt broadcast saved id=%s channel=%s bytes=%s', message_id, channel, len(audio_data))
         
         return jsonify({
             'success': True,
@@ -872,59 +1846,66 @@ def ptt_broadcast():
         })
         
     except Exception as e:
-        import traceback
-        print(f"  BROADCAST ERROR: {e}")
-        traceback.print_exc()
+        log.exception('ptt broadcast failed')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/users/online', methods=['GET'])
 def get_online_users():
-    """Get list of online users for PTT"""
+    """Get users in a PTT channel who are online right now
+    
+    Answered from the in-memory presence table (fed by heartbeats and PTT
+    polling), so users who closed the app drop off after PRESENCE_TTL_SECONDS.
+    """
     try:
         channel = request.args.get('channel', 'all')
-        print(f"\n📻 Getting users for channel: {channel}")
-        
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Get users based on channel filter
-        if channel == 'dispatchers':
-            cursor.execute("SELECT name, phone, callsign, role FROM users WHERE role = 'Dispatcher'")
-        elif channel == 'coordinators':
-            cursor.execute("SELECT name, phone, callsign, role FROM users WHERE role = 'Coordinator'")
-        elif channel == 'on-duty':
-            cursor.execute("SELECT name, phone, callsign, role FROM users WHERE on_duty = 1")
-        elif channel == 'on-patrol':
-            cursor.execute("SELECT name, phone, callsign, role FROM users WHERE on_patrol = 1")
-        else:
-            # Get all users
-            cursor.execute("SELECT name, phone, callsign, role FROM users")
-        
-        users = cursor.fetchall()
-        conn.close()
         
         result = []
-        for user in users:
-            user_data = {
-                'name': user[0] if user[0] else 'Unknown',
-                'phone': user[1] if user[1] else '',
-                'callsign': user[2] if user[2] else (user[1][-4:] if user[1] else 'N/A'),
-                'status': user[3] if user[3] else 'Member'
-            }
-            result.append(user_data)
+        for user in presence_tracker.online(channel):
+            result.append({
+                'name': user['name'] or 'Unknown',
+                'phone': user['phone'] or '',
+                'callsign': user['callsign'] or (user['phone'][-4:] if user['phone'] else 'N/A'),
+                'status': user['role'] or 'Member',
+                'last_seen': user['last_seen']
+            })
         
-        print(f"📻 Found {len(result)} users")
-        for u in result:
-            print(f"   - {u['name']} ({u['callsign']})")
+        log.debug('online users channel=%s count=%s', channel, len(result))
         
         return jsonify(result)
         
     except Exception as e:
-        import traceback
-        print(f"❌ Error in get_online_users: {e}")
-        traceback.print_exc()
+        log.exception('error in get_online_users')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/presence/heartbeat', methods=['POST'])
+def presence_heartbeat():
+    """Mark the user online for the next PRESENCE_TTL_SECONDS"""
+    try:
+        data = request.get_json(silent=True) or {}
+        phone = data.get('phone') or data.get('user_phone')
+        if not phone:
+            return jsonify({'success': False, 'error': 'phone is required'}), 400
+        
+        expires_at = presence_tracker.heartbeat(phone)
+        if expires_at is None:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+        
+        return jsonify({'success': True, 'expires_at': expires_at, 'ttl': presence_tracker.ttl})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/presence/offline', methods=['POST'])
+def presence_offline():
+    """Mark the user offline immediately (logout / app closed)"""
+    try:
+        data = request.get_json(silent=True, force=True) or {}
+        phone = data.get('phone') or data.get('user_phone')
+        if phone:
+            presence_tracker.offline(phone)
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/ptt/latest-id', methods=['GET'])
 def get_latest_ptt_id():
     """Get the latest PTT message ID so new users don't hear old messages"""
@@ -940,6 +1921,130 @@ def get_latest_ptt_id():
     except Exception as e:
         return jsonify({'latest_id': 0})
 
+class PTTNotifier:
+    """Wakes long-poll waiters when a PTT clip is inserted
+    
+    Broadcasts in this worker wake waiters immediately. Clips inserted by
+    other gunicorn workers are picked up by one shared MAX(id) recheck per
+    PTT_WAIT_RECHECK seconds, not one query per waiter. The recheck resumes
+    from the last id it read itself: local publishes must not advance it, or
+    a lower-id clip committed by another worker on a different channel would
+    be skipped.
+    
+    At most max_waiters requests are held per worker; past that, acquire()
+    refuses and the caller answers at once so the client short-polls instead
+    of tying up a thread every other route needs.
+    """
+    
+    def __init__(self, max_waiters=None):
+        self.condition = threading.Condition()
+        self.latest_by_channel = {}
+        self.last_sync = 0.0
+        self.db_high_water = 0
+        self.max_waiters = PTT_MAX_WAITERS if max_waiters is None else max_waiters
+        self.waiters = 0
+        self.refused = 0
+    
+    def acquire(self):
+        """Claim a long-poll slot; False when this worker is at capacity"""
+        with self.condition:
+            if self.waiters >= self.max_waiters:
+                self.refused += 1
+                return False
+            self.waiters += 1
+            return True
+    
+    def release(self):
+        with self.condition:
+            self.waiters -= 1
+    
+    def publish(self, channel, message_id):
+        with self.condition:
+            if message_id > self.latest_by_channel.get(channel, 0):
+                self.latest_by_channel[channel] = message_id
+            self.condition.notify_all()
+    
+    def latest_for(self, channel):
+        """Highest known clip id that listeners on this channel hear"""
+        with self.condition:
+            return self._latest_for(channel)
+    
+    def wait(self, channel, since_id, timeout):
+        """Block until a clip newer than since_id is known for the channel"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self._latest_for(channel) > since_id, timeout)
+    
+    def _latest_for(self, channel):
+        if channel == 'all':
+            return max(self.latest_by_channel.values(), default=0)
+        return max(self.latest_by_channel.get(channel, 0), self.latest_by_channel.get('all', 0))
+    
+    def sync_from_db(self):
+        """Pick up clips broadcast through other workers (rate limited)"""
+        with self.condition:
+            now = time.monotonic()
+            if now - self.last_sync < PTT_WAIT_RECHECK:
+                return
+            self.last_sync = now
+            high_water = self.db_high_water
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT channel, MAX(id) FROM ptt_messages
+            WHERE id > ?
+            GROUP BY channel
+        ''', (high_water,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        with self.condition:
+            self.db_high_water = max([self.db_high_water] + [message_id for _, message_id in rows])
+        for channel, message_id in rows:
+            self.publish(channel, message_id)
+
+PTT_WAIT_MAX_TIMEOUT = 30  # seconds a long-poll may be held open
+PTT_WAIT_RECHECK = float(os.environ.get('PTT_WAIT_RECHECK', 1.0))  # cross-worker DB recheck
+# Long-polls held per worker. A gthread worker has --threads 64, so the default
+# leaves 16 threads for other routes; a gevent worker only spends greenlets.
+PTT_MAX_WAITERS = int(os.environ.get('PTT_MAX_WAITERS', 0)) or (900 if is_cooperative() else 48)
+PTT_SHORT_POLL_INTERVAL = 3  # seconds clients wait between polls when turned away
+
+ptt_notifier = PTTNotifier()
+
+def fetch_ptt_messages(user_phone, channel, since_id):
+    """PTT message headers newer than since_id for a channel, excluding the user's own"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    # If channel is 'all', get ALL messages regardless of their channel
+    if channel == 'all':
+        cursor.execute('''
+            SELECT id, user_name, channel, created_at
+            FROM ptt_messages
+            WHERE id > ? AND user_phone != ?
+            ORDER BY id
+        ''', (since_id, user_phone))
+    else:
+        cursor.execute('''
+            SELECT id, user_name, channel, created_at
+            FROM ptt_messages
+            WHERE id > ? AND user_phone != ? AND (channel = ? OR channel = 'all')
+            ORDER BY id
+        ''', (since_id, user_phone, channel))
+    
+    new_messages = []
+    for row in cursor.fetchall():
+        new_messages.append({
+            'id': row[0],
+            'user_name': row[1],
+            'channel': row[2],
+            'timestamp': row[3]
+        })
+    
+    conn.close()
+    return new_messages
+
 @app.route('/api/ptt/messages', methods=['GET'])
 def get_ptt_messages():
     """Get new PTT messages for the user"""
@@ -948,42 +2053,13 @@ def get_ptt_messages():
         channel = request.args.get('channel', 'all')
         since_id = int(request.args.get('since_id', 0))
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        print(f"\n{'='*50}")
-        print(f"PTT QUERY - User: {user_phone}, Channel: {channel}, Since: {since_id}")
+        if user_phone:
+            presence_tracker.heartbeat(user_phone)
         
         # Query messages newer than since_id, excluding user's own messages
-        # If channel is 'all', get ALL messages regardless of their channel
-        if channel == 'all':
-            cursor.execute('''
-                SELECT id, user_name, channel, created_at
-                FROM ptt_messages
-                WHERE id > ? AND user_phone != ?
-                ORDER BY id
-            ''', (since_id, user_phone))
-        else:
-            cursor.execute('''
-                SELECT id, user_name, channel, created_at
-                FROM ptt_messages
-                WHERE id > ? AND user_phone != ? AND (channel = ? OR channel = 'all')
-                ORDER BY id
-            ''', (since_id, user_phone, channel))
-        
-        new_messages = []
-        for row in cursor.fetchall():
-            new_messages.append({
-                'id': row[0],
-                'user_name': row[1],
-                'channel': row[2],
-                'timestamp': row[3]
-            })
-        
-        conn.close()
+        new_messages = fetch_ptt_messages(user_phone, channel, since_id)
         
-        print(f"PTT RESULT - Found {len(new_messages)} messages")
-        print(f"{'='*50}\n")
+        log.debug('ptt query user=%s channel=%s since=%s found=%s', user_phone, channel, since_id, len(new_messages))
         
         return jsonify({
             'messages': new_messages,
@@ -993,43 +2069,137 @@ def get_ptt_messages():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/ptt/audio/<int:message_id>', methods=['GET'])
-def get_ptt_audio(message_id):
-    """Get audio data for a specific PTT message"""
+@app.route('/api/ptt/wait', methods=['GET'])
+def wait_ptt_messages():
+    """Long-poll for new PTT messages
+    
+    Returns as soon as a message newer than since_id exists for the channel,
+    or an empty list after `timeout` seconds. Reconnect with the highest id
+    received as since_id to resume without gaps. When the worker already
+    holds PTT_MAX_WAITERS long-polls, answers at once with `retry_after`
+    and the client falls back to short polling /api/ptt/messages.
+    """
     try:
-        conn = get_db()
-        cursor = conn.cursor()
+        user_phone = request.args.get('user_phone')
+        channel = request.args.get('channel', 'all')
+        since_id = int(request.args.get('since_id', 0))
+        timeout = min(float(request.args.get('timeout', 25)), PTT_WAIT_MAX_TIMEOUT)
+        deadline = time.monotonic() + timeout
         
-        # Query the message
-        cursor.execute('''
-            SELECT audio_data, content_type
-            FROM ptt_messages
-            WHERE id = ?
-        ''', (message_id,))
+        if user_phone:
+            presence_tracker.heartbeat(user_phone)
         
-        row = cursor.fetchone()
-        conn.close()
+        # Clips up to wait_from are known not to be for this user (own or other channel)
+        wait_from = max(since_id, ptt_notifier.latest_for(channel))
+        new_messages = fetch_ptt_messages(user_phone, channel, since_id)
         
-        if not row:
-            return jsonify({'error': 'Message not found'}), 404
+        if not new_messages and not ptt_notifier.acquire():
+            log.debug('ptt long-poll refused user=%s: %s waiters held', user_phone, ptt_notifier.max_waiters)
+            return jsonify({
+                'messages': [],
+                'count': 0,
+                'retry_after': PTT_SHORT_POLL_INTERVAL
+            })
         
-        audio_data = row[0]
-        content_type = row[1]
+        if not new_messages:
+            try:
+                while not new_messages:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    # No DB connection is held while waiting
+                    if not ptt_notifier.wait(channel, wait_from, min(remaining, PTT_WAIT_RECHECK)):
+                        ptt_notifier.sync_from_db()
+                        if ptt_notifier.latest_for(channel) <= wait_from:
+                            continue
+                    horizon = ptt_notifier.latest_for(channel)
+                    new_messages = fetch_ptt_messages(user_phone, channel, since_id)
+                    wait_from = max(wait_from, horizon)
+            finally:
+                ptt_notifier.release()
         
-        # Return audio data
-        from flask import Response
-        return Response(
+        return jsonify({
+            'messages': new_messages,
+            'count': len(new_messages)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# A message id always maps to the same clip, so clients may cache forever
+PTT_AUDIO_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+@app.route('/api/ptt/audio/<int:message_id>', methods=['GET'])
+def get_ptt_audio(message_id):
+    """Get audio for a specific PTT message
+    
+    Recent clips come from the in-process LRU without touching the database.
+    Responses carry the content hash as ETag and support Range requests.
+    """
+    try:
+        cached = audio_store.audio_cache.get(message_id)
+        
+        if cached is None:
+            conn = get_db()
+            cursor = conn.cursor()
+            
+            # Query the message metadata only
+            cursor.execute('''
+                SELECT audio_hash, content_type, audio_size
+                FROM ptt_messages
+                WHERE id = ?
+            ''', (message_id,))
+            
+            row = cursor.fetchone()
+            conn.close()
+            
+            if not row or not row[0]:
+                return jsonify({'error': 'Message not found'}), 404
+            
+            path = audio_store.audio_path(row[0])
+            if not os.path.exists(path):
+                return jsonify({'error': 'Audio not found'}), 404
+            
+            # Clips too large for the LRU are streamed straight from disk
+            if (row[2] or 0) > audio_store.audio_cache.max_item_bytes:
+                response = send_file(
+                    path,
+                    mimetype=row[1],
+                    conditional=True,
+                    etag=row[0],
+                    download_name=f'ptt_{message_id}.webm'
+                )
+                response.headers['Cache-Control'] = PTT_AUDIO_CACHE_CONTROL
+                return response
+            
+            cached = (audio_store.read_audio(row[0]), row[0], row[1])
+            audio_store.audio_cache.put(message_id, *cached)
+        
+        audio_data, audio_hash, content_type = cached
+        response = Response(
             audio_data,
             mimetype=content_type,
             headers={
                 'Content-Disposition': f'inline; filename=ptt_{message_id}.webm',
-                'Cache-Control': 'no-cache'
+                'Cache-Control': PTT_AUDIO_CACHE_CONTROL
             }
         )
+        response.set_etag(audio_hash)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(audio_data))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ptt/retention', methods=['GET'])
+def get_ptt_retention_stats():
+    """Policies and cost counters for the background PTT retention sweeper"""
+    return jsonify({'policies': retention.policies, 'stats': retention.stats})
+
+@app.route('/api/ptt/audio-cache', methods=['GET'])
+def get_ptt_audio_cache_stats():
+    """Hit/miss counters for the in-process PTT audio cache"""
+    return jsonify(audio_store.audio_cache.stats())
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("Shomrim OTP Server Starting...")
@@ -0,0 +1,145 @@
+import os
+import queue
+import random
+import threading
+import time
+
+from applog import get_logger
+
+log = get_logger('sms')
+
+# Outbound SMS worker pool and retry policy
+SMS_WORKERS = int(os.environ.get('SMS_WORKERS', 2))
+SMS_MAX_ATTEMPTS = int(os.environ.get('SMS_MAX_ATTEMPTS', 4))
+SMS_BACKOFF_BASE = float(os.environ.get('SMS_BACKOFF_BASE', 1.0))  # seconds, doubled per retry
+SMS_BACKOFF_MAX = float(os.environ.get('SMS_BACKOFF_MAX', 30.0))
+
+class TwilioTransport:
+    """Sends through Twilio, reusing one REST client per process"""
+
+    name = 'twilio'
+
+    def __init__(self, account_sid, auth_token, from_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.client = None
+
+    def send(self, to, body):
+        if self.client is None:
+            from twilio.rest import Client
+            self.client = Client(self.account_sid, self.auth_token)
+        message = self.client.messages.create(body=body, from_=self.from_number, to=to)
+        return message.sid
+
+class ConsoleTransport:
+    """Development transport: logs messages instead of sending them"""
+
+    name = 'console'
+
+    def send(self, to, body):
+        log.warning('DEVELOPMENT MODE - SMS to %s: %s', to, body)
+        return None
+
+class FakeTransport:
+    """Test transport: records messages and can be told to fail"""
+
+    name = 'fake'
+
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self.lock = threading.Lock()
+
+    def send(self, to, body):
+        with self.lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError('fake transport failure')
+            self.sent.append({'to': to, 'body': body})
+            return f'fake-{len(self.sent)}'
+
+class SMSQueue:
+    """Outbound message queue drained by a small pool of worker threads
+
+    enqueue() returns immediately; workers deliver with exponential backoff
+    and jitter, giving up after SMS_MAX_ATTEMPTS. Used for OTPs and incident
+    alerts alike (the kind is only used for stats).
+    """
+
+    def __init__(self, transport, workers=SMS_WORKERS):
+        self.transport = transport
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.threads = []
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stats = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    def start(self):
+        """Start worker threads once per process (gunicorn forks after import)"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.threads = [
+                threading.Thread(target=self._worker, name=f'sms-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self.threads:
+                thread.start()
+            self.pid = os.getpid()
+
+    def enqueue(self, to, body, kind='otp'):
+        self.start()
+        self.stats['queued'] += 1
+        self.queue.put({'to': to, 'body': body, 'kind': kind, 'attempt': 1})
+
+    def backoff(self, attempt):
+        delay = min(SMS_BACKOFF_BASE * (2 ** (attempt - 1)), SMS_BACKOFF_MAX)
+        return delay * random.uniform(0.5, 1.0)
+
+    def deliver(self, message):
+        """Try one message until it is sent or out of attempts"""
+        while True:
+            try:
+                self.transport.send(message['to'], message['body'])
+                self.stats['sent'] += 1
+                return True
+            except Exception as e:
+                if message['attempt'] >= SMS_MAX_ATTEMPTS:
+                    self.stats['failed'] += 1
+                    log.error('sms %s to %s failed after %s attempts: %s',
+                              message['kind'], message['to'], message['attempt'], e)
+                    return False
+                self.stats['retried'] += 1
+                log.info('sms %s to %s attempt %s failed, retrying: %s',
+                         message['kind'], message['to'], message['attempt'], e)
+                time.sleep(self.backoff(message['attempt']))
+                message['attempt'] += 1
+
+    def _worker(self):
+        while True:
+            message = self.queue.get()
+            try:
+                self.deliver(message)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Block until every queued message is sent or has failed"""
+        self.queue.join()
+
+def create_transport(account_sid, auth_token, from_number):
+    """Twilio when credentials are configured, console otherwise (override with SMS_TRANSPORT)"""
+    name = os.environ.get('SMS_TRANSPORT')
+    if name is None:
+        name = 'console' if account_sid.startswith('YOUR_') else 'twilio'
+    if name == 'twilio':
+        return TwilioTransport(account_sid, auth_token, from_number)
+    if name == 'console':
+        return ConsoleTransport()
+    if name == 'fake':
+        return FakeTransport()
+    raise ValueError(f'Unknown SMS transport: {name}')
@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from flask import Response
+
+import compression
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Served under a content-hash name (js/app.3f2a9c1b7d4e.js) with an immutable cache
+FINGERPRINTED_ASSETS = ('css/app.css', 'js/app.js')
+
+# Entry points: stable URLs, revalidated on every load (cheap 304s)
+ENTRY_ASSETS = ('index.html', 'sw.js')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# How often (seconds) source files are checked for edits, so a running dev server picks them up
+STATIC_RECHECK_INTERVAL = float(os.environ.get('STATIC_RECHECK_INTERVAL', 2))
+
+FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[a-z]+)$')
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def fingerprinted_path(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{digest}{ext}'
+
+class Asset:
+    """One file's bytes in every encoding we serve, plus its caching headers"""
+
+    def __init__(self, path, data, cache_control):
+        self.path = path
+        self.digest = fingerprint(data)
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+        self.cache_control = cache_control
+        self.variants = {'identity': data, 'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(data, quality=11)
+
+    def response(self, request, cache_control=None):
+        encoding = compression.choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding not in self.variants:
+            encoding = 'identity'
+        # Each encoding is its own representation, so it gets its own strong ETag
+        etag = f'"{self.digest}-{encoding}"'
+        headers = {
+            'Cache-Control': cache_control or self.cache_control,
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if f'"{self.digest}-' in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self.variants[encoding], content_type=self.content_type, headers=headers)
+
+class AssetBundle:
+    """Fingerprinted, precompressed copies of the app shell, built in memory
+
+    Built when each worker imports the app (server.py) and rebuilt when a
+    source file changes. index.html and sw.js are rewritten to reference the
+    fingerprinted URLs, and sw.js gets a CACHE_NAME derived from the
+    content, so deploying new code invalidates the PWA cache by itself.
+    """
+
+    def __init__(self, root=STATIC_ROOT):
+        self.root = root
+        self.lock = threading.Lock()
+        self.assets = {}      # url path -> Asset
+        self.fingerprints = {}  # source path -> fingerprinted path
+        self.mtimes = None
+        self.checked_at = 0.0
+        self.built_at = None
+
+    def source_mtimes(self):
+        mtimes = {}
+        for path in FINGERPRINTED_ASSETS + ENTRY_ASSETS:
+            try:
+                mtimes[path] = os.stat(os.path.join(self.root, path)).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def read(self, path):
+        with open(os.path.join(self.root, path), 'rb') as f:
+            return f.read()
+
+    def rewrite_references(self, text, prefix=''):
+        """Point references to fingerprinted sources (with or without ?v=) at their hashed names"""
+        for source, target in self.fingerprints.items():
+            text = re.sub(rf'(["\']){re.escape(prefix + source)}(\?v=[^"\']*)?(["\'])',
+                          rf'\g<1>{prefix}{target}\g<3>', text)
+        return text
+
+    def build(self):
+        assets = {}
+        fingerprints = {}
+        for path in FINGERPRINTED_ASSETS:
+            if not os.path.exists(os.path.join(self.root, path)):
+                continue
+            data = self.read(path)
+            hashed = fingerprinted_path(path, fingerprint(data))
+            fingerprints[path] = hashed
+            assets[hashed] = Asset(hashed, data, IMMUTABLE_CACHE_CONTROL)
+        self.fingerprints = fingerprints
+
+        if os.path.exists(os.path.join(self.root, 'index.html')):
+            index = self.rewrite_references(self.read('index.html').decode('utf-8'))
+            assets['index.html'] = Asset('index.html', index.encode('utf-8'), REVALIDATE_CACHE_CONTROL)
+
+        if os.path.exists(os.path.join(self.root, 'sw.js')):
+            worker = self.rewrite_references(self.read('sw.js').decode('utf-8'), prefix='/')
+            index_digest = assets['index.html'].digest if 'index.html' in assets else ''
+            version = fingerprint((''.join(sorted(fingerprints.values())) + index_digest).encode())
+            worker = re.sub(r"const CACHE_NAME = '[^']*';", f"const CACHE_NAME = 'shomrim-{version}';", worker, count=1)
+            assets['sw.js'] = Asset('sw.js', worker.encode('utf-8'), REVALIDATE_CACHE_CONTROL)
+
+        self.assets = assets
+        self.built_at = time.time()
+
+    def ensure_built(self):
+        now = time.monotonic()
+        if self.mtimes is not None and now - self.checked_at < STATIC_RECHECK_INTERVAL:
+            return
+        with self.lock:
+            if self.mtimes is not None and now - self.checked_at < STATIC_RECHECK_INTERVAL:
+                return
+            mtimes = self.source_mtimes()
+            if mtimes != self.mtimes:
+                self.build()
+                self.mtimes = mtimes
+            self.checked_at = now
+
+    def get(self, path):
+        """(asset, cache_control override) for a URL path, or (None, None) if it is not bundled"""
+        self.ensure_built()
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset, None
+        # The plain name (old clients) or a stale hash (page cached before a
+        # deploy): serve the current file, but not as immutable
+        match = FINGERPRINT_RE.match(path)
+        source = match.group('stem') + match.group('ext') if match else path
+        if source in self.fingerprints:
+            return self.assets[self.fingerprints[source]], REVALIDATE_CACHE_CONTROL
+        return None, None
+
+    def manifest(self):
+        self.ensure_built()
+        return {
+            path: {
+                'digest': asset.digest,
+                'cache_control': asset.cache_control,
+                'bytes': {encoding: len(body) for encoding, body in asset.variants.items()},
+            }
+            for path, asset in sorted(self.assets.items())
+        }
+
+bundle = AssetBundle()
+
+if __name__ == '__main__':
+    # Show what would be served: python static_assets.py
+    print(json.dumps(bundle.manifest(), indent=2))
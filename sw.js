@@ -1,5 +1,6 @@
 // Service Worker for Shomrim PWA
-// Bump CACHE_NAME whenever you deploy important changes
+// CACHE_NAME and the app.css / app.js URLs below are rewritten with content
+// hashes when the server serves this file (static_assets.py) - no manual bumps
 const CACHE_NAME = 'shomrim-v1.0.7';
 const urlsToCache = [
   '/',
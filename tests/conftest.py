@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Keep the database, audio store and shared worker state out of the checkout
+# before any app module reads its configuration
+SCRATCH_DIR = tempfile.mkdtemp(prefix='shomrim-tests-')
+os.environ.setdefault('DB_PATH', os.path.join(SCRATCH_DIR, 'shomrim.db'))
+os.environ.setdefault('PTT_AUDIO_DIR', os.path.join(SCRATCH_DIR, 'ptt_audio'))
+os.environ.setdefault('METRICS_DIR', os.path.join(SCRATCH_DIR, 'metrics'))
+os.environ.setdefault('PRESENCE_DIR', os.path.join(SCRATCH_DIR, 'presence'))
+os.environ.setdefault('SMS_TRANSPORT', 'console')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A freshly migrated database for one test"""
+    database.close_pool()
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'shomrim.db'))
+    database.init_db()
+    yield database.DB_PATH
+    database.close_pool()
+
+@pytest.fixture
+def client(db):
+    import server
+    server.app.config['TESTING'] = True
+    with server.app.test_client() as client:
+        yield client
+
+def make_incident(index, **overrides):
+    """Incident payload as js/app.js posts it"""
+    incident = {
+        'id': f'INC-{index:05d}',
+        'shcad': f'SHCAD-{index:05d}',
+        'title': f'Test incident {index}',
+        'type': 'theft',
+        'description': f'Bicycle stolen outside shop {index}',
+        'address': f'{index} High Street',
+        'postcode': 'N16 5AA',
+        'created_by': '+447700900001',
+        'victims': [{'name': f'Victim {index}'}],
+        'witnesses': [{'name': f'Witness {index}'}],
+        'policeInfo': {'cadRef': f'CAD{index}'},
+    }
+    incident.update(overrides)
+    return incident
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+import database
+
+@pytest.fixture
+def cooperative(db, monkeypatch):
+    """Connections as a gevent worker opens them (gevent itself is not needed)"""
+    database.close_pool()
+    monkeypatch.setattr(database, 'is_cooperative', lambda: True)
+    yield
+    database.close_pool()
+
+def lock_database():
+    """A plain connection holding the write lock, like another worker mid-write"""
+    holder = sqlite3.connect(database.DB_PATH, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    return holder
+
+def test_is_cooperative_without_gevent_patching():
+    assert database.is_cooperative() is False
+
+def test_cooperative_connections_never_block_in_sqlite(cooperative):
+    conn = database.get_db()
+    busy_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+    cursor = conn.cursor()
+    conn.close()
+
+    assert busy_timeout == 0
+    assert isinstance(cursor, database.CooperativeCursor)
+
+def test_locked_statement_is_retried_after_a_sleep(cooperative, monkeypatch):
+    holder = lock_database()
+    sleeps = []
+
+    def sleep(delay):
+        # The other writer commits while we yield
+        sleeps.append(delay)
+        if len(sleeps) == 3:
+            holder.execute('COMMIT')
+
+    monkeypatch.setattr(database.time, 'sleep', sleep)
+    with database.get_db() as conn:
+        conn.execute("INSERT INTO suspects (name) VALUES ('Retried')")
+    holder.close()
+
+    assert sleeps == [0.001, 0.002, 0.004]
+    conn = database.get_db()
+    assert conn.execute("SELECT COUNT(*) FROM suspects WHERE name = 'Retried'").fetchone()[0] == 1
+    conn.close()
+
+def test_gives_up_at_the_busy_timeout(cooperative, monkeypatch):
+    holder = lock_database()
+    monkeypatch.setattr(database, 'DB_BUSY_TIMEOUT_MS', 50)
+
+    conn = database.get_db()
+    with pytest.raises(sqlite3.OperationalError, match='database is locked'):
+        conn.execute("INSERT INTO suspects (name) VALUES ('Never')")
+    conn.rollback()
+    conn.close()
+    holder.close()
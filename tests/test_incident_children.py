@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import database
+import server
+from conftest import make_incident
+
+def insert_incidents(count, start=0):
+    conn = database.get_db()
+    server.write_incidents(conn.cursor(), [make_incident(i) for i in range(start, start + count)])
+    if start == 0:
+        conn.execute("INSERT INTO incident_notes (incident_id, user_phone, note) VALUES ('INC-00000', '+447700900001', 'first')")
+    conn.commit()
+    conn.close()
+
+def count_child_queries(db_path, limit):
+    """Statements run by load_incident_children for the first `limit` incidents"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM incidents ORDER BY id LIMIT ?', (limit,))
+    incidents = database.rows_to_list(cursor.fetchall())
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    server.load_incident_children(cursor, incidents)
+    conn.set_trace_callback(None)
+    conn.close()
+    return incidents, statements
+
+@pytest.mark.parametrize('count', [1, 25, 120])
+def test_child_queries_do_not_grow_with_incident_count(db, count):
+    insert_incidents(count)
+
+    incidents, statements = count_child_queries(db, count)
+
+    assert len(incidents) == count
+    assert len(statements) == len(server.INCIDENT_CHILD_QUERIES)
+
+def test_children_are_attached_to_their_incident(db):
+    insert_incidents(3)
+
+    incidents, _ = count_child_queries(db, 3)
+
+    by_id = {incident['id']: incident for incident in incidents}
+    assert [v['name'] for v in by_id['INC-00001']['victims']] == ['Victim 1']
+    assert [w['name'] for w in by_id['INC-00002']['witnesses']] == ['Witness 2']
+    assert by_id['INC-00002']['policeInfo']['cad_ref'] == 'CAD2'
+    assert [n['note'] for n in by_id['INC-00000']['notes']] == ['first']
+    assert by_id['INC-00001']['notes'] == []
+
+def test_list_endpoint_query_count_is_constant(client):
+    counts = []
+    for start, count in ((0, 1), (1, 39)):
+        insert_incidents(count, start)
+
+        database.reset_query_count()
+        response = client.get('/api/incidents')
+        assert response.status_code == 200
+        assert len(response.get_json()) == start + count
+        counts.append(database.get_query_count())
+
+    assert counts[0] == counts[1]
@@ -0,0 +1,104 @@
+import pytest
+
+import database
+import notifications
+from conftest import make_incident
+
+def create_user(client, phone, name):
+    response = client.post('/api/users', json={'phone': phone, 'name': name})
+    assert response.status_code == 200, response.get_json()
+
+def test_patched_notes_and_assignments_come_back_with_phones_and_names(client):
+    create_user(client, '+447700900001', 'Yehuda Filip')
+    create_user(client, '+447700900002', 'David Cohen')
+    assert client.post('/api/incidents', json=make_incident(1)).status_code == 200
+
+    response = client.patch('/api/incidents/INC-00001', json={
+        'user_phone': '+447700900001',
+        'patch': [
+            {'op': 'add', 'path': '/notes/-', 'value': {'note': 'Area checked'}},
+            {'op': 'add', 'path': '/assignedUsers/-', 'value': {'user_phone': '+447700900002'}},
+        ],
+    })
+    assert response.status_code == 200, response.get_json()
+
+    incident = client.get('/api/incidents').get_json()[0]
+    [note] = incident['notes']
+    assert (note['note'], note['user_phone'], note['user_name']) == ('Area checked', '+447700900001', 'Yehuda Filip')
+    [assignment] = incident['assignedUsers']
+    assert (assignment['user_phone'], assignment['user_name']) == ('+447700900002', 'David Cohen')
+
+def test_assignment_needs_a_phone(client):
+    assert client.post('/api/incidents', json=make_incident(1)).status_code == 200
+
+    response = client.patch('/api/incidents/INC-00001', json=[
+        {'op': 'add', 'path': '/assignedUsers/-', 'value': {'name': 'David Cohen'}},
+    ])
+
+    assert response.status_code == 422
+
+NON_SCALAR_OPERATIONS = [
+    {'op': 'replace', 'path': '/title', 'value': {'text': 'Bike theft'}},
+    {'op': 'replace', 'path': '/caller/name', 'value': ['Moshe']},
+    {'op': 'replace', 'path': '/policeInfo/cadRef', 'value': {'ref': 'CAD123'}},
+    {'op': 'add', 'path': '/victims/-', 'value': {'name': 'Moshe', 'phone': ['07700900123']}},
+    {'op': 'add', 'path': '/notes/-', 'value': {'note': ['Area checked']}},
+    {'op': 'add', 'path': '/assignedUsers/-', 'value': {'user_phone': {'phone': '+447700900002'}}},
+]
+
+@pytest.mark.parametrize('operation', NON_SCALAR_OPERATIONS, ids=[op['path'] for op in NON_SCALAR_OPERATIONS])
+def test_non_scalar_values_are_rejected_and_the_next_patch_succeeds(client, operation):
+    assert client.post('/api/incidents', json=make_incident(1)).status_code == 200
+
+    response = client.patch('/api/incidents/INC-00001', json=[operation])
+    assert response.status_code == 422, response.get_json()
+
+    response = client.patch('/api/incidents/INC-00001', json=[{'op': 'replace', 'path': '/status', 'value': 'started'}])
+    assert response.status_code == 200, response.get_json()
+
+def test_unexpected_errors_roll_back_and_release_the_connection(client, monkeypatch):
+    assert client.post('/api/incidents', json=make_incident(1)).status_code == 200
+
+    def fail(*args):
+        raise RuntimeError('notification backend down')
+
+    monkeypatch.setattr(notifications, 'notify_incident_patch', fail)
+    response = client.patch('/api/incidents/INC-00001', json=[{'op': 'replace', 'path': '/status', 'value': 'started'}])
+    assert response.status_code == 500
+
+    # A leaked connection would still hold the write lock
+    conn = database.get_db()
+    conn.execute('PRAGMA busy_timeout = 0')
+    conn.execute("UPDATE incidents SET title = 'Bike theft' WHERE id = 'INC-00001'")
+    conn.commit()
+    row = conn.execute("SELECT status, version FROM incidents WHERE id = 'INC-00001'").fetchone()
+    conn.close()
+    assert tuple(row) == ('pending', 1)
+
+def test_patched_fields_are_served_from_columns_not_metadata(client):
+    assert client.post('/api/incidents', json=make_incident(1, caller={'name': 'Moshe', 'isVictim': True})).status_code == 200
+
+    response = client.patch('/api/incidents/INC-00001', json=[
+        {'op': 'replace', 'path': '/title', 'value': 'Bike recovered'},
+        {'op': 'replace', 'path': '/caller/name', 'value': 'Moshe Cohen'},
+    ])
+    assert response.status_code == 200, response.get_json()
+
+    incident = client.get('/api/incidents').get_json()[0]
+    assert 'metadata' not in incident
+    assert incident['title'] == 'Bike recovered'
+    assert incident['caller'] == {'name': 'Moshe Cohen', 'phone': None, 'isVictim': True, 'isWitness': False}
+
+def test_put_does_not_rewrite_metadata(client):
+    assert client.post('/api/incidents', json=make_incident(1)).status_code == 200
+    conn = database.get_db()
+    before = conn.execute("SELECT metadata FROM incidents WHERE id = 'INC-00001'").fetchone()[0]
+    conn.close()
+
+    response = client.put('/api/incidents/INC-00001', json={'status': 'started', 'notes': [{'text': 'Area checked'}]})
+    assert response.status_code == 200, response.get_json()
+
+    conn = database.get_db()
+    row = conn.execute("SELECT status, metadata FROM incidents WHERE id = 'INC-00001'").fetchone()
+    conn.close()
+    assert tuple(row) == ('started', before)
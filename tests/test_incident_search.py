@@ -0,0 +1,93 @@
+import database
+import server
+from conftest import make_incident
+
+def create_incidents(client, *incidents):
+    for incident in incidents:
+        assert client.post('/api/incidents', json=incident).status_code == 200
+
+def search(client, q):
+    response = client.get('/api/incidents/search', query_string={'q': q})
+    assert response.status_code == 200
+    return [incident['id'] for incident in response.get_json()['incidents']]
+
+def renumber_incident_rowids():
+    """What VACUUM may do to a table with a TEXT primary key"""
+    conn = database.get_db()
+    conn.execute('UPDATE incidents SET rowid = 1000 - rowid')
+    conn.commit()
+    conn.close()
+
+def test_search_matches_title_participants_and_notes(client):
+    create_incidents(client,
+                     make_incident(1, title='Bicycle theft', victims=[{'name': 'Moshe Cohen'}]),
+                     make_incident(2, title='Broken window', description='Window smashed overnight'))
+    client.post('/api/incidents/INC-00002/notes', json={'note': 'Glazier called', 'user_phone': '+447700900001'})
+
+    assert search(client, 'bicycle') == ['INC-00001']
+    assert search(client, 'cohen') == ['INC-00001']
+    assert search(client, 'glaz') == ['INC-00002']
+
+def test_search_survives_rowid_renumbering(client):
+    create_incidents(client,
+                     make_incident(1, title='Bicycle theft', description='Bike taken'),
+                     make_incident(2, title='Broken window', description='Window smashed overnight'),
+                     make_incident(3, title='Lost dog', description='Dog missing from garden'))
+
+    renumber_incident_rowids()
+    conn = database.get_db()
+    conn.execute('VACUUM')
+    conn.close()
+
+    assert search(client, 'window') == ['INC-00002']
+    assert search(client, 'dog') == ['INC-00003']
+
+def test_search_index_follows_updates_after_renumbering(client):
+    create_incidents(client, make_incident(1, title='Bicycle theft'), make_incident(2, title='Lost dog'))
+    renumber_incident_rowids()
+
+    conn = database.get_db()
+    conn.execute("UPDATE incidents SET title = 'Stolen scooter' WHERE id = 'INC-00001'")
+    conn.execute("DELETE FROM incidents WHERE id = 'INC-00002'")
+    conn.commit()
+    conn.close()
+
+    assert search(client, 'scooter') == ['INC-00001']
+    assert search(client, 'theft') == []
+    assert search(client, 'dog') == []
+
+def test_rebuild_matches_trigger_maintained_index(client):
+    create_incidents(client, *(make_incident(i) for i in range(5)))
+    conn = database.get_db()
+    before = conn.execute('SELECT rowid, title FROM incident_search ORDER BY rowid').fetchall()
+
+    database.rebuild_incident_search(conn.cursor())
+    conn.commit()
+    after = conn.execute('SELECT rowid, title FROM incident_search ORDER BY rowid').fetchall()
+    conn.close()
+
+    assert [tuple(row) for row in after] == [tuple(row) for row in before]
+    assert len(search(client, 'shop')) == 5
+
+def test_migration_rekeys_an_existing_rowid_index(tmp_path, monkeypatch):
+    database.close_pool()
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'old.db'))
+    conn = database.get_db()
+    for version, migration in database.MIGRATIONS[:10]:
+        migration(conn.cursor())
+        conn.execute(f'PRAGMA user_version = {version}')
+    server.write_incidents(conn.cursor(), [make_incident(1, title='Broken window'), make_incident(2, title='Lost dog')])
+    conn.commit()
+    conn.execute('UPDATE incidents SET rowid = 1000 - rowid')
+    conn.commit()
+
+    database.migrate(conn)
+    rows = conn.execute('''
+        SELECT k.incident_id FROM incident_search
+        JOIN incident_keys k ON k.id = incident_search.rowid
+        WHERE incident_search MATCH 'window'
+    ''').fetchall()
+    conn.close()
+    database.close_pool()
+
+    assert [row[0] for row in rows] == ['INC-00001']
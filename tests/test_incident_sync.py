@@ -0,0 +1,38 @@
+import database
+from conftest import make_incident
+
+def set_updated_at(incident_id, stamp):
+    conn = database.get_db()
+    conn.execute('UPDATE incidents SET updated_at = ? WHERE id = ?', (stamp, incident_id))
+    conn.commit()
+    conn.close()
+
+def test_delta_includes_writes_stamped_in_the_token_millisecond(client):
+    client.post('/api/incidents', json=make_incident(1))
+    token = client.get('/api/incidents').headers['X-Sync-Token']
+
+    # Stamped in the same millisecond as the token, committed after it was read
+    client.post('/api/incidents', json=make_incident(2))
+    set_updated_at('INC-00002', token)
+
+    data = client.get('/api/incidents', query_string={'since': token}).get_json()
+
+    assert 'INC-00002' in [incident['id'] for incident in data['incidents']]
+
+def test_delta_reports_deletions(client):
+    client.post('/api/incidents', json=make_incident(1))
+    token = client.get('/api/incidents').headers['X-Sync-Token']
+
+    client.delete('/api/incidents/INC-00001', query_string={'user_phone': '+447700900001'})
+    data = client.get('/api/incidents', query_string={'since': token}).get_json()
+
+    assert [d['incident_id'] for d in data['deleted']] == ['INC-00001']
+    assert data['sync_token'] >= token
+
+def test_unchanged_list_gets_304(client):
+    client.post('/api/incidents', json=make_incident(1))
+    etag = client.get('/api/incidents').headers['ETag']
+
+    response = client.get('/api/incidents', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
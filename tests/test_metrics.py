@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'metrics', metrics.Metrics())
+    return tmp_path
+
+@pytest.fixture
+def other_worker():
+    """A live process standing in for another gunicorn worker"""
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def write_snapshot(directory, pid, requests, master=None):
+    snapshot = {
+        'pid': pid,
+        'master': os.getppid() if master is None else master,
+        'counters': [['shomrim_http_requests_total', {'endpoint': 'health'}, requests]],
+        'histograms': [],
+        'help': {}
+    }
+    (directory / f'worker-{pid}.json').write_text(json.dumps(snapshot))
+
+def total_requests():
+    counters, _, _ = metrics.merge_snapshots()
+    return counters.get(('shomrim_http_requests_total', (('endpoint', 'health'),)), 0)
+
+def test_live_workers_are_summed(metrics_dir, other_worker):
+    metrics.metrics.inc('shomrim_http_requests_total', {'endpoint': 'health'}, 2)
+    write_snapshot(metrics_dir, other_worker, 5)
+
+    assert total_requests() == 7
+
+def test_dead_workers_are_pruned(metrics_dir):
+    pid = dead_pid()
+    write_snapshot(metrics_dir, pid, 5)
+
+    assert total_requests() == 0
+    assert not (metrics_dir / f'worker-{pid}.json').exists()
+
+def test_snapshots_from_another_master_are_pruned(metrics_dir, other_worker):
+    write_snapshot(metrics_dir, other_worker, 5, master=os.getppid() + 1)
+    (metrics_dir / 'worker-1.json').write_text(json.dumps({'counters': [], 'histograms': []}))
+
+    assert total_requests() == 0
+    assert sorted(os.listdir(metrics_dir)) == [f'worker-{os.getpid()}.json']
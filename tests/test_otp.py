@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+import otp_store
+
+def send_otp(client, phone_number, forwarded_for):
+    return client.post('/api/send-otp', json={'phone_number': phone_number},
+                       headers={'X-Forwarded-For': forwarded_for})
+
+def test_spoofed_forwarded_for_does_not_bypass_ip_throttle(client):
+    statuses = []
+    for i in range(30):
+        # The client makes up the first hop; the platform proxy appends the real address
+        response = send_otp(client, f'77009{i:05d}', f'10.0.{i}.1, 203.0.113.7')
+        statuses.append(response.status_code)
+
+    assert statuses.count(200) == otp_store.OTP_SENDS_PER_IP
+    assert statuses[otp_store.OTP_SENDS_PER_IP:] == [429] * (30 - otp_store.OTP_SENDS_PER_IP)
+    assert 'ip' in send_otp(client, '7700999999', '198.51.100.1, 203.0.113.7').get_json()['error']
+
+def test_ip_throttle_is_per_proxy_reported_address(client):
+    for i in range(otp_store.OTP_SENDS_PER_IP):
+        assert send_otp(client, f'77008{i:05d}', '203.0.113.7').status_code == 200
+
+    assert send_otp(client, '7700800100', '203.0.113.7').status_code == 429
+    assert send_otp(client, '7700800100', '203.0.113.8').status_code == 200
+
+def test_phone_throttle(client):
+    for i in range(otp_store.OTP_SENDS_PER_NUMBER):
+        assert send_otp(client, '7700900123', f'203.0.113.{i}').status_code == 200
+
+    response = send_otp(client, '7700900123', '203.0.113.99')
+    assert response.status_code == 429
+    assert 'phone' in response.get_json()['error']
+
+def test_otp_store_is_abstract():
+    with pytest.raises(TypeError):
+        otp_store.OTPStore()
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_concurrent_sends_cannot_all_pass_the_throttle(db, backend):
+    store = otp_store.create_otp_store(backend)
+    results = []
+    start = threading.Barrier(20)
+
+    def send(i):
+        start.wait()
+        results.append(store.allow_send('+447700900555', f'203.0.113.{i}'))
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(None) == otp_store.OTP_SENDS_PER_NUMBER
+    assert results.count('phone') == 20 - otp_store.OTP_SENDS_PER_NUMBER
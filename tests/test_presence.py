@@ -0,0 +1,74 @@
+import pytest
+
+import database
+import presence
+
+PHONE = '+447700900001'
+
+@pytest.fixture
+def user(client):
+    response = client.post('/api/users', json={'phone': PHONE, 'name': 'Yehuda Filip'})
+    assert response.status_code == 200, response.get_json()
+
+def tracker(directory):
+    worker = presence.SharedPresenceTracker(directory=str(directory))
+    worker.pid = presence.os.getpid()  # no publisher thread; tests publish explicitly
+    return worker
+
+def publish_as(worker, pid, monkeypatch):
+    """Write a worker's table under another worker's pid"""
+    with monkeypatch.context() as patch:
+        patch.setattr(presence.os, 'getpid', lambda: pid)
+        worker.publish()
+
+def set_on_duty(on_duty):
+    conn = database.get_db()
+    conn.execute('UPDATE users SET on_duty = ? WHERE phone = ?', (on_duty, PHONE))
+    conn.commit()
+    conn.close()
+
+def on_duty_phones(worker):
+    worker.merged_at = None
+    return [u['phone'] for u in worker.online('on-duty')]
+
+def test_duty_change_reaches_the_worker_holding_the_heartbeat(user, tmp_path, monkeypatch):
+    holder, other = tracker(tmp_path), tracker(tmp_path)
+    holder.heartbeat(PHONE)
+
+    # The duty toggle lands on a worker that never saw this user's heartbeat
+    set_on_duty(1)
+    other.refresh_profile(PHONE)
+    publish_as(other, 1001, monkeypatch)
+
+    assert on_duty_phones(holder) == [PHONE]
+    assert holder.entries[PHONE]['profile']['on_duty'] == 1
+
+    # The holder now publishes the new profile itself
+    publish_as(holder, 1002, monkeypatch)
+    (tmp_path / 'worker-1001.json').unlink()
+    assert on_duty_phones(tracker(tmp_path)) == [PHONE]
+
+def test_profile_only_entry_is_not_online_by_itself(user, tmp_path):
+    worker = tracker(tmp_path)
+
+    worker.refresh_profile(PHONE)
+
+    assert worker.online() == []
+    worker.sweep()
+    assert PHONE in worker.entries
+
+def test_other_workers_are_read_without_the_lock(user, tmp_path, monkeypatch):
+    worker = tracker(tmp_path)
+    worker.heartbeat(PHONE)
+    read_others = worker.read_others
+    held = []
+
+    def record():
+        held.append(worker.lock.locked())
+        return read_others()
+
+    monkeypatch.setattr(worker, 'read_others', record)
+    worker.merged_at = None
+
+    assert [u['phone'] for u in worker.online()] == [PHONE]
+    assert held == [False]
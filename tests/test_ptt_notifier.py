@@ -0,0 +1,68 @@
+import database
+import server
+
+def insert_clip(channel, user_phone='+447700900002'):
+    """A clip row as another worker would write it, without publishing locally"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO ptt_messages (user_phone, user_name, channel, audio_data, audio_hash, audio_size)
+        VALUES (?, 'Other worker', ?, X'', 'hash', 0)
+    ''', (user_phone, channel))
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+def test_local_publish_does_not_hide_lower_clips_from_other_workers(db):
+    notifier = server.PTTNotifier()
+    remote_id = insert_clip('dispatchers')
+    local_id = insert_clip('on-patrol')
+    notifier.publish('on-patrol', local_id)
+
+    notifier.sync_from_db()
+
+    assert remote_id < local_id
+    assert notifier.latest_for('dispatchers') == remote_id
+
+def test_sync_resumes_after_the_last_id_it_read(db):
+    notifier = server.PTTNotifier()
+    first_id = insert_clip('dispatchers')
+    notifier.sync_from_db()
+    second_id = insert_clip('on-duty')
+    notifier.last_sync = 0.0
+
+    notifier.sync_from_db()
+
+    assert notifier.latest_for('dispatchers') == first_id
+    assert notifier.latest_for('on-duty') == second_id
+    assert notifier.db_high_water == second_id
+
+def test_wait_wakes_on_a_clip_from_another_worker(db):
+    notifier = server.PTTNotifier()
+    notifier.publish('on-patrol', insert_clip('on-patrol'))
+    clip_id = insert_clip('dispatchers')
+
+    notifier.sync_from_db()
+
+    assert notifier.wait('dispatchers', 0, timeout=0.1)
+    assert notifier.latest_for('dispatchers') == clip_id
+
+def test_waiters_past_the_cap_are_turned_away_at_once(client, monkeypatch):
+    notifier = server.PTTNotifier(max_waiters=1)
+    monkeypatch.setattr(server, 'ptt_notifier', notifier)
+    assert notifier.acquire()
+
+    response = client.get('/api/ptt/wait', query_string={'user_phone': '+447700900001', 'timeout': 5})
+
+    assert response.get_json() == {'messages': [], 'count': 0, 'retry_after': server.PTT_SHORT_POLL_INTERVAL}
+    assert notifier.refused == 1
+
+def test_waiter_slot_is_released_after_the_poll(client, monkeypatch):
+    notifier = server.PTTNotifier(max_waiters=1)
+    monkeypatch.setattr(server, 'ptt_notifier', notifier)
+
+    for _ in range(2):
+        response = client.get('/api/ptt/wait', query_string={'user_phone': '+447700900001', 'timeout': 0.05})
+        assert 'retry_after' not in response.get_json()
+
+    assert notifier.waiters == 0
@@ -0,0 +1,53 @@
+import io
+import os
+
+import audio_store
+import retention
+
+CLIP = b'identical clip'
+
+def broadcast(client, channel='on-duty', audio=CLIP):
+    response = client.post('/api/ptt/broadcast', data={
+        'audio': (io.BytesIO(audio), 'clip.webm'),
+        'channel': channel,
+        'user_phone': '+447700900001',
+        'user_name': 'Dispatcher'
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    return response.get_json()['message_id']
+
+def test_broadcast_restores_a_clip_unlinked_before_its_row_was_committed(client, monkeypatch):
+    store_audio = audio_store.store_audio
+
+    def store_then_lose_race(audio_data):
+        audio_hash = store_audio(audio_data)
+        # Retention unlinks the shared file right after the existence check
+        os.remove(audio_store.audio_path(audio_hash))
+        monkeypatch.setattr(audio_store, 'store_audio', store_audio)
+        return audio_hash
+
+    monkeypatch.setattr(audio_store, 'store_audio', store_then_lose_race)
+    message_id = broadcast(client)
+    audio_store.audio_cache.discard(message_id)
+
+    response = client.get(f'/api/ptt/audio/{message_id}')
+
+    assert response.status_code == 200
+    assert response.data == CLIP
+
+def test_retention_unlinks_inside_the_delete_transaction(client, monkeypatch):
+    for _ in range(3):
+        broadcast(client, audio=b'old clip')
+    remove_unreferenced_audio = audio_store.remove_unreferenced_audio
+    in_transaction = []
+
+    def record(cursor, audio_hashes):
+        in_transaction.append(cursor.connection.in_transaction)
+        return remove_unreferenced_audio(cursor, audio_hashes)
+
+    monkeypatch.setattr(audio_store, 'remove_unreferenced_audio', record)
+    monkeypatch.setattr(retention, 'policies', {'default': {'max_count': 0}})
+
+    assert retention.run_once() == 3
+    assert in_transaction == [True]
+    assert not os.path.exists(audio_store.audio_path(audio_store.hashlib.sha256(b'old clip').hexdigest()))
@@ -0,0 +1,56 @@
+import pytest
+
+import database
+import server
+
+def query_plan(sql, params=()):
+    conn = database.get_db()
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    conn.close()
+    return ' | '.join(row['detail'] for row in rows)
+
+CHILD_INDEXES = {
+    'participants': 'idx_participants_incident',
+    'assignedUsers': 'idx_assignments_incident',
+    'notes': 'idx_notes_incident',
+    'history': 'idx_history_incident',
+    'policeInfo': 'idx_police_info_incident',
+    'arrests': 'idx_arrests_incident',
+}
+
+@pytest.mark.parametrize('key', sorted(CHILD_INDEXES))
+def test_incident_child_queries_use_their_index(db, key):
+    plan = query_plan(server.INCIDENT_CHILD_QUERIES[key].format('?, ?'), ('INC-1', 'INC-2'))
+
+    assert CHILD_INDEXES[key] in plan
+
+HOT_QUERIES = [
+    ('SELECT * FROM incidents WHERE status = ? ORDER BY created_at DESC, id DESC LIMIT 50',
+     ('pending',), 'idx_incidents_status'),
+    ('SELECT * FROM incidents WHERE type = ? ORDER BY created_at DESC, id DESC LIMIT 50',
+     ('theft',), 'idx_incidents_type'),
+    ('SELECT * FROM incidents ORDER BY created_at DESC, id DESC LIMIT 50',
+     (), 'idx_incidents_created_at'),
+    ('SELECT * FROM incidents WHERE updated_at >= ? ORDER BY updated_at, id',
+     ('2026-01-01',), 'idx_incidents_updated_at'),
+    ('SELECT * FROM users WHERE on_duty = 1 ORDER BY name', (), 'idx_users_on_duty'),
+    ('SELECT * FROM users WHERE on_patrol = 1 ORDER BY name', (), 'idx_users_on_patrol'),
+    ('SELECT * FROM users WHERE role = ? ORDER BY name', ('Dispatcher',), 'idx_users_role'),
+    ('SELECT * FROM contacts WHERE user_phone = ? ORDER BY name', ('+447700900001',), 'idx_contacts_user'),
+    ('SELECT incident_id FROM incident_assignments WHERE user_phone = ? AND status = ?',
+     ('+447700900001', 'accepted'), 'idx_assignments_user'),
+    ('SELECT COUNT(*) FROM notifications WHERE user_phone = ? AND is_read = 0',
+     ('+447700900001',), 'idx_notifications_unread'),
+    ('SELECT * FROM notifications WHERE user_phone = ? AND id > ? ORDER BY id',
+     ('+447700900001', 0), 'idx_notifications_user'),
+    ('SELECT id FROM ptt_messages WHERE channel = ? AND id > ? ORDER BY id',
+     ('on-duty', 0), 'idx_ptt_channel_id'),
+]
+
+@pytest.mark.parametrize('sql, params, index', HOT_QUERIES, ids=[index for _, _, index in HOT_QUERIES])
+def test_hot_queries_use_their_index(db, sql, params, index):
+    plan = query_plan(sql, params)
+
+    assert index in plan
+    # Sorting only ties (RIGHT PART OF ORDER BY) is fine; a full sort is not
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in plan
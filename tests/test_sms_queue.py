@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+import server
+import sms_queue
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the queue asked for, without actually sleeping"""
+    delays = []
+    monkeypatch.setattr(sms_queue.time, 'sleep', delays.append)
+    return delays
+
+def test_retries_with_backoff_until_sent(sleeps):
+    transport = sms_queue.FakeTransport(fail_times=2)
+    outbox = sms_queue.SMSQueue(transport, workers=1)
+
+    outbox.enqueue('+447700900001', 'Your code is 123456')
+    outbox.join()
+
+    assert transport.sent == [{'to': '+447700900001', 'body': 'Your code is 123456'}]
+    assert outbox.stats == {'queued': 1, 'sent': 1, 'retried': 2, 'failed': 0}
+    assert len(sleeps) == 2
+    assert 0.5 * sms_queue.SMS_BACKOFF_BASE <= sleeps[0] <= sms_queue.SMS_BACKOFF_BASE
+    assert sms_queue.SMS_BACKOFF_BASE <= sleeps[1] <= 2 * sms_queue.SMS_BACKOFF_BASE
+
+def test_gives_up_after_max_attempts(sleeps):
+    transport = sms_queue.FakeTransport(fail_times=sms_queue.SMS_MAX_ATTEMPTS)
+    outbox = sms_queue.SMSQueue(transport, workers=1)
+
+    outbox.enqueue('+447700900001', 'Incident INC-00001 assigned', kind='alert')
+    outbox.join()
+
+    assert transport.sent == []
+    assert outbox.stats['failed'] == 1
+    assert outbox.stats['retried'] == sms_queue.SMS_MAX_ATTEMPTS - 1
+    assert len(sleeps) == sms_queue.SMS_MAX_ATTEMPTS - 1
+
+def test_failures_are_counted_per_message(sleeps):
+    transport = sms_queue.FakeTransport(fail_times=sms_queue.SMS_MAX_ATTEMPTS + 1)
+    outbox = sms_queue.SMSQueue(transport, workers=1)
+
+    outbox.enqueue('+447700900001', 'first')
+    outbox.enqueue('+447700900002', 'second')
+    outbox.join()
+
+    # The first message used up every attempt, the second failed once and then went out
+    assert outbox.stats == {'queued': 2, 'sent': 1, 'retried': sms_queue.SMS_MAX_ATTEMPTS, 'failed': 1}
+    assert [message['to'] for message in transport.sent] == ['+447700900002']
+
+def test_backoff_is_capped():
+    outbox = sms_queue.SMSQueue(sms_queue.FakeTransport())
+
+    assert outbox.backoff(30) <= sms_queue.SMS_BACKOFF_MAX
+
+class BlockingTransport(sms_queue.FakeTransport):
+    """Holds every send until released, like a slow SMS gateway"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def send(self, to, body):
+        assert self.release.wait(5)
+        return super().send(to, body)
+
+def test_send_otp_does_not_wait_for_delivery(client, monkeypatch):
+    transport = BlockingTransport()
+    outbox = sms_queue.SMSQueue(transport, workers=1)
+    monkeypatch.setattr(server, 'sms_outbox', outbox)
+
+    response = client.post('/api/send-otp', json={'phone_number': '7700900123'})
+
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'OTP queued for delivery'
+    assert transport.sent == []
+
+    transport.release.set()
+    outbox.join()
+    assert transport.sent[0]['to'] == '+447700900123'
+    assert '123456' in transport.sent[0]['body']
@@ -0,0 +1,69 @@
+import pytest
+
+import database
+import geo
+from conftest import make_incident
+
+# Stamford Hill and around
+LOCATIONS = {
+    1: {'lat': 51.5705, 'lng': -0.0727},
+    2: {'lat': 51.5712, 'lng': -0.0741},
+    3: {'lat': 51.6000, 'lng': -0.1500},
+}
+
+@pytest.fixture
+def incidents(client):
+    for index, location in LOCATIONS.items():
+        response = client.post('/api/incidents', json=make_incident(index, location=location))
+        assert response.status_code == 200
+
+def nearby(client, **args):
+    response = client.get('/api/incidents/nearby', query_string=args)
+    assert response.status_code == 200, response.get_json()
+    return [incident['id'] for incident in response.get_json()['incidents']]
+
+def test_radius_returns_nearest_first(client, incidents):
+    assert nearby(client, lat=51.5705, lng=-0.0727, radius=500) == ['INC-00001', 'INC-00002']
+
+def test_nearby_survives_rowid_renumbering(client, incidents):
+    conn = database.get_db()
+    conn.execute('UPDATE incidents SET rowid = 1000 - rowid')
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+    assert nearby(client, lat=51.6, lng=-0.15, radius=200) == ['INC-00003']
+    assert nearby(client, bbox='-0.08,51.57,-0.07,51.575') == ['INC-00002', 'INC-00001']
+
+def test_location_changes_follow_the_incident(client, incidents):
+    conn = database.get_db()
+    conn.execute('UPDATE incidents SET rowid = 1000 - rowid')
+    conn.execute("UPDATE incidents SET latitude = 51.6001, longitude = -0.1501 WHERE id = 'INC-00001'")
+    conn.execute("DELETE FROM incidents WHERE id = 'INC-00002'")
+    conn.commit()
+    conn.close()
+
+    assert nearby(client, lat=51.5705, lng=-0.0727, radius=500) == []
+    assert nearby(client, lat=51.6, lng=-0.15, radius=200) == ['INC-00003', 'INC-00001']
+
+def test_bbox_size_is_capped():
+    with pytest.raises(ValueError):
+        geo.parse_area({'bbox': '-1.5,51.0,0.5,52.0'})
+
+    bbox, center, radius_m = geo.parse_area({'bbox': '-0.2,51.5,0.0,51.6'})
+    assert bbox == (51.5, 51.6, -0.2, 0.0)
+    assert center is None and radius_m is None
+
+def test_oversized_bbox_is_rejected(client):
+    response = client.get('/api/incidents/nearby', query_string={'bbox': '-10,40,10,60'})
+
+    assert response.status_code == 400
+
+def test_haversine_many_matches_haversine_m():
+    lats = [51.5705, 51.6, -33.87, 0.0]
+    lngs = [-0.0727, -0.15, 151.21, 179.9]
+
+    distances = geo.haversine_many(51.5712, -0.0741, lats, lngs)
+
+    expected = [geo.haversine_m(51.5712, -0.0741, lat, lng) for lat, lng in zip(lats, lngs)]
+    assert distances == pytest.approx(expected, rel=1e-9)
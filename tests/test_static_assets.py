@@ -0,0 +1,12 @@
+import static_assets
+
+def test_bundle_is_built_before_the_first_request(client, monkeypatch):
+    def build():
+        raise AssertionError('bundle built while serving a request')
+
+    monkeypatch.setattr(static_assets.bundle, 'build', build)
+    response = client.get('/', headers={'Accept-Encoding': 'br, gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] in ('br', 'gzip')
+    assert 'js/app.js' in static_assets.bundle.fingerprints